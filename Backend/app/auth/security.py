@@ -1,6 +1,29 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from ..core.config import settings
+from ..database import execute_query_async
+
+def crear_contexto(esquema: str, rondas: int) -> CryptContext:
+    """
+    Contexto de passlib con el esquema y costo configurados.
+    Los hashes de otros esquemas (bcrypt heredado) se siguen verificando pero
+    quedan marcados como obsoletos; con rondas fijas (mínimo = máximo) también
+    se marcan los hashes con otro costo, en ambos sentidos.
+    """
+    esquemas = [esquema] + (["bcrypt"] if esquema != "bcrypt" else [])
+    opciones = {}
+    if rondas > 0:
+        for clave in ("default_rounds", "min_rounds", "max_rounds"):
+            opciones[f"{esquema}__{clave}"] = rondas
+    return CryptContext(schemes=esquemas, deprecated="auto", **opciones)
+
+pwd_context = crear_contexto(settings.password_scheme, settings.password_rounds)
 
 
 def verify_password(plain_password, hashed_password):
@@ -11,3 +34,110 @@ def get_password_hash(password):
 
 def hash_password(password: str) -> str:
     return get_password_hash(password)
+
+def needs_update(hashed_password: str) -> bool:
+    """True si el hash usa otro esquema o costo que el configurado"""
+    return pwd_context.needs_update(hashed_password)
+
+def verify_and_update(plain_password: str, hashed_password: str):
+    """
+    Verificar y, si el hash está desactualizado, calcular el nuevo.
+    Devuelve (válida, nuevo_hash o None).
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+# Hashing fuera del event loop
+# bcrypt tarda ~100-300 ms de CPU por operación y libera el GIL, así que un
+# pool de hilos dedicado lo paraleliza sin bloquear las demás peticiones.
+# Las operaciones en espera se limitan: si la cola está llena se responde 503.
+
+_hash_executor = None
+_hash_lock = threading.Lock()
+_hash_pendientes = 0
+_hash_rechazadas = 0
+_hash_completadas = 0
+
+def get_hash_executor() -> ThreadPoolExecutor:
+    """Pool de hilos acotado exclusivo para bcrypt"""
+    global _hash_executor
+    if _hash_executor is None:
+        with _hash_lock:
+            if _hash_executor is None:
+                _hash_executor = ThreadPoolExecutor(
+                    max_workers=settings.hash_workers,
+                    thread_name_prefix="hash"
+                )
+    return _hash_executor
+
+async def _ejecutar_hash(func, *args):
+    global _hash_pendientes, _hash_rechazadas, _hash_completadas
+    with _hash_lock:
+        if _hash_pendientes >= settings.hash_workers + settings.hash_cola_max:
+            _hash_rechazadas += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Servidor ocupado verificando credenciales, intente de nuevo",
+                headers={"Retry-After": str(settings.hash_retry_after)}
+            )
+        _hash_pendientes += 1
+
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_hash_executor(), functools.partial(func, *args))
+    finally:
+        with _hash_lock:
+            _hash_pendientes -= 1
+            _hash_completadas += 1
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password en el pool de hashing (503 si la cola está llena)"""
+    return await _ejecutar_hash(verify_password, plain_password, hashed_password)
+
+async def hash_password_async(password: str) -> str:
+    """hash_password en el pool de hashing (503 si la cola está llena)"""
+    return await _ejecutar_hash(hash_password, password)
+
+async def verify_and_update_async(plain_password: str, hashed_password: str):
+    """verify_and_update en el pool de hashing (503 si la cola está llena)"""
+    return await _ejecutar_hash(verify_and_update, plain_password, hashed_password)
+
+async def verificar_credenciales(user_id: int, plain_password: str, hashed_password: str) -> bool:
+    """
+    Verificar la contraseña de un usuario en el login y, si su hash quedó
+    con un esquema o costo distinto al configurado, guardarlo recalculado.
+    Así un cambio de PASSWORD_SCHEME/PASSWORD_ROUNDS se aplica
+    gradualmente sin forzar un cambio masivo de contraseñas.
+    """
+    valida, nuevo_hash = await verify_and_update_async(plain_password, hashed_password)
+    if valida and nuevo_hash:
+        try:
+            await execute_query_async(
+                "UPDATE usuarios SET password_hash = %s WHERE id = %s AND password_hash = %s",
+                (nuevo_hash, user_id, hashed_password)
+            )
+        except Exception as e:
+            # El login no debe fallar por no poder actualizar el hash
+            print(f"No se pudo actualizar el hash del usuario {user_id}: {e}")
+    return valida
+
+def hash_stats() -> dict:
+    """Estado del pool de hashing"""
+    with _hash_lock:
+        return {
+            "esquema": settings.password_scheme,
+            "rondas": settings.password_rounds,
+            "workers": settings.hash_workers,
+            "cola_max": settings.hash_cola_max,
+            "pendientes": _hash_pendientes,
+            "completadas": _hash_completadas,
+            "rechazadas": _hash_rechazadas
+        }
+
+def close_hash_executor():
+    """Detener el pool de hashing (al apagar la aplicación)"""
+    global _hash_executor
+    with _hash_lock:
+        if _hash_executor is not None:
+            _hash_executor.shutdown(wait=False)
+            _hash_executor = None
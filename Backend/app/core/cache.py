@@ -0,0 +1,97 @@
+"""
+Caché en memoria del proceso con tiempo de vida (TTL) y tamaño acotado.
+
+Se usa para datos que se leen en cada petición y cambian poco, como el
+usuario autenticado en `get_current_user`. Al superar el tamaño máximo se
+descarta la entrada usada hace más tiempo (LRU).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from .config import settings
+
+class CacheTTL:
+    """Caché LRU con expiración por entrada, segura entre hilos"""
+
+    def __init__(self, max_entradas: int, ttl: float):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._datos: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+
+    @property
+    def activa(self) -> bool:
+        return self.ttl > 0 and self.max_entradas > 0
+
+    def get(self, clave: Hashable) -> Optional[Any]:
+        """Valor vigente para la clave o None si no está o expiró"""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+
+            valor, expira = entrada
+            if expira <= time.monotonic():
+                del self._datos[clave]
+                self.fallos += 1
+                return None
+
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+
+    def set(self, clave: Hashable, valor: Any, ttl: Optional[float] = None):
+        """Guardar un valor; `ttl` permite acortar la vida de esta entrada"""
+        if not self.activa:
+            return
+
+        vida = self.ttl if ttl is None else min(ttl, self.ttl)
+        if vida <= 0:
+            return
+        with self._lock:
+            self._datos[clave] = (valor, time.monotonic() + vida)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, clave: Hashable):
+        """Eliminar una entrada (por ejemplo, al cambiar los datos en la base)"""
+        with self._lock:
+            if self._datos.pop(clave, None) is not None:
+                self.invalidaciones += 1
+
+    def limpiar(self):
+        """Vaciar la caché completa"""
+        with self._lock:
+            self._datos.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de uso de la caché"""
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "entradas": len(self._datos),
+                "max_entradas": self.max_entradas,
+                "ttl_segundos": self.ttl,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "invalidaciones": self.invalidaciones,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0
+            }
+
+# Usuarios autenticados (UsuarioResponse por id)
+cache_usuarios = CacheTTL(settings.auth_cache_max, settings.auth_cache_ttl)
+
+def invalidar_usuario(user_id: int):
+    """
+    Descartar el usuario en caché. Llamar siempre que se desactive, cambie
+    de rol o cambie su contraseña para que el cambio aplique de inmediato.
+    """
+    cache_usuarios.invalidar(int(user_id))
@@ -11,4 +11,101 @@ class Settings(BaseModel):
     db_password: str = os.getenv("DB_PASSWORD", "123456")
     db_name: str = os.getenv("DB_NAME", "proyecto_final")
 
+    # Pool de conexiones MySQL
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    db_pool_max_overflow: int = int(os.getenv("DB_POOL_MAX_OVERFLOW", "10"))
+    db_pool_timeout: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    db_pool_idle_timeout: float = float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))
+    db_pool_recycle: float = float(os.getenv("DB_POOL_RECYCLE", "3600"))
+    db_pool_pre_ping: bool = os.getenv("DB_POOL_PRE_PING", "True").lower() == "true"
+
+    # Acceso asíncrono: "aiomysql" (si está instalado) o "hilos"
+    db_async_driver: str = os.getenv("DB_ASYNC_DRIVER", "aiomysql")
+    db_thread_pool_size: int = int(os.getenv("DB_THREAD_POOL_SIZE", str(db_pool_size + db_pool_max_overflow)))
+
+    # Conciliación periódica de productos.stock_actual (segundos, 0 = desactivada)
+    stock_conciliacion_intervalo: float = float(os.getenv("STOCK_CONCILIACION_INTERVALO", "3600"))
+
+    # Caché de usuarios autenticados (segundos de vida, 0 = desactivada)
+    auth_cache_ttl: float = float(os.getenv("AUTH_CACHE_TTL", "30"))
+    auth_cache_max: int = int(os.getenv("AUTH_CACHE_MAX", "1000"))
+
+    # Hashing de contraseñas: esquema de passlib y costo (0 = el del esquema)
+    password_scheme: str = os.getenv("PASSWORD_SCHEME", "bcrypt")
+    password_rounds: int = int(os.getenv("PASSWORD_ROUNDS", "12"))
+
+    # Pool de hashing de contraseñas (bcrypt) y tamaño máximo de su cola
+    hash_workers: int = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 2)))
+    hash_cola_max: int = int(os.getenv("HASH_COLA_MAX", "64"))
+    hash_retry_after: int = int(os.getenv("HASH_RETRY_AFTER", "1"))
+
+    # Almacenamiento de tokens OAuth2: "sql", "archivo" (SQLite local) o "memoria"
+    oauth_token_store: str = os.getenv("OAUTH_TOKEN_STORE", "sql")
+    oauth_token_archivo: str = os.getenv("OAUTH_TOKEN_ARCHIVO", "oauth_tokens.db")
+    oauth_cache_ttl: float = float(os.getenv("OAUTH_CACHE_TTL", "30"))
+    oauth_cache_max: int = int(os.getenv("OAUTH_CACHE_MAX", "10000"))
+
+    # Barrido de tokens OAuth2 expirados (segundos, 0 = desactivado) y filas por DELETE
+    oauth_barrido_intervalo: float = float(os.getenv("OAUTH_BARRIDO_INTERVALO", "60"))
+    oauth_barrido_lote: int = int(os.getenv("OAUTH_BARRIDO_LOTE", "1000"))
+
+    # Caché de /oauth/introspect y /oauth/userinfo (segundos, nunca más que el exp del token)
+    oauth_introspect_cache_ttl: float = float(os.getenv("OAUTH_INTROSPECT_CACHE_TTL", "15"))
+    oauth_introspect_cache_max: int = int(os.getenv("OAUTH_INTROSPECT_CACHE_MAX", "10000"))
+
+    # Índice en memoria del catálogo para QR: segundos entre refrescos
+    # incrementales y entre recargas completas
+    catalogo_refresco: float = float(os.getenv("CATALOGO_REFRESCO", "2"))
+    catalogo_recarga_completa: float = float(os.getenv("CATALOGO_RECARGA_COMPLETA", "300"))
+
+    # Consulta de URL externas contenidas en QR (las rutas propias se resuelven sin HTTP):
+    # timeout y conexiones del pool
+    qr_http_timeout: float = float(os.getenv("QR_HTTP_TIMEOUT", "3"))
+    qr_http_max_conexiones: int = int(os.getenv("QR_HTTP_MAX_CONEXIONES", "10"))
+
+    # Caché de imágenes QR: entradas en memoria, segundos de vida, directorio
+    # opcional en disco ("" = solo memoria) y vida de la IP local detectada
+    qr_cache_max: int = int(os.getenv("QR_CACHE_MAX", "512"))
+    qr_cache_ttl: float = float(os.getenv("QR_CACHE_TTL", "86400"))
+    qr_cache_dir: str = os.getenv("QR_CACHE_DIR", "")
+    qr_ip_ttl: float = float(os.getenv("QR_IP_TTL", "60"))
+
+    # Registro de datos y fotos recibidos (/api/qr/logs): directorio ("" = Backend/qr_logs),
+    # bytes por segmento, segmentos retenidos y entradas en espera de escritura
+    qr_log_dir: str = os.getenv("QR_LOG_DIR", "")
+    qr_log_segmento_max: int = int(os.getenv("QR_LOG_SEGMENTO_MAX", str(1024 * 1024)))
+    qr_log_segmentos: int = int(os.getenv("QR_LOG_SEGMENTOS", "10"))
+    qr_log_cola_max: int = int(os.getenv("QR_LOG_COLA_MAX", "10000"))
+
+    # Inferencia YOLO por lotes: imágenes por lote, ventana para agruparlas (ms),
+    # peticiones en espera antes de responder 503 y Retry-After (s)
+    yolo_lote_max: int = int(os.getenv("YOLO_LOTE_MAX", "8"))
+    yolo_ventana_ms: float = float(os.getenv("YOLO_VENTANA_MS", "15"))
+    yolo_cola_max: int = int(os.getenv("YOLO_COLA_MAX", "32"))
+    yolo_retry_after: int = int(os.getenv("YOLO_RETRY_AFTER", "2"))
+
+    # Backend de inferencia YOLO: pytorch, onnx u openvino (los modelos se
+    # exportan con exportar_modelo.py) y si se usa la variante cuantizada INT8
+    yolo_backend: str = os.getenv("YOLO_BACKEND", "pytorch")
+    yolo_int8: bool = os.getenv("YOLO_INT8", "False").lower() == "true"
+
+    # Fotos de upload_photo: tamaño máximo (bytes) y si se guardan en disco la
+    # original y la anotada (se escriben después de responder)
+    yolo_max_bytes: int = int(os.getenv("YOLO_MAX_BYTES", str(20 * 1024 * 1024)))
+    yolo_guardar_originales: bool = os.getenv("YOLO_GUARDAR_ORIGINALES", "True").lower() == "true"
+    yolo_guardar_resultados: bool = os.getenv("YOLO_GUARDAR_RESULTADOS", "True").lower() == "true"
+
+    # Registro de modelos: nombres a precargar al iniciar (separados por coma,
+    # "" = cargar en el primer uso) y segundos sin uso antes de descargarlos (0 = nunca)
+    modelos_precarga: str = os.getenv("MODELOS_PRECARGA", "")
+    modelos_inactividad: float = float(os.getenv("MODELOS_INACTIVIDAD", "1800"))
+
+    # Clave para firmar el contenido compacto de los QR (por defecto, SECRET_KEY)
+    qr_firma_clave: str = os.getenv("QR_FIRMA_CLAVE", os.getenv("SECRET_KEY", "tu_clave_secreta_muy_segura"))
+
+    # Etiquetas QR en lote: procesos de renderizado (0 = núcleos de CPU) y
+    # máximo de etiquetas por solicitud
+    etiquetas_procesos: int = int(os.getenv("ETIQUETAS_PROCESOS", "0"))
+    etiquetas_max: int = int(os.getenv("ETIQUETAS_MAX", "5000"))
+
 settings = Settings()
@@ -0,0 +1,128 @@
+"""
+Paginación por cursor (keyset) para los endpoints de listado.
+
+El cursor es opaco para el cliente: codifica los valores de las columnas de
+orden de la última fila devuelta. La página siguiente se pide con
+`WHERE (col1, col2) > (v1, v2)` (o `<` si el orden es descendente), que usa
+el índice en lugar de recorrer y descartar las filas saltadas con OFFSET.
+"""
+
+import base64
+import json
+from dataclasses import dataclass
+from typing import Any, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Response
+
+from ..database import execute_query_async
+
+# Cabecera con el cursor de la página siguiente
+CABECERA_CURSOR = "X-Next-Cursor"
+
+def codificar_cursor(valores: Sequence[Any]) -> str:
+    """Codificar los valores de la última fila como cursor opaco"""
+    datos = json.dumps(list(valores), default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(datos.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decodificar_cursor(cursor: str, columnas: int) -> List[Any]:
+    """Decodificar un cursor recibido del cliente"""
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno).decode("utf-8"))
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+    if not isinstance(valores, list) or len(valores) != columnas:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return valores
+
+def condicion_cursor(cursor: Optional[str], columnas: Sequence[str],
+                     descendente: bool = False) -> Tuple[Optional[str], List[Any]]:
+    """
+    Condición SQL para continuar después del cursor.
+    Devuelve (None, []) si no se recibió cursor.
+    """
+    if not cursor:
+        return None, []
+
+    valores = decodificar_cursor(cursor, len(columnas))
+    operador = "<" if descendente else ">"
+    marcadores = ", ".join(["%s"] * len(columnas))
+    return f"({', '.join(columnas)}) {operador} ({marcadores})", valores
+
+def orden_cursor(columnas: Sequence[str], descendente: bool = False) -> str:
+    """Cláusula ORDER BY coherente con las columnas del cursor"""
+    direccion = " DESC" if descendente else ""
+    return ", ".join(f"{columna}{direccion}" for columna in columnas)
+
+@dataclass(frozen=True)
+class Listado:
+    """
+    Consulta base de un listado y columnas de su cursor. Los routers la
+    definen una vez a nivel de módulo y test_explain_consultas.py verifica
+    el plan de las mismas consultas que arma `consulta()`.
+    """
+    query: str
+    columnas: Tuple[str, ...]
+    descendente: bool = False
+    # Nombres de las columnas del cursor en las filas devueltas; por defecto,
+    # el nombre sin el alias de la tabla (`p.nombre` -> `nombre`)
+    claves: Optional[Tuple[str, ...]] = None
+
+    def consulta(self, conditions: Sequence[str] = (), params: Sequence[Any] = (),
+                 limit: Optional[int] = None, cursor: Optional[str] = None,
+                 skip: int = 0) -> Tuple[str, List[Any]]:
+        """
+        Completar la consulta: filtros, condición del cursor, ORDER BY por las
+        columnas del cursor y LIMIT. Se pide una fila más de `limit` para saber
+        si hay página siguiente; sin `limit` se devuelven todas las filas (las
+        exportaciones en streaming). `skip` se mantiene por compatibilidad
+        cuando no se usa cursor.
+        """
+        query = self.query
+        conditions = list(conditions)
+        params = list(params)
+
+        condicion, valores_cursor = condicion_cursor(cursor, self.columnas, self.descendente)
+        if condicion:
+            conditions.append(condicion)
+            params.extend(valores_cursor)
+
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+
+        query += f" ORDER BY {orden_cursor(self.columnas, self.descendente)}"
+        if limit is None:
+            return query, params
+
+        query += " LIMIT %s"
+        params.append(limit + 1)
+
+        if not cursor:
+            query += " OFFSET %s"
+            params.append(skip)
+
+        return query, params
+
+def agregar_siguiente_cursor(response: Response, filas: List[dict], limit: int,
+                             claves: Sequence[str]) -> List[dict]:
+    """
+    Recortar la fila extra pedida por Listado.consulta y, si la había,
+    publicar el cursor de la página siguiente
+    """
+    if len(filas) <= limit:
+        return filas
+
+    filas = filas[:limit]
+    ultima = filas[-1]
+    response.headers[CABECERA_CURSOR] = codificar_cursor([ultima[clave] for clave in claves])
+    return filas
+
+async def paginar(response: Response, listado: Listado, conditions: Sequence[str],
+                  params: Sequence[Any], limit: int, cursor: Optional[str] = None,
+                  skip: int = 0) -> List[dict]:
+    """Ejecutar un listado paginado y devolver sus filas con la cabecera X-Next-Cursor ya puesta"""
+    query, params = listado.consulta(conditions, params, limit, cursor, skip)
+    filas = await execute_query_async(query, params, fetch_all=True)
+    claves = listado.claves or [columna.split(".")[-1] for columna in listado.columnas]
+    return agregar_siguiente_cursor(response, filas or [], limit, claves)
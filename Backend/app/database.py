@@ -1,8 +1,23 @@
 import mysql.connector
 from mysql.connector import Error
 import os
+import asyncio
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from contextlib import contextmanager
+from contextlib import contextmanager, asynccontextmanager
+from fastapi import HTTPException
+
+try:
+    import aiomysql
+    AIOMYSQL_AVAILABLE = True
+except ImportError:
+    AIOMYSQL_AVAILABLE = False
+
+from .core.config import settings
 
 load_dotenv()
 
@@ -27,28 +42,319 @@ def get_database_connection():
         print(f"Error al conectar a MySQL: {e}")
         return None
 
+class PoolTimeoutError(Error):
+    """No se obtuvo una conexión del pool dentro del tiempo de espera"""
+
+class _ConexionPool:
+    """Conexión física administrada por el pool"""
+    __slots__ = ("connection", "creada_en", "ultimo_uso")
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.creada_en = time.monotonic()
+        self.ultimo_uso = self.creada_en
+
+class ConnectionPool:
+    """
+    Pool de conexiones MySQL con desborde, expiración por inactividad,
+    pre-ping y reciclaje de conexiones antiguas.
+
+    Mantiene hasta `size` conexiones ociosas; bajo carga puede abrir hasta
+    `max_overflow` conexiones adicionales que se cierran al devolverse.
+    """
+
+    def __init__(self, config, size=5, max_overflow=10, timeout=30.0,
+                 idle_timeout=300.0, recycle=3600.0, pre_ping=True):
+        self.config = config
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+
+        self._ociosas = deque()
+        self._en_uso = {}
+        self._total = 0
+        self._condicion = threading.Condition(threading.Lock())
+
+        # Estadísticas
+        self._prestamos = 0
+        self._esperas = 0
+        self._timeouts = 0
+        self._tiempo_espera_total = 0.0
+        self._tiempo_espera_max = 0.0
+        self._descartadas = 0
+
+    def _expirada(self, registro, ahora):
+        if self.recycle and ahora - registro.creada_en > self.recycle:
+            return True
+        if self.idle_timeout and ahora - registro.ultimo_uso > self.idle_timeout:
+            return True
+        return False
+
+    def _cerrar(self, registro):
+        try:
+            registro.connection.close()
+        except Exception:
+            pass
+
+    def _viva(self, registro):
+        try:
+            registro.connection.ping(reconnect=False, attempts=1, delay=0)
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        """Obtener una conexión del pool (bloquea hasta `timeout` segundos)"""
+        inicio = time.monotonic()
+        limite = inicio + self.timeout
+        espero = False
+
+        while True:
+            registro = None
+            crear = False
+            descartar = []
+
+            with self._condicion:
+                while True:
+                    ahora = time.monotonic()
+                    while self._ociosas:
+                        candidato = self._ociosas.pop()
+                        if self._expirada(candidato, ahora):
+                            descartar.append(candidato)
+                            self._total -= 1
+                            self._descartadas += 1
+                            continue
+                        registro = candidato
+                        break
+                    if registro or descartar:
+                        break
+                    if self._total < self.size + self.max_overflow:
+                        self._total += 1
+                        crear = True
+                        break
+                    restante = limite - ahora
+                    if restante <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            msg=f"Tiempo de espera agotado ({self.timeout}s) al obtener conexión del pool"
+                        )
+                    espero = True
+                    self._condicion.wait(restante)
+
+            for viejo in descartar:
+                self._cerrar(viejo)
+
+            if crear:
+                try:
+                    registro = _ConexionPool(mysql.connector.connect(**self.config))
+                except Exception:
+                    with self._condicion:
+                        self._total -= 1
+                        self._condicion.notify()
+                    raise
+            elif registro is None:
+                # Solo se descartaron conexiones expiradas; intentar de nuevo
+                continue
+            elif self.pre_ping and not self._viva(registro):
+                self._cerrar(registro)
+                with self._condicion:
+                    self._total -= 1
+                    self._descartadas += 1
+                    self._condicion.notify()
+                continue
+
+            espera = time.monotonic() - inicio
+            with self._condicion:
+                self._en_uso[id(registro.connection)] = registro
+                self._prestamos += 1
+                if espero:
+                    self._esperas += 1
+                self._tiempo_espera_total += espera
+                self._tiempo_espera_max = max(self._tiempo_espera_max, espera)
+            return registro.connection
+
+    def release(self, connection, discard=False):
+        """Devolver una conexión al pool"""
+        with self._condicion:
+            registro = self._en_uso.pop(id(connection), None)
+        if registro is None:
+            return
+
+        if not discard:
+            try:
+                if connection.in_transaction:
+                    connection.rollback()
+                if not connection.autocommit:
+                    connection.autocommit = True
+            except Exception:
+                discard = True
+
+        with self._condicion:
+            ahora = time.monotonic()
+            if discard or len(self._ociosas) >= self.size or self._expirada(registro, ahora):
+                self._total -= 1
+                if discard:
+                    self._descartadas += 1
+                cerrar = True
+            else:
+                registro.ultimo_uso = ahora
+                self._ociosas.append(registro)
+                cerrar = False
+            self._condicion.notify()
+
+        if cerrar:
+            self._cerrar(registro)
+
+    def close(self):
+        """Cerrar todas las conexiones ociosas"""
+        with self._condicion:
+            ociosas = list(self._ociosas)
+            self._ociosas.clear()
+            self._total -= len(ociosas)
+        for registro in ociosas:
+            self._cerrar(registro)
+
+    def stats(self):
+        """Estadísticas del pool para monitoreo"""
+        with self._condicion:
+            prestamos = self._prestamos
+            return {
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "total": self._total,
+                "in_use": len(self._en_uso),
+                "idle": len(self._ociosas),
+                "checkouts": prestamos,
+                "waits": self._esperas,
+                "timeouts": self._timeouts,
+                "discarded": self._descartadas,
+                "wait_time_avg_ms": round(self._tiempo_espera_total / prestamos * 1000, 3) if prestamos else 0.0,
+                "wait_time_max_ms": round(self._tiempo_espera_max * 1000, 3),
+            }
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Obtener (creando si es necesario) el pool global de conexiones"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    DB_CONFIG,
+                    size=settings.db_pool_size,
+                    max_overflow=settings.db_pool_max_overflow,
+                    timeout=settings.db_pool_timeout,
+                    idle_timeout=settings.db_pool_idle_timeout,
+                    recycle=settings.db_pool_recycle,
+                    pre_ping=settings.db_pool_pre_ping,
+                )
+    return _pool
+
+def close_pool():
+    """Cerrar el pool global (al apagar la aplicación)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
 @contextmanager
 def get_db_connection():
     """Context manager para manejar conexiones a la base de datos"""
-    connection = None
+    pool = get_pool()
     try:
-        connection = get_database_connection()
-        if connection:
-            yield connection
-        else:
-            raise HTTPException(status_code=500, detail="No se pudo conectar a la base de datos")
+        connection = pool.acquire()
     except Error as e:
-        if connection:
-            connection.rollback()
+        raise HTTPException(status_code=503, detail=f"No se pudo conectar a la base de datos: {str(e)}")
+
+    discard = False
+    try:
+        yield connection
+    except Error as e:
+        discard = not connection.is_connected()
         raise HTTPException(status_code=500, detail=f"Error de base de datos: {str(e)}")
     finally:
-        if connection and connection.is_connected():
-            connection.close()
+        pool.release(connection, discard=discard)
+
+class UnidadDeTrabajo:
+    """
+    Conexión y transacción compartidas por todas las consultas de una petición.
+    Se obtiene con `transaccion()`; el commit o rollback ocurre al salir del bloque.
+    """
 
-def execute_query(query, params=None, fetch_one=False, fetch_all=False):
-    """Ejecutar consulta SQL"""
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = 0
+        self.consultas = 0
+
+    def execute(self, query, params=None, fetch_one=False, fetch_all=False, return_id=False):
+        """Ejecutar consulta dentro de la transacción (misma firma que execute_query)"""
+        cursor = self.connection.cursor(dictionary=True, buffered=True)
+        try:
+            cursor.execute(query, params)
+            self.consultas += 1
+            self.rowcount = cursor.rowcount
+
+            if fetch_one:
+                return cursor.fetchone()
+            elif fetch_all:
+                return cursor.fetchall()
+            return cursor.lastrowid
+        finally:
+            cursor.close()
+
+    def executemany(self, query, seq_params):
+        """Ejecutar la misma sentencia para varios juegos de parámetros"""
+        cursor = self.connection.cursor(buffered=True)
+        try:
+            cursor.executemany(query, seq_params)
+            self.consultas += 1
+            self.rowcount = cursor.rowcount
+            return cursor.lastrowid
+        finally:
+            cursor.close()
+
+@contextmanager
+def transaccion():
+    """
+    Context manager de unidad de trabajo: una conexión del pool y una
+    transacción para todas las consultas del bloque.
+
+        with transaccion() as db:
+            lote = db.execute("SELECT ...", (lote_id,), fetch_one=True)
+            db.execute("UPDATE ...", (...))
+
+    Hace commit al salir sin errores y rollback si se lanza cualquier
+    excepción (incluida HTTPException), de modo que un fallo a mitad de
+    camino no deja escrituras parciales. El commit ocurre antes de que el
+    handler construya la respuesta.
+    """
     with get_db_connection() as connection:
-        cursor = connection.cursor(dictionary=True)
+        connection.start_transaction()
+        try:
+            yield UnidadDeTrabajo(connection)
+            connection.commit()
+        except Exception:
+            try:
+                connection.rollback()
+            except Error:
+                pass
+            raise
+
+def execute_query(query, params=None, fetch_one=False, fetch_all=False, return_id=False):
+    """
+    Ejecutar consulta SQL en su propia conexión del pool (autocommit).
+    Las escrituras devuelven siempre el último id insertado; `return_id`
+    se acepta por compatibilidad con los routers que lo envían.
+    """
+    with get_db_connection() as connection:
+        # Cursor con buffer: la conexión vuelve al pool sin resultados pendientes
+        cursor = connection.cursor(dictionary=True, buffered=True)
         try:
             cursor.execute(query, params)
             
@@ -65,6 +371,263 @@ def execute_query(query, params=None, fetch_one=False, fetch_all=False):
         finally:
             cursor.close()
 
+def stream_query(query, params=None, tamano_lote=500):
+    """
+    Generador que recorre una consulta grande por lotes de filas con un
+    cursor sin buffer: el servidor envía las filas a medida que se leen y
+    la memoria usada es constante. Si el consumidor abandona el recorrido,
+    la conexión se descarta en lugar de leer las filas restantes.
+    """
+    pool = get_pool()
+    try:
+        connection = pool.acquire()
+    except Error as e:
+        raise HTTPException(status_code=503, detail=f"No se pudo conectar a la base de datos: {str(e)}")
+
+    completo = False
+    cursor = None
+    try:
+        cursor = connection.cursor(dictionary=True, buffered=False)
+        cursor.execute(query, params)
+        while True:
+            filas = cursor.fetchmany(tamano_lote)
+            if not filas:
+                break
+            yield filas
+        completo = True
+    finally:
+        if cursor is not None and completo:
+            cursor.close()
+        pool.release(connection, discard=not completo)
+
+# ==================== ACCESO ASÍNCRONO ====================
+# Los handlers `async def` no deben llamar al driver bloqueante en el event
+# loop. Con aiomysql se usa un pool nativo de asyncio; sin él, las llamadas
+# bloqueantes se delegan a un pool de hilos acotado.
+
+_executor = None
+_executor_lock = threading.Lock()
+_async_pool = None
+_async_pool_lock = None
+
+if AIOMYSQL_AVAILABLE:
+    _ERRORES_DB = (Error, aiomysql.Error)
+else:
+    _ERRORES_DB = (Error,)
+
+def usa_aiomysql():
+    """Indica si el acceso asíncrono usa aiomysql en lugar del pool de hilos"""
+    return AIOMYSQL_AVAILABLE and settings.db_async_driver.lower() == "aiomysql"
+
+def get_executor():
+    """Pool de hilos acotado para llamadas bloqueantes a la base de datos"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.db_thread_pool_size,
+                    thread_name_prefix="db"
+                )
+    return _executor
+
+async def ejecutar_en_hilo(func, *args, **kwargs):
+    """Ejecutar una función bloqueante en el pool de hilos sin frenar el event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+async def get_async_pool():
+    """Obtener (creando si es necesario) el pool aiomysql"""
+    global _async_pool, _async_pool_lock
+    if _async_pool is None:
+        if _async_pool_lock is None:
+            _async_pool_lock = asyncio.Lock()
+        async with _async_pool_lock:
+            if _async_pool is None:
+                _async_pool = await aiomysql.create_pool(
+                    host=DB_CONFIG['host'],
+                    port=DB_CONFIG['port'],
+                    user=DB_CONFIG['user'],
+                    password=DB_CONFIG['password'],
+                    db=DB_CONFIG['database'],
+                    charset=DB_CONFIG['charset'],
+                    autocommit=True,
+                    minsize=1,
+                    maxsize=settings.db_pool_size + settings.db_pool_max_overflow,
+                    pool_recycle=int(settings.db_pool_recycle)
+                )
+    return _async_pool
+
+async def close_async_pool():
+    """Cerrar el pool aiomysql y el pool de hilos (al apagar la aplicación)"""
+    global _async_pool, _executor
+    if _async_pool is not None:
+        _async_pool.close()
+        await _async_pool.wait_closed()
+        _async_pool = None
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+def async_stats():
+    """Estadísticas del acceso asíncrono para monitoreo"""
+    if usa_aiomysql():
+        return {
+            "driver": "aiomysql",
+            "size": _async_pool.size if _async_pool else 0,
+            "free": _async_pool.freesize if _async_pool else 0,
+            "maxsize": settings.db_pool_size + settings.db_pool_max_overflow,
+        }
+    return {"driver": "hilos", "max_workers": settings.db_thread_pool_size}
+
+async def execute_query_async(query, params=None, fetch_one=False, fetch_all=False, return_id=False):
+    """Versión asíncrona de execute_query (misma firma y resultados)"""
+    if not usa_aiomysql():
+        return await ejecutar_en_hilo(execute_query, query, params, fetch_one, fetch_all)
+
+    pool = await get_async_pool()
+    try:
+        async with pool.acquire() as connection:
+            async with connection.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(query, params)
+
+                if fetch_one:
+                    return await cursor.fetchone()
+                elif fetch_all:
+                    return await cursor.fetchall()
+                return cursor.lastrowid
+    except _ERRORES_DB as e:
+        raise HTTPException(status_code=500, detail=f"Error en consulta: {str(e)}")
+
+async def stream_query_async(query, params=None, tamano_lote=500):
+    """Versión asíncrona de stream_query: generador asíncrono de lotes de filas"""
+    if not usa_aiomysql():
+        generador = stream_query(query, params, tamano_lote)
+        try:
+            while True:
+                filas = await ejecutar_en_hilo(next, generador, None)
+                if filas is None:
+                    break
+                yield filas
+        finally:
+            await ejecutar_en_hilo(generador.close)
+        return
+
+    pool = await get_async_pool()
+    connection = await pool.acquire()
+    completo = False
+    try:
+        cursor = await connection.cursor(aiomysql.SSDictCursor)
+        await cursor.execute(query, params)
+        while True:
+            filas = await cursor.fetchmany(tamano_lote)
+            if not filas:
+                break
+            yield filas
+        await cursor.close()
+        completo = True
+    finally:
+        if not completo:
+            # Quedan filas sin leer: cerrar la conexión en vez de drenarla
+            connection.close()
+        pool.release(connection)
+
+class UnidadDeTrabajoAsync:
+    """Versión asíncrona de UnidadDeTrabajo; se obtiene con `transaccion_async()`"""
+
+    def __init__(self, connection, sincrona=None):
+        self.connection = connection
+        self._sincrona = sincrona
+        self.rowcount = 0
+        self.consultas = 0
+
+    async def execute(self, query, params=None, fetch_one=False, fetch_all=False, return_id=False):
+        """Ejecutar consulta dentro de la transacción (misma firma que execute_query)"""
+        if self._sincrona is not None:
+            resultado = await ejecutar_en_hilo(self._sincrona.execute, query, params, fetch_one, fetch_all)
+            self.rowcount = self._sincrona.rowcount
+            self.consultas = self._sincrona.consultas
+            return resultado
+
+        async with self.connection.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(query, params)
+            self.consultas += 1
+            self.rowcount = cursor.rowcount
+
+            if fetch_one:
+                return await cursor.fetchone()
+            elif fetch_all:
+                return await cursor.fetchall()
+            return cursor.lastrowid
+
+    async def executemany(self, query, seq_params):
+        """Ejecutar la misma sentencia para varios juegos de parámetros"""
+        if self._sincrona is not None:
+            resultado = await ejecutar_en_hilo(self._sincrona.executemany, query, seq_params)
+            self.rowcount = self._sincrona.rowcount
+            self.consultas = self._sincrona.consultas
+            return resultado
+
+        async with self.connection.cursor() as cursor:
+            await cursor.executemany(query, seq_params)
+            self.consultas += 1
+            self.rowcount = cursor.rowcount
+            return cursor.lastrowid
+
+@asynccontextmanager
+async def transaccion_async():
+    """
+    Versión asíncrona de `transaccion()`:
+
+        async with transaccion_async() as db:
+            lote = await db.execute("SELECT ...", (lote_id,), fetch_one=True)
+
+    Commit al salir sin errores, rollback ante cualquier excepción.
+    """
+    if usa_aiomysql():
+        pool = await get_async_pool()
+        try:
+            connection = await pool.acquire()
+        except _ERRORES_DB as e:
+            raise HTTPException(status_code=503, detail=f"No se pudo conectar a la base de datos: {str(e)}")
+
+        try:
+            await connection.begin()
+            yield UnidadDeTrabajoAsync(connection)
+            await connection.commit()
+        except Exception as e:
+            try:
+                await connection.rollback()
+            except Exception:
+                pass
+            if isinstance(e, _ERRORES_DB):
+                raise HTTPException(status_code=500, detail=f"Error de base de datos: {str(e)}") from e
+            raise
+        finally:
+            pool.release(connection)
+        return
+
+    pool = get_pool()
+    try:
+        connection = await ejecutar_en_hilo(pool.acquire)
+    except Error as e:
+        raise HTTPException(status_code=503, detail=f"No se pudo conectar a la base de datos: {str(e)}")
+
+    try:
+        await ejecutar_en_hilo(connection.start_transaction)
+        yield UnidadDeTrabajoAsync(connection, UnidadDeTrabajo(connection))
+        await ejecutar_en_hilo(connection.commit)
+    except Exception as e:
+        try:
+            await ejecutar_en_hilo(connection.rollback)
+        except Exception:
+            pass
+        if isinstance(e, Error):
+            raise HTTPException(status_code=500, detail=f"Error de base de datos: {str(e)}") from e
+        raise
+    finally:
+        await ejecutar_en_hilo(pool.release, connection)
+
 def init_database():
     """Inicializar la base de datos con las tablas necesarias"""
     try:
@@ -101,6 +664,7 @@ def init_database():
                     categoria VARCHAR(100),
                     unidad_medida VARCHAR(20) DEFAULT 'unidad',
                     stock_minimo INT DEFAULT 0,
+                    stock_actual INT NOT NULL DEFAULT 0,
                     es_material_formacion BOOLEAN DEFAULT FALSE,
                     activo BOOLEAN DEFAULT TRUE,
                     fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -163,22 +727,82 @@ def init_database():
                 )
             """)
             
-            # Crear triggers para actualizar stock automáticamente
+            # Bases creadas antes de materializar stock_actual
             cursor.execute("""
-                CREATE TRIGGER IF NOT EXISTS actualizar_stock_producto
+                SELECT COUNT(*) FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'productos' AND COLUMN_NAME = 'stock_actual'
+            """, (DB_CONFIG['database'],))
+            columna_nueva = cursor.fetchone()[0] == 0
+            if columna_nueva:
+                cursor.execute(
+                    "ALTER TABLE productos ADD COLUMN stock_actual INT NOT NULL DEFAULT 0 AFTER stock_minimo"
+                )
+            
+            # Triggers que mantienen productos.stock_actual por diferencias:
+            # cada cambio en un lote suma o resta solo su variación
+            cursor.execute("DROP TRIGGER IF EXISTS actualizar_stock_producto")
+            
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS stock_lote_insertado
+                AFTER INSERT ON lotes
+                FOR EACH ROW
+                BEGIN
+                    IF NEW.activo THEN
+                        UPDATE productos
+                        SET stock_actual = stock_actual + NEW.cantidad_disponible
+                        WHERE id = NEW.producto_id;
+                    END IF;
+                END
+            """)
+            
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS stock_lote_actualizado
                 AFTER UPDATE ON lotes
                 FOR EACH ROW
                 BEGIN
-                    UPDATE productos 
-                    SET stock_actual = (
-                        SELECT COALESCE(SUM(cantidad_disponible), 0)
-                        FROM lotes 
-                        WHERE producto_id = NEW.producto_id AND activo = TRUE
-                    )
-                    WHERE id = NEW.producto_id;
+                    DECLARE anterior INT DEFAULT 0;
+                    DECLARE nuevo INT DEFAULT 0;
+                    IF OLD.activo THEN
+                        SET anterior = OLD.cantidad_disponible;
+                    END IF;
+                    IF NEW.activo THEN
+                        SET nuevo = NEW.cantidad_disponible;
+                    END IF;
+                    IF OLD.producto_id <> NEW.producto_id THEN
+                        UPDATE productos SET stock_actual = stock_actual - anterior WHERE id = OLD.producto_id;
+                        UPDATE productos SET stock_actual = stock_actual + nuevo WHERE id = NEW.producto_id;
+                    ELSEIF nuevo <> anterior THEN
+                        UPDATE productos SET stock_actual = stock_actual + (nuevo - anterior) WHERE id = NEW.producto_id;
+                    END IF;
                 END
             """)
             
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS stock_lote_eliminado
+                AFTER DELETE ON lotes
+                FOR EACH ROW
+                BEGIN
+                    IF OLD.activo THEN
+                        UPDATE productos
+                        SET stock_actual = stock_actual - OLD.cantidad_disponible
+                        WHERE id = OLD.producto_id;
+                    END IF;
+                END
+            """)
+            
+            if columna_nueva:
+                # Carga inicial del stock materializado
+                cursor.execute("""
+                    UPDATE productos p
+                    LEFT JOIN (
+                        SELECT producto_id, SUM(cantidad_disponible) AS total
+                        FROM lotes
+                        WHERE activo = TRUE
+                        GROUP BY producto_id
+                    ) s ON s.producto_id = p.id
+                    SET p.stock_actual = COALESCE(s.total, 0)
+                """)
+            
             cursor.execute("""
                 CREATE TRIGGER IF NOT EXISTS actualizar_estado_lote
                 BEFORE UPDATE ON lotes
@@ -11,7 +11,22 @@ load_dotenv()
 
 # Importar routers
 from .routers import auth, productos, lotes, alertas, movimientos, qr
-from .database import get_database_connection
+from .database import execute_query_async, get_pool, close_pool, close_async_pool, async_stats, ejecutar_en_hilo
+from .migraciones import aplicar_migraciones
+from .services.stock_service import stock_service
+from .services.oauth_service import oauth_service
+from .services.etiquetas_qr import etiquetas_service
+from .services.registro_qr import registro_qr
+from .services.inferencia_service import inferencia_service
+from .services.modelos import modelos
+from .core.cache import cache_usuarios
+from .auth.security import hash_stats, close_hash_executor
+
+# QRService requiere pyzbar (opcional): si no está, no hay sesión HTTP que cerrar
+try:
+    from .services.qr_service import qr_service
+except ImportError:
+    qr_service = None
 
 app = FastAPI(
     title="Sistema de Gestión de Inventario",
@@ -26,6 +41,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Incluir routers
@@ -44,18 +60,43 @@ async def root():
         "timestamp": datetime.now().isoformat()
     }
 
+@app.on_event("startup")
+async def startup_event():
+    # Migraciones pendientes (p. ej. oauth_tokens para OAUTH_TOKEN_STORE=sql)
+    try:
+        aplicadas = await ejecutar_en_hilo(aplicar_migraciones)
+        if aplicadas:
+            print(f"✅ Migraciones aplicadas: {', '.join(map(str, aplicadas))}")
+    except Exception as e:
+        print(f"❌ Error al aplicar migraciones: {e}")
+    stock_service.iniciar()
+    oauth_service.iniciar_barrido()
+    registro_qr.iniciar()
+    inferencia_service.iniciar()
+    modelos.iniciar()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await stock_service.detener()
+    await oauth_service.detener_barrido()
+    await close_async_pool()
+    close_pool()
+    close_hash_executor()
+    etiquetas_service.cerrar()
+    if qr_service is not None:
+        qr_service.cerrar()
+    registro_qr.detener()
+    await inferencia_service.detener()
+    await modelos.detener()
+
 @app.get("/health")
 async def health_check():
     try:
-        # Verificar conexión a la base de datos
-        conn = get_database_connection()
-        if conn:
-            conn.close()
-            return {"status": "healthy", "database": "connected"}
-        else:
-            return {"status": "unhealthy", "database": "disconnected"}
+        # Verificar conexión a la base de datos sin bloquear el event loop
+        await execute_query_async("SELECT 1", fetch_one=True)
+        return {"status": "healthy", "database": "connected", "pool": get_pool().stats(), "async": async_stats(), "cache_usuarios": cache_usuarios.stats(), "hashing": hash_stats()}
     except Exception as e:
-        return {"status": "unhealthy", "error": str(e)}
+        return {"status": "unhealthy", "database": "disconnected", "error": str(e), "pool": get_pool().stats(), "async": async_stats(), "cache_usuarios": cache_usuarios.stats(), "hashing": hash_stats()}
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
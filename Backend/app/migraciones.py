@@ -0,0 +1,181 @@
+"""
+Migraciones versionadas del esquema
+Cada migración se aplica una sola vez y queda registrada en la tabla
+schema_migraciones. Se ejecutan desde init_db.py después de init_database()
+y al iniciar la aplicación (las ya aplicadas solo cuestan una consulta).
+Una migración con pasos omitidos (tabla todavía inexistente) no se registra:
+queda pendiente y se reintenta en la siguiente ejecución.
+"""
+
+from typing import Callable, List, Tuple, Union
+
+from mysql.connector import Error
+
+from .database import get_database_connection, DB_CONFIG
+
+def _tabla_existe(cursor, tabla: str) -> bool:
+    cursor.execute(
+        """SELECT COUNT(*) FROM information_schema.TABLES
+           WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s""",
+        (DB_CONFIG['database'], tabla)
+    )
+    return cursor.fetchone()[0] > 0
+
+def _indice_existe(cursor, tabla: str, nombre: str) -> bool:
+    cursor.execute(
+        """SELECT COUNT(*) FROM information_schema.STATISTICS
+           WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND INDEX_NAME = %s""",
+        (DB_CONFIG['database'], tabla, nombre)
+    )
+    return cursor.fetchone()[0] > 0
+
+def crear_indice(tabla: str, nombre: str, columnas: str) -> Callable:
+    """
+    Paso de migración que crea un índice si la tabla existe y el índice no.
+    Si la tabla (ordenes, proveedores, ...) todavía no existe devuelve False
+    y la migración queda pendiente para crear el índice cuando exista.
+    """
+    def paso(cursor) -> bool:
+        if not _tabla_existe(cursor, tabla):
+            print(f"   - {tabla} no existe, {nombre} queda pendiente")
+            return False
+        if _indice_existe(cursor, tabla, nombre):
+            return True
+        cursor.execute(f"CREATE INDEX {nombre} ON {tabla} ({columnas})")
+        print(f"   - {nombre} ON {tabla} ({columnas})")
+        return True
+    return paso
+
+def _columna_existe(cursor, tabla: str, columna: str) -> bool:
+    cursor.execute(
+        """SELECT COUNT(*) FROM information_schema.COLUMNS
+           WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND COLUMN_NAME = %s""",
+        (DB_CONFIG['database'], tabla, columna)
+    )
+    return cursor.fetchone()[0] > 0
+
+def agregar_columna(tabla: str, columna: str, definicion: str) -> Callable:
+    """Paso de migración que agrega una columna si no existe (MySQL no tiene ADD COLUMN IF NOT EXISTS)"""
+    def paso(cursor) -> bool:
+        if not _tabla_existe(cursor, tabla):
+            print(f"   - {tabla} no existe, {columna} queda pendiente")
+            return False
+        if _columna_existe(cursor, tabla, columna):
+            return True
+        cursor.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
+        print(f"   - {tabla}.{columna} {definicion}")
+        return True
+    return paso
+
+Paso = Union[str, Callable]
+
+# (versión, descripción, pasos). Nunca modificar una migración ya publicada:
+# los cambios nuevos van en una versión nueva al final de la lista. Los pasos
+# deben poder repetirse (IF NOT EXISTS, crear_indice), porque una migración
+# pendiente se vuelve a ejecutar completa.
+MIGRACIONES: List[Tuple[int, str, List[Paso]]] = [
+    (1, "Índices para los filtros y ordenamientos de los routers", [
+        # Listado e historial de movimientos (orden por fecha + cursor)
+        crear_indice("movimientos", "idx_movimientos_fecha", "fecha_movimiento, id"),
+        crear_indice("movimientos", "idx_movimientos_usuario_fecha", "usuario_id, fecha_movimiento, id"),
+        crear_indice("movimientos", "idx_movimientos_tipo_fecha", "tipo, fecha_movimiento, id"),
+        crear_indice("movimientos", "idx_movimientos_lote_fecha", "lote_id, fecha_movimiento, id"),
+        # Alertas pendientes y listado por fecha
+        crear_indice("alertas", "idx_alertas_atendida_fecha", "atendida, fecha_creacion, id"),
+        crear_indice("alertas", "idx_alertas_fecha", "fecha_creacion, id"),
+        # Lotes próximos a vencer / vencidos y filtro por estado
+        crear_indice("lotes", "idx_lotes_activo_vencimiento", "activo, fecha_vencimiento"),
+        crear_indice("lotes", "idx_lotes_estado", "estado, activo"),
+        crear_indice("lotes", "idx_lotes_producto_activo", "producto_id, activo"),
+        # Productos por nombre, categoría y materiales de formación
+        crear_indice("productos", "idx_productos_nombre", "nombre, id"),
+        crear_indice("productos", "idx_productos_activo_nombre", "activo, nombre, id"),
+        crear_indice("productos", "idx_productos_categoria", "categoria, nombre, id"),
+        crear_indice("productos", "idx_productos_material", "es_material_formacion, activo, nombre"),
+        # Órdenes por usuario y fecha, proveedores por nombre
+        crear_indice("ordenes", "idx_ordenes_usuario_fecha", "id_usuario, fecha_orden"),
+        crear_indice("ordenes", "idx_ordenes_fecha", "fecha_orden, id_orden"),
+        crear_indice("proveedores", "idx_proveedores_nombre", "nombre, id_proveedor"),
+    ]),
+    (2, "Tabla oauth_tokens para refresh tokens y códigos de autorización", [
+        # token_hash = SHA-256 del token; expires_at en segundos desde epoch
+        """CREATE TABLE IF NOT EXISTS oauth_tokens (
+               token_hash CHAR(64) PRIMARY KEY,
+               tipo ENUM('refresh', 'codigo') NOT NULL,
+               datos JSON NOT NULL,
+               expires_at DOUBLE NOT NULL,
+               fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+               INDEX idx_oauth_tokens_expira (expires_at)
+           )""",
+    ]),
+    (3, "Índice por fecha de actualización para el refresco del catálogo", [
+        crear_indice("productos", "idx_productos_actualizacion", "fecha_actualizacion"),
+    ]),
+    (4, "Marca de carga masiva en movimientos para recuperar los ids insertados", [
+        agregar_columna("movimientos", "carga_masiva", "CHAR(32) NULL"),
+        crear_indice("movimientos", "idx_movimientos_carga_masiva", "carga_masiva"),
+    ]),
+]
+
+def aplicar_migraciones() -> List[int]:
+    """Aplicar las migraciones pendientes; devuelve las versiones aplicadas"""
+    connection = get_database_connection()
+    if not connection:
+        raise RuntimeError("No se pudo conectar a la base de datos para migrar")
+
+    aplicadas = []
+    cursor = connection.cursor()
+    try:
+        # Evitar que dos procesos migren a la vez
+        cursor.execute("SELECT GET_LOCK('schema_migraciones', 60)")
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("Otro proceso está aplicando migraciones")
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migraciones (
+                version INT PRIMARY KEY,
+                descripcion VARCHAR(200) NOT NULL,
+                fecha_aplicacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("SELECT version FROM schema_migraciones")
+        existentes = {fila[0] for fila in cursor.fetchall()}
+
+        for version, descripcion, pasos in MIGRACIONES:
+            if version in existentes:
+                continue
+
+            print(f"🔧 Migración {version}: {descripcion}")
+            completa = True
+            for paso in pasos:
+                if callable(paso):
+                    # Un paso que devuelve False se omitió y se reintentará
+                    completa = paso(cursor) is not False and completa
+                else:
+                    cursor.execute(paso)
+
+            if not completa:
+                connection.commit()
+                print(f"   ⚠️  Migración {version} incompleta, queda pendiente")
+                continue
+
+            cursor.execute(
+                "INSERT INTO schema_migraciones (version, descripcion) VALUES (%s, %s)",
+                (version, descripcion)
+            )
+            connection.commit()
+            aplicadas.append(version)
+
+        return aplicadas
+
+    except Error as e:
+        connection.rollback()
+        raise RuntimeError(f"Error al aplicar migraciones: {e}")
+    finally:
+        try:
+            cursor.execute("SELECT RELEASE_LOCK('schema_migraciones')")
+            cursor.fetchall()
+        except Error:
+            pass
+        cursor.close()
+        connection.close()
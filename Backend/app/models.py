@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List
 from datetime import datetime, date
 from enum import Enum
@@ -160,6 +160,20 @@ class MovimientoConDetalles(Movimiento):
     lote: Lote
     usuario: UsuarioResponse
 
+class ResultadoMovimientoMasivo(BaseModel):
+    indice: int
+    lote_id: int
+    exito: bool
+    movimiento_id: Optional[int] = None
+    cantidad_disponible: Optional[int] = None
+    error: Optional[str] = None
+
+class MovimientosMasivoResponse(BaseModel):
+    total: int
+    exitosos: int
+    fallidos: int
+    resultados: List[ResultadoMovimientoMasivo]
+
 # Modelos de Alerta
 class AlertaBase(BaseModel):
     tipo: TipoAlerta
@@ -221,3 +235,15 @@ class ReporteInventario(BaseModel):
     lotes_proximos_vencer: int
     lotes_vencidos: int
     valor_total_inventario: float
+
+# Modelos de etiquetas QR
+class EtiquetasRequest(BaseModel):
+    producto_ids: List[int] = []
+    lote_ids: List[int] = []
+    categoria: Optional[str] = None
+    orden_id: Optional[int] = None
+    formato: str = Field("pdf", pattern="^(pdf|png|zip)$")  # pdf paginado, zip de páginas png o zip por etiqueta
+    copias: int = Field(1, ge=1, le=100)
+    columnas: int = Field(4, ge=1, le=8)
+    filas: int = Field(6, ge=1, le=12)
+    error_correction: str = Field("M", pattern="^[LMQH]$")
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from typing import List, Optional
 from datetime import datetime
 
@@ -6,25 +6,30 @@ from ..models import (
     Alerta, AlertaCreate, AlertaUpdate, AlertaConDetalles,
     MessageResponse
 )
-from ..database import execute_query
+from ..core.paginacion import Listado, paginar
+from ..database import execute_query_async, transaccion_async
 from .auth import get_current_user, UsuarioResponse
 
 router = APIRouter()
 
+# Listado de alertas, las más recientes primero
+LISTADO_ALERTAS = Listado("SELECT * FROM alertas", ("fecha_creacion", "id"), descendente=True)
+
+CONSULTA_PENDIENTES = "SELECT * FROM alertas WHERE atendida = FALSE ORDER BY fecha_creacion DESC"
+
 @router.get("/", response_model=List[Alerta])
 async def get_alertas(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     tipo: Optional[str] = Query(None),
     nivel: Optional[str] = Query(None),
     atendida: Optional[bool] = Query(None),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (cabecera X-Next-Cursor)"),
     current_user: UsuarioResponse = Depends(get_current_user)
 ):
     """Obtener lista de alertas"""
     try:
-        # Construir consulta base
-        query = "SELECT * FROM alertas"
-        
         conditions = []
         params = []
         
@@ -40,15 +45,10 @@ async def get_alertas(
             conditions.append("atendida = %s")
             params.append(atendida)
         
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-        
-        query += " ORDER BY fecha_creacion DESC LIMIT %s OFFSET %s"
-        params.extend([limit, skip])
-        
-        alertas = execute_query(query, params, fetch_all=True)
-        return alertas
+        return await paginar(response, LISTADO_ALERTAS, conditions, params, limit, cursor, skip)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener alertas: {str(e)}")
 
@@ -59,7 +59,7 @@ async def get_alerta(
 ):
     """Obtener alerta específica"""
     try:
-        alerta = execute_query(
+        alerta = await execute_query_async(
             """SELECT a.*, p.codigo as producto_codigo, p.nombre as producto_nombre,
                       l.numero_lote as lote_numero
                FROM alertas a
@@ -115,52 +115,53 @@ async def create_alerta(
 ):
     """Crear nueva alerta"""
     try:
-        # Verificar que al menos uno de producto_id o lote_id esté presente
-        if not alerta_data.producto_id and not alerta_data.lote_id:
-            raise HTTPException(status_code=400, detail="Debe especificar al menos un producto o lote")
-        
-        # Verificar que el producto existe (si se especifica)
-        if alerta_data.producto_id:
-            producto = execute_query(
-                "SELECT id FROM productos WHERE id = %s AND activo = TRUE",
-                (alerta_data.producto_id,),
-                fetch_one=True
+        async with transaccion_async() as db:
+            # Verificar que al menos uno de producto_id o lote_id esté presente
+            if not alerta_data.producto_id and not alerta_data.lote_id:
+                raise HTTPException(status_code=400, detail="Debe especificar al menos un producto o lote")
+            
+            # Verificar que el producto existe (si se especifica)
+            if alerta_data.producto_id:
+                producto = await db.execute(
+                    "SELECT id FROM productos WHERE id = %s AND activo = TRUE",
+                    (alerta_data.producto_id,),
+                    fetch_one=True
+                )
+                if not producto:
+                    raise HTTPException(status_code=404, detail="Producto no encontrado")
+            
+            # Verificar que el lote existe (si se especifica)
+            if alerta_data.lote_id:
+                lote = await db.execute(
+                    "SELECT id FROM lotes WHERE id = %s AND activo = TRUE",
+                    (alerta_data.lote_id,),
+                    fetch_one=True
+                )
+                if not lote:
+                    raise HTTPException(status_code=404, detail="Lote no encontrado")
+            
+            # Insertar nueva alerta
+            alerta_id = await db.execute(
+                """INSERT INTO alertas (tipo, producto_id, lote_id, mensaje, nivel)
+                   VALUES (%s, %s, %s, %s, %s)""",
+                (
+                    alerta_data.tipo,
+                    alerta_data.producto_id,
+                    alerta_data.lote_id,
+                    alerta_data.mensaje,
+                    alerta_data.nivel
+                )
             )
-            if not producto:
-                raise HTTPException(status_code=404, detail="Producto no encontrado")
-        
-        # Verificar que el lote existe (si se especifica)
-        if alerta_data.lote_id:
-            lote = execute_query(
-                "SELECT id FROM lotes WHERE id = %s AND activo = TRUE",
-                (alerta_data.lote_id,),
+            
+            # Obtener la alerta creada
+            alerta = await db.execute(
+                "SELECT * FROM alertas WHERE id = %s",
+                (alerta_id,),
                 fetch_one=True
             )
-            if not lote:
-                raise HTTPException(status_code=404, detail="Lote no encontrado")
-        
-        # Insertar nueva alerta
-        alerta_id = execute_query(
-            """INSERT INTO alertas (tipo, producto_id, lote_id, mensaje, nivel)
-               VALUES (%s, %s, %s, %s, %s)""",
-            (
-                alerta_data.tipo,
-                alerta_data.producto_id,
-                alerta_data.lote_id,
-                alerta_data.mensaje,
-                alerta_data.nivel
-            )
-        )
-        
-        # Obtener la alerta creada
-        alerta = execute_query(
-            "SELECT * FROM alertas WHERE id = %s",
-            (alerta_id,),
-            fetch_one=True
-        )
-        
-        return alerta
-        
+            
+            return alerta
+            
     except HTTPException:
         raise
     except Exception as e:
@@ -174,51 +175,52 @@ async def update_alerta(
 ):
     """Actualizar alerta"""
     try:
-        # Verificar si la alerta existe
-        existing = execute_query(
-            "SELECT id FROM alertas WHERE id = %s",
-            (alerta_id,),
-            fetch_one=True
-        )
-        
-        if not existing:
-            raise HTTPException(status_code=404, detail="Alerta no encontrada")
-        
-        # Construir consulta de actualización
-        update_fields = []
-        params = []
-        
-        if alerta_data.atendida is not None:
-            update_fields.append("atendida = %s")
-            params.append(alerta_data.atendida)
+        async with transaccion_async() as db:
+            # Verificar si la alerta existe
+            existing = await db.execute(
+                "SELECT id FROM alertas WHERE id = %s",
+                (alerta_id,),
+                fetch_one=True
+            )
+            
+            if not existing:
+                raise HTTPException(status_code=404, detail="Alerta no encontrada")
+            
+            # Construir consulta de actualización
+            update_fields = []
+            params = []
+            
+            if alerta_data.atendida is not None:
+                update_fields.append("atendida = %s")
+                params.append(alerta_data.atendida)
+                
+                if alerta_data.atendida:
+                    update_fields.append("fecha_atencion = %s")
+                    params.append(datetime.now())
             
-            if alerta_data.atendida:
+            if alerta_data.fecha_atencion is not None:
                 update_fields.append("fecha_atencion = %s")
-                params.append(datetime.now())
-        
-        if alerta_data.fecha_atencion is not None:
-            update_fields.append("fecha_atencion = %s")
-            params.append(alerta_data.fecha_atencion)
-        
-        if not update_fields:
-            raise HTTPException(status_code=400, detail="No hay campos para actualizar")
-        
-        params.append(alerta_id)
-        
-        execute_query(
-            f"UPDATE alertas SET {', '.join(update_fields)} WHERE id = %s",
-            params
-        )
-        
-        # Obtener la alerta actualizada
-        alerta = execute_query(
-            "SELECT * FROM alertas WHERE id = %s",
-            (alerta_id,),
-            fetch_one=True
-        )
-        
-        return alerta
-        
+                params.append(alerta_data.fecha_atencion)
+            
+            if not update_fields:
+                raise HTTPException(status_code=400, detail="No hay campos para actualizar")
+            
+            params.append(alerta_id)
+            
+            await db.execute(
+                f"UPDATE alertas SET {', '.join(update_fields)} WHERE id = %s",
+                params
+            )
+            
+            # Obtener la alerta actualizada
+            alerta = await db.execute(
+                "SELECT * FROM alertas WHERE id = %s",
+                (alerta_id,),
+                fetch_one=True
+            )
+            
+            return alerta
+            
     except HTTPException:
         raise
     except Exception as e:
@@ -230,7 +232,7 @@ async def get_alertas_con_detalles(
 ):
     """Obtener alertas con detalles de productos y lotes"""
     try:
-        alertas = execute_query(
+        alertas = await execute_query_async(
             """SELECT a.*, p.codigo as producto_codigo, p.nombre as producto_nombre,
                       l.numero_lote as lote_numero
                FROM alertas a
@@ -283,8 +285,8 @@ async def get_alertas_pendientes(
 ):
     """Obtener alertas pendientes"""
     try:
-        alertas = execute_query(
-            "SELECT * FROM alertas WHERE atendida = FALSE ORDER BY fecha_creacion DESC",
+        alertas = await execute_query_async(
+            CONSULTA_PENDIENTES,
             fetch_all=True
         )
         
@@ -300,27 +302,28 @@ async def marcar_alerta_atendida(
 ):
     """Marcar alerta como atendida"""
     try:
-        # Verificar si la alerta existe
-        existing = execute_query(
-            "SELECT id FROM alertas WHERE id = %s",
-            (alerta_id,),
-            fetch_one=True
-        )
-        
-        if not existing:
-            raise HTTPException(status_code=404, detail="Alerta no encontrada")
-        
-        # Marcar como atendida
-        execute_query(
-            "UPDATE alertas SET atendida = TRUE, fecha_atencion = %s WHERE id = %s",
-            (datetime.now(), alerta_id)
-        )
-        
-        return MessageResponse(
-            message="Alerta marcada como atendida exitosamente",
-            success=True
-        )
-        
+        async with transaccion_async() as db:
+            # Verificar si la alerta existe
+            existing = await db.execute(
+                "SELECT id FROM alertas WHERE id = %s",
+                (alerta_id,),
+                fetch_one=True
+            )
+            
+            if not existing:
+                raise HTTPException(status_code=404, detail="Alerta no encontrada")
+            
+            # Marcar como atendida
+            await db.execute(
+                "UPDATE alertas SET atendida = TRUE, fecha_atencion = %s WHERE id = %s",
+                (datetime.now(), alerta_id)
+            )
+            
+            return MessageResponse(
+                message="Alerta marcada como atendida exitosamente",
+                success=True
+            )
+            
     except HTTPException:
         raise
     except Exception as e:
@@ -1,13 +1,13 @@
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import HTTPBearer
-import bcrypt
 import jwt
 from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
 from ..models import UsuarioLogin, UsuarioCreate, UsuarioResponse, TokenResponse, MessageResponse
-from ..database import execute_query
-from ..auth.security import verify_password, hash_password
+from ..database import execute_query_async, transaccion_async
+from ..auth.security import hash_password_async, verificar_credenciales
+from ..core.cache import cache_usuarios
 from pydantic import BaseModel
 
 # Modelos adicionales para auth
@@ -43,16 +43,6 @@ SECRET_KEY = os.getenv("SECRET_KEY", "tu_clave_secreta_muy_segura")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-def hash_password(password: str) -> str:
-    """Hashear contraseña con bcrypt"""
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
-
-def verify_password(password: str, hashed_password: str) -> bool:
-    """Verificar contraseña con bcrypt"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
-
 def create_access_token(data: dict):
     """Crear token JWT"""
     to_encode = data.copy()
@@ -61,7 +51,7 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(security)):
+async def get_current_user(token: str = Depends(security)):
     """Obtener usuario actual desde el token"""
     try:
         # Decodificar el token JWT
@@ -75,8 +65,13 @@ def get_current_user(token: str = Depends(security)):
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
+        # Usuario en caché (activo y vigente) sin consultar la base de datos
+        usuario = cache_usuarios.get(int(user_id))
+        if usuario is not None:
+            return usuario
+        
         # Buscar usuario en la base de datos
-        user = execute_query(
+        user = await execute_query_async(
             "SELECT id, documento, nombre, email, rol, activo FROM usuarios WHERE id = %s",
             (user_id,),
             fetch_one=True
@@ -96,7 +91,7 @@ def get_current_user(token: str = Depends(security)):
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        return UsuarioResponse(
+        usuario = UsuarioResponse(
             id=user['id'],
             documento=user['documento'],
             nombre=user['nombre'],
@@ -104,6 +99,8 @@ def get_current_user(token: str = Depends(security)):
             rol=user['rol'],
             activo=user['activo']
         )
+        cache_usuarios.set(user['id'], usuario)
+        return usuario
         
     except jwt.ExpiredSignatureError:
         raise HTTPException(
@@ -128,10 +125,10 @@ def get_current_user(token: str = Depends(security)):
 
 
 @router.post("/login", response_model=LoginResponse)
-def login(payload: LoginRequest):
+async def login(payload: LoginRequest):
     try:
         # Buscar usuario por documento
-        user = execute_query(
+        user = await execute_query_async(
             "SELECT id, documento, nombre, email, rol, password_hash, activo FROM usuarios WHERE documento = %s",
             (payload.documento,),
             fetch_one=True
@@ -143,8 +140,8 @@ def login(payload: LoginRequest):
         if not user['activo']:
             raise HTTPException(status_code=401, detail="Usuario inactivo")
         
-        # Verificar contraseña
-        if not verify_password(payload.password, user['password_hash']):
+        # Verificar contraseña (y actualizar el hash si cambió el costo configurado)
+        if not await verificar_credenciales(user['id'], payload.password, user['password_hash']):
             raise HTTPException(status_code=401, detail="Credenciales inválidas")
         
         # Crear token
@@ -168,42 +165,43 @@ def login(payload: LoginRequest):
 async def register(user_data: UsuarioCreate):
     """Registrar nuevo usuario"""
     try:
-        # Verificar si el documento ya existe
-        existing_user = execute_query(
-            "SELECT id FROM usuarios WHERE documento = %s",
-            (user_data.documento,),
-            fetch_one=True
-        )
-        
-        if existing_user:
-            raise HTTPException(status_code=400, detail="El documento ya está registrado")
-        
-        # Verificar si el email ya existe (si se proporciona)
-        if user_data.email:
-            existing_email = execute_query(
-                "SELECT id FROM usuarios WHERE email = %s",
-                (user_data.email,),
+        # Hashear contraseña antes de tomar la conexión
+        hashed_password = await hash_password_async(user_data.password)
+        
+        async with transaccion_async() as db:
+            # Verificar si el documento ya existe
+            existing_user = await db.execute(
+                "SELECT id FROM usuarios WHERE documento = %s",
+                (user_data.documento,),
                 fetch_one=True
             )
             
-            if existing_email:
-                raise HTTPException(status_code=400, detail="El email ya está registrado")
-        
-        # Hashear contraseña
-        hashed_password = hash_password(user_data.password)
-        
-        # Insertar nuevo usuario
-        user_id = execute_query(
-            """INSERT INTO usuarios (documento, nombre, email, password_hash, rol) 
-               VALUES (%s, %s, %s, %s, %s)""",
-            (user_data.documento, user_data.nombre, user_data.email, hashed_password, user_data.rol)
-        )
-        
-        return MessageResponse(
-            message=f"Usuario registrado exitosamente con ID: {user_id}",
-            success=True
-        )
-        
+            if existing_user:
+                raise HTTPException(status_code=400, detail="El documento ya está registrado")
+            
+            # Verificar si el email ya existe (si se proporciona)
+            if user_data.email:
+                existing_email = await db.execute(
+                    "SELECT id FROM usuarios WHERE email = %s",
+                    (user_data.email,),
+                    fetch_one=True
+                )
+                
+                if existing_email:
+                    raise HTTPException(status_code=400, detail="El email ya está registrado")
+            
+            # Insertar nuevo usuario
+            user_id = await db.execute(
+                """INSERT INTO usuarios (documento, nombre, email, password_hash, rol) 
+                   VALUES (%s, %s, %s, %s, %s)""",
+                (user_data.documento, user_data.nombre, user_data.email, hashed_password, user_data.rol)
+            )
+            
+            return MessageResponse(
+                message=f"Usuario registrado exitosamente con ID: {user_id}",
+                success=True
+            )
+            
     except HTTPException:
         raise
     except Exception as e:
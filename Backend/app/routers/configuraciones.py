@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from typing import List, Optional
 from datetime import datetime, date
 
@@ -6,29 +6,35 @@ from ..models import (
     ConfiguracionProducto, ConfiguracionProductoCreate, ConfiguracionProductoUpdate, ConfiguracionProductoResponse,
     TipoConfig, Color, MessageResponse, ProductoResponse
 )
-from ..database import execute_query
+from ..core.paginacion import Listado, paginar
+from ..database import execute_query, transaccion
 from .auth import get_current_user, UsuarioResponse
 
 router = APIRouter()
 
+# Listado de configuraciones por nombre del producto
+LISTADO_CONFIGURACIONES = Listado(
+    """SELECT cp.*,
+              p.nombre as producto_nombre, p.codigo as producto_codigo,
+              p.categoria as producto_categoria
+       FROM configuraciones_producto cp
+       JOIN productos p ON cp.id_producto = p.id""",
+    ("p.nombre", "cp.id_config_producto"),
+    claves=("producto_nombre", "id_config_producto")
+)
+
 @router.get("/", response_model=List[dict])
 async def get_configuraciones(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     producto_id: Optional[int] = Query(None),
     tipo_config: Optional[TipoConfig] = Query(None),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (cabecera X-Next-Cursor)"),
     current_user: UsuarioResponse = Depends(get_current_user)
 ):
     """Obtener lista de configuraciones de productos"""
     try:
-        # Construir consulta base
-        query = """
-            SELECT cp.*, 
-                   p.nombre as producto_nombre, p.codigo as producto_codigo,
-                   p.categoria as producto_categoria
-            FROM configuraciones_producto cp
-            JOIN productos p ON cp.id_producto = p.id
-        """
         conditions = []
         params = []
         
@@ -40,15 +46,10 @@ async def get_configuraciones(
             conditions.append("cp.tipo_config = %s")
             params.append(tipo_config.value)
         
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-        
-        query += " ORDER BY p.nombre, cp.tipo_config LIMIT %s OFFSET %s"
-        params.extend([limit, skip])
-        
-        configuraciones = execute_query(query, params, fetch_all=True)
-        return configuraciones
+        return await paginar(response, LISTADO_CONFIGURACIONES, conditions, params, limit, cursor, skip)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener configuraciones: {str(e)}")
 
@@ -87,67 +88,68 @@ async def create_configuracion(
 ):
     """Crear nueva configuración de producto"""
     try:
-        # Verificar permisos (solo instructores e inspectores)
-        if current_user.rol not in ["instructor", "inspector"]:
-            raise HTTPException(status_code=403, detail="No tiene permisos para crear configuraciones")
-        
-        # Verificar que el producto existe
-        producto = execute_query(
-            "SELECT id, nombre FROM productos WHERE id = %s AND activo = TRUE",
-            (config_data.id_producto,),
-            fetch_one=True
-        )
-        
-        if not producto:
-            raise HTTPException(status_code=404, detail="Producto no encontrado o inactivo")
-        
-        # Verificar que no exista ya una configuración del mismo tipo para este producto
-        existing = execute_query(
-            "SELECT id_config_producto FROM configuraciones_producto WHERE id_producto = %s AND tipo_config = %s",
-            (config_data.id_producto, config_data.tipo_config.value),
-            fetch_one=True
-        )
-        
-        if existing:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Ya existe una configuración de tipo '{config_data.tipo_config.value}' para este producto"
+        with transaccion() as db:
+            # Verificar permisos (solo instructores e inspectores)
+            if current_user.rol not in ["instructor", "inspector"]:
+                raise HTTPException(status_code=403, detail="No tiene permisos para crear configuraciones")
+            
+            # Verificar que el producto existe
+            producto = db.execute(
+                "SELECT id, nombre FROM productos WHERE id = %s AND activo = TRUE",
+                (config_data.id_producto,),
+                fetch_one=True
             )
-        
-        # Validar valores según el tipo de configuración
-        if config_data.tipo_config == TipoConfig.STOCK:
-            if config_data.valor_min is None:
-                raise HTTPException(status_code=400, detail="valor_min es requerido para configuraciones de stock")
-            if config_data.valor_min < 0:
-                raise HTTPException(status_code=400, detail="valor_min no puede ser negativo")
-        
-        # Insertar nueva configuración
-        config_id = execute_query(
-            """INSERT INTO configuraciones_producto (id_producto, tipo_config, color, valor_min, valor_max)
-               VALUES (%s, %s, %s, %s, %s)""",
-            (
-                config_data.id_producto,
-                config_data.tipo_config.value,
-                config_data.color.value,
-                config_data.valor_min,
-                config_data.valor_max
-            ),
-            return_id=True
-        )
-        
-        # Obtener la configuración creada
-        configuracion = execute_query(
-            """SELECT cp.*, 
-                      p.nombre as producto_nombre, p.codigo as producto_codigo
-               FROM configuraciones_producto cp
-               JOIN productos p ON cp.id_producto = p.id
-               WHERE cp.id_config_producto = %s""",
-            (config_id,),
-            fetch_one=True
-        )
-        
-        return configuracion
-        
+            
+            if not producto:
+                raise HTTPException(status_code=404, detail="Producto no encontrado o inactivo")
+            
+            # Verificar que no exista ya una configuración del mismo tipo para este producto
+            existing = db.execute(
+                "SELECT id_config_producto FROM configuraciones_producto WHERE id_producto = %s AND tipo_config = %s",
+                (config_data.id_producto, config_data.tipo_config.value),
+                fetch_one=True
+            )
+            
+            if existing:
+                raise HTTPException(
+                    status_code=400, 
+                    detail=f"Ya existe una configuración de tipo '{config_data.tipo_config.value}' para este producto"
+                )
+            
+            # Validar valores según el tipo de configuración
+            if config_data.tipo_config == TipoConfig.STOCK:
+                if config_data.valor_min is None:
+                    raise HTTPException(status_code=400, detail="valor_min es requerido para configuraciones de stock")
+                if config_data.valor_min < 0:
+                    raise HTTPException(status_code=400, detail="valor_min no puede ser negativo")
+            
+            # Insertar nueva configuración
+            config_id = db.execute(
+                """INSERT INTO configuraciones_producto (id_producto, tipo_config, color, valor_min, valor_max)
+                   VALUES (%s, %s, %s, %s, %s)""",
+                (
+                    config_data.id_producto,
+                    config_data.tipo_config.value,
+                    config_data.color.value,
+                    config_data.valor_min,
+                    config_data.valor_max
+                ),
+                return_id=True
+            )
+            
+            # Obtener la configuración creada
+            configuracion = db.execute(
+                """SELECT cp.*, 
+                          p.nombre as producto_nombre, p.codigo as producto_codigo
+                   FROM configuraciones_producto cp
+                   JOIN productos p ON cp.id_producto = p.id
+                   WHERE cp.id_config_producto = %s""",
+                (config_id,),
+                fetch_one=True
+            )
+            
+            return configuracion
+            
     except HTTPException:
         raise
     except Exception as e:
@@ -161,79 +163,80 @@ async def update_configuracion(
 ):
     """Actualizar configuración de producto"""
     try:
-        # Verificar permisos
-        if current_user.rol not in ["instructor", "inspector"]:
-            raise HTTPException(status_code=403, detail="No tiene permisos para actualizar configuraciones")
-        
-        # Verificar si la configuración existe
-        existing = execute_query(
-            "SELECT id_producto, tipo_config FROM configuraciones_producto WHERE id_config_producto = %s",
-            (config_id,),
-            fetch_one=True
-        )
-        
-        if not existing:
-            raise HTTPException(status_code=404, detail="Configuración no encontrada")
-        
-        # Construir consulta de actualización
-        update_fields = []
-        params = []
-        
-        if config_data.tipo_config is not None:
-            # Verificar que no exista otra configuración del mismo tipo para el mismo producto
-            conflicto = execute_query(
-                """SELECT id_config_producto FROM configuraciones_producto 
-                   WHERE id_producto = %s AND tipo_config = %s AND id_config_producto != %s""",
-                (existing['id_producto'], config_data.tipo_config.value, config_id),
+        with transaccion() as db:
+            # Verificar permisos
+            if current_user.rol not in ["instructor", "inspector"]:
+                raise HTTPException(status_code=403, detail="No tiene permisos para actualizar configuraciones")
+            
+            # Verificar si la configuración existe
+            existing = db.execute(
+                "SELECT id_producto, tipo_config FROM configuraciones_producto WHERE id_config_producto = %s",
+                (config_id,),
                 fetch_one=True
             )
             
-            if conflicto:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Ya existe otra configuración de tipo '{config_data.tipo_config.value}' para este producto"
+            if not existing:
+                raise HTTPException(status_code=404, detail="Configuración no encontrada")
+            
+            # Construir consulta de actualización
+            update_fields = []
+            params = []
+            
+            if config_data.tipo_config is not None:
+                # Verificar que no exista otra configuración del mismo tipo para el mismo producto
+                conflicto = db.execute(
+                    """SELECT id_config_producto FROM configuraciones_producto 
+                       WHERE id_producto = %s AND tipo_config = %s AND id_config_producto != %s""",
+                    (existing['id_producto'], config_data.tipo_config.value, config_id),
+                    fetch_one=True
                 )
+                
+                if conflicto:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Ya existe otra configuración de tipo '{config_data.tipo_config.value}' para este producto"
+                    )
+                
+                update_fields.append("tipo_config = %s")
+                params.append(config_data.tipo_config.value)
+            
+            if config_data.color is not None:
+                update_fields.append("color = %s")
+                params.append(config_data.color.value)
+            
+            if config_data.valor_min is not None:
+                if config_data.valor_min < 0:
+                    raise HTTPException(status_code=400, detail="valor_min no puede ser negativo")
+                update_fields.append("valor_min = %s")
+                params.append(config_data.valor_min)
+            
+            if config_data.valor_max is not None:
+                update_fields.append("valor_max = %s")
+                params.append(config_data.valor_max)
+            
+            if not update_fields:
+                raise HTTPException(status_code=400, detail="No hay campos para actualizar")
+            
+            params.append(config_id)
+            
+            db.execute(
+                f"UPDATE configuraciones_producto SET {', '.join(update_fields)} WHERE id_config_producto = %s",
+                params
+            )
+            
+            # Obtener la configuración actualizada
+            configuracion = db.execute(
+                """SELECT cp.*, 
+                          p.nombre as producto_nombre, p.codigo as producto_codigo
+                   FROM configuraciones_producto cp
+                   JOIN productos p ON cp.id_producto = p.id
+                   WHERE cp.id_config_producto = %s""",
+                (config_id,),
+                fetch_one=True
+            )
+            
+            return configuracion
             
-            update_fields.append("tipo_config = %s")
-            params.append(config_data.tipo_config.value)
-        
-        if config_data.color is not None:
-            update_fields.append("color = %s")
-            params.append(config_data.color.value)
-        
-        if config_data.valor_min is not None:
-            if config_data.valor_min < 0:
-                raise HTTPException(status_code=400, detail="valor_min no puede ser negativo")
-            update_fields.append("valor_min = %s")
-            params.append(config_data.valor_min)
-        
-        if config_data.valor_max is not None:
-            update_fields.append("valor_max = %s")
-            params.append(config_data.valor_max)
-        
-        if not update_fields:
-            raise HTTPException(status_code=400, detail="No hay campos para actualizar")
-        
-        params.append(config_id)
-        
-        execute_query(
-            f"UPDATE configuraciones_producto SET {', '.join(update_fields)} WHERE id_config_producto = %s",
-            params
-        )
-        
-        # Obtener la configuración actualizada
-        configuracion = execute_query(
-            """SELECT cp.*, 
-                      p.nombre as producto_nombre, p.codigo as producto_codigo
-               FROM configuraciones_producto cp
-               JOIN productos p ON cp.id_producto = p.id
-               WHERE cp.id_config_producto = %s""",
-            (config_id,),
-            fetch_one=True
-        )
-        
-        return configuracion
-        
     except HTTPException:
         raise
     except Exception as e:
@@ -246,44 +249,45 @@ async def delete_configuracion(
 ):
     """Eliminar configuración de producto"""
     try:
-        # Verificar permisos (solo instructores pueden eliminar)
-        if current_user.rol != "instructor":
-            raise HTTPException(status_code=403, detail="Solo los instructores pueden eliminar configuraciones")
-        
-        # Verificar si la configuración existe
-        existing = execute_query(
-            "SELECT id_config_producto FROM configuraciones_producto WHERE id_config_producto = %s",
-            (config_id,),
-            fetch_one=True
-        )
-        
-        if not existing:
-            raise HTTPException(status_code=404, detail="Configuración no encontrada")
-        
-        # Verificar si hay alertas asociadas
-        alertas_asociadas = execute_query(
-            "SELECT COUNT(*) as count FROM alertas WHERE id_config_producto = %s",
-            (config_id,),
-            fetch_one=True
-        )
-        
-        if alertas_asociadas['count'] > 0:
-            raise HTTPException(
-                status_code=400,
-                detail=f"No se puede eliminar la configuración porque tiene {alertas_asociadas['count']} alertas asociadas"
+        with transaccion() as db:
+            # Verificar permisos (solo instructores pueden eliminar)
+            if current_user.rol != "instructor":
+                raise HTTPException(status_code=403, detail="Solo los instructores pueden eliminar configuraciones")
+            
+            # Verificar si la configuración existe
+            existing = db.execute(
+                "SELECT id_config_producto FROM configuraciones_producto WHERE id_config_producto = %s",
+                (config_id,),
+                fetch_one=True
             )
-        
-        # Eliminar configuración
-        execute_query(
-            "DELETE FROM configuraciones_producto WHERE id_config_producto = %s",
-            (config_id,)
-        )
-        
-        return MessageResponse(
-            message="Configuración eliminada exitosamente",
-            success=True
-        )
-        
+            
+            if not existing:
+                raise HTTPException(status_code=404, detail="Configuración no encontrada")
+            
+            # Verificar si hay alertas asociadas
+            alertas_asociadas = db.execute(
+                "SELECT COUNT(*) as count FROM alertas WHERE id_config_producto = %s",
+                (config_id,),
+                fetch_one=True
+            )
+            
+            if alertas_asociadas['count'] > 0:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"No se puede eliminar la configuración porque tiene {alertas_asociadas['count']} alertas asociadas"
+                )
+            
+            # Eliminar configuración
+            db.execute(
+                "DELETE FROM configuraciones_producto WHERE id_config_producto = %s",
+                (config_id,)
+            )
+            
+            return MessageResponse(
+                message="Configuración eliminada exitosamente",
+                success=True
+            )
+            
     except HTTPException:
         raise
     except Exception as e:
@@ -415,29 +419,30 @@ async def get_configuraciones_producto(
 ):
     """Obtener todas las configuraciones de un producto específico"""
     try:
-        # Verificar que el producto existe
-        producto = execute_query(
-            "SELECT id, nombre FROM productos WHERE id = %s",
-            (producto_id,),
-            fetch_one=True
-        )
-        
-        if not producto:
-            raise HTTPException(status_code=404, detail="Producto no encontrado")
-        
-        # Obtener configuraciones
-        configuraciones = execute_query(
-            """SELECT cp.*, p.nombre as producto_nombre, p.codigo as producto_codigo
-               FROM configuraciones_producto cp
-               JOIN productos p ON cp.id_producto = p.id
-               WHERE cp.id_producto = %s
-               ORDER BY cp.tipo_config""",
-            (producto_id,),
-            fetch_all=True
-        )
-        
-        return configuraciones
-        
+        with transaccion() as db:
+            # Verificar que el producto existe
+            producto = db.execute(
+                "SELECT id, nombre FROM productos WHERE id = %s",
+                (producto_id,),
+                fetch_one=True
+            )
+            
+            if not producto:
+                raise HTTPException(status_code=404, detail="Producto no encontrado")
+            
+            # Obtener configuraciones
+            configuraciones = db.execute(
+                """SELECT cp.*, p.nombre as producto_nombre, p.codigo as producto_codigo
+                   FROM configuraciones_producto cp
+                   JOIN productos p ON cp.id_producto = p.id
+                   WHERE cp.id_producto = %s
+                   ORDER BY cp.tipo_config""",
+                (producto_id,),
+                fetch_all=True
+            )
+            
+            return configuraciones
+            
     except HTTPException:
         raise
     except Exception as e:
@@ -6,11 +6,37 @@ from ..models import (
     Lote, LoteCreate, LoteUpdate, LoteConProducto,
     MessageResponse
 )
-from ..database import execute_query
+from ..database import execute_query_async, transaccion_async
 from .auth import get_current_user, UsuarioResponse
 
 router = APIRouter()
 
+# Lotes con los datos de su producto
+CONSULTA_LOTES = """SELECT l.*, p.codigo as producto_codigo, p.nombre as producto_nombre,
+                           p.descripcion as producto_descripcion, p.categoria as producto_categoria,
+                           p.unidad_medida as producto_unidad_medida, p.stock_minimo as producto_stock_minimo,
+                           p.es_material_formacion as producto_es_material_formacion,
+                           p.activo as producto_activo, p.fecha_creacion as producto_fecha_creacion,
+                           p.fecha_actualizacion as producto_fecha_actualizacion
+                    FROM lotes l
+                    INNER JOIN productos p ON l.producto_id = p.id"""
+
+# Orden del listado: primero los que vencen antes
+ORDEN_LOTES = "l.fecha_vencimiento ASC, l.fecha_ingreso DESC"
+
+CONSULTA_PROXIMOS_VENCER = CONSULTA_LOTES + """
+                    WHERE l.activo = TRUE
+                    AND l.fecha_vencimiento IS NOT NULL
+                    AND l.fecha_vencimiento <= DATE_ADD(CURDATE(), INTERVAL %s DAY)
+                    AND l.fecha_vencimiento > CURDATE()
+                    ORDER BY l.fecha_vencimiento ASC"""
+
+CONSULTA_VENCIDOS = CONSULTA_LOTES + """
+                    WHERE l.activo = TRUE
+                    AND l.fecha_vencimiento IS NOT NULL
+                    AND l.fecha_vencimiento < CURDATE()
+                    ORDER BY l.fecha_vencimiento ASC"""
+
 @router.get("/", response_model=List[LoteConProducto])
 async def get_lotes(
     skip: int = Query(0, ge=0),
@@ -23,16 +49,7 @@ async def get_lotes(
     """Obtener lista de lotes"""
     try:
         # Construir consulta base
-        query = """
-            SELECT l.*, p.codigo as producto_codigo, p.nombre as producto_nombre,
-                   p.descripcion as producto_descripcion, p.categoria as producto_categoria,
-                   p.unidad_medida as producto_unidad_medida, p.stock_minimo as producto_stock_minimo,
-                   p.es_material_formacion as producto_es_material_formacion,
-                   p.activo as producto_activo, p.fecha_creacion as producto_fecha_creacion,
-                   p.fecha_actualizacion as producto_fecha_actualizacion
-            FROM lotes l
-            INNER JOIN productos p ON l.producto_id = p.id
-        """
+        query = CONSULTA_LOTES
         
         conditions = []
         params = []
@@ -52,10 +69,10 @@ async def get_lotes(
         if conditions:
             query += " WHERE " + " AND ".join(conditions)
         
-        query += " ORDER BY l.fecha_vencimiento ASC, l.fecha_ingreso DESC LIMIT %s OFFSET %s"
+        query += f" ORDER BY {ORDEN_LOTES} LIMIT %s OFFSET %s"
         params.extend([limit, skip])
         
-        lotes = execute_query(query, params, fetch_all=True)
+        lotes = await execute_query_async(query, params, fetch_all=True)
         
         # Transformar resultados para incluir información del producto
         lotes_con_producto = []
@@ -91,7 +108,7 @@ async def get_lote(
 ):
     """Obtener lote específico"""
     try:
-        lote = execute_query(
+        lote = await execute_query_async(
             """SELECT l.*, p.codigo as producto_codigo, p.nombre as producto_nombre,
                       p.descripcion as producto_descripcion, p.categoria as producto_categoria,
                       p.unidad_medida as producto_unidad_medida, p.stock_minimo as producto_stock_minimo,
@@ -140,54 +157,55 @@ async def create_lote(
 ):
     """Crear nuevo lote"""
     try:
-        # Verificar si el producto existe
-        producto = execute_query(
-            "SELECT id FROM productos WHERE id = %s AND activo = TRUE",
-            (lote_data.producto_id,),
-            fetch_one=True
-        )
-        
-        if not producto:
-            raise HTTPException(status_code=404, detail="Producto no encontrado")
-        
-        # Verificar si el número de lote ya existe para este producto
-        existing_lote = execute_query(
-            "SELECT id FROM lotes WHERE producto_id = %s AND numero_lote = %s",
-            (lote_data.producto_id, lote_data.numero_lote),
-            fetch_one=True
-        )
-        
-        if existing_lote:
-            raise HTTPException(status_code=400, detail="El número de lote ya existe para este producto")
-        
-        # Insertar nuevo lote
-        lote_id = execute_query(
-            """INSERT INTO lotes (producto_id, numero_lote, fecha_ingreso, fecha_vencimiento,
-                                cantidad_inicial, cantidad_disponible, precio_unitario, 
-                                proveedor, observaciones)
-               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-            (
-                lote_data.producto_id,
-                lote_data.numero_lote,
-                lote_data.fecha_ingreso,
-                lote_data.fecha_vencimiento,
-                lote_data.cantidad_inicial,
-                lote_data.cantidad_disponible,
-                lote_data.precio_unitario,
-                lote_data.proveedor,
-                lote_data.observaciones
+        async with transaccion_async() as db:
+            # Verificar si el producto existe
+            producto = await db.execute(
+                "SELECT id FROM productos WHERE id = %s AND activo = TRUE",
+                (lote_data.producto_id,),
+                fetch_one=True
             )
-        )
-        
-        # Obtener el lote creado
-        lote = execute_query(
-            "SELECT * FROM lotes WHERE id = %s",
-            (lote_id,),
-            fetch_one=True
-        )
-        
-        return lote
-        
+            
+            if not producto:
+                raise HTTPException(status_code=404, detail="Producto no encontrado")
+            
+            # Verificar si el número de lote ya existe para este producto
+            existing_lote = await db.execute(
+                "SELECT id FROM lotes WHERE producto_id = %s AND numero_lote = %s",
+                (lote_data.producto_id, lote_data.numero_lote),
+                fetch_one=True
+            )
+            
+            if existing_lote:
+                raise HTTPException(status_code=400, detail="El número de lote ya existe para este producto")
+            
+            # Insertar nuevo lote
+            lote_id = await db.execute(
+                """INSERT INTO lotes (producto_id, numero_lote, fecha_ingreso, fecha_vencimiento,
+                                    cantidad_inicial, cantidad_disponible, precio_unitario, 
+                                    proveedor, observaciones)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+                (
+                    lote_data.producto_id,
+                    lote_data.numero_lote,
+                    lote_data.fecha_ingreso,
+                    lote_data.fecha_vencimiento,
+                    lote_data.cantidad_inicial,
+                    lote_data.cantidad_disponible,
+                    lote_data.precio_unitario,
+                    lote_data.proveedor,
+                    lote_data.observaciones
+                )
+            )
+            
+            # Obtener el lote creado
+            lote = await db.execute(
+                "SELECT * FROM lotes WHERE id = %s",
+                (lote_id,),
+                fetch_one=True
+            )
+            
+            return lote
+            
     except HTTPException:
         raise
     except Exception as e:
@@ -201,71 +219,72 @@ async def update_lote(
 ):
     """Actualizar lote"""
     try:
-        # Verificar si el lote existe
-        existing = execute_query(
-            "SELECT id FROM lotes WHERE id = %s",
-            (lote_id,),
-            fetch_one=True
-        )
-        
-        if not existing:
-            raise HTTPException(status_code=404, detail="Lote no encontrado")
-        
-        # Construir consulta de actualización
-        update_fields = []
-        params = []
-        
-        if lote_data.fecha_ingreso is not None:
-            update_fields.append("fecha_ingreso = %s")
-            params.append(lote_data.fecha_ingreso)
-        
-        if lote_data.fecha_vencimiento is not None:
-            update_fields.append("fecha_vencimiento = %s")
-            params.append(lote_data.fecha_vencimiento)
-        
-        if lote_data.cantidad_inicial is not None:
-            update_fields.append("cantidad_inicial = %s")
-            params.append(lote_data.cantidad_inicial)
-        
-        if lote_data.cantidad_disponible is not None:
-            update_fields.append("cantidad_disponible = %s")
-            params.append(lote_data.cantidad_disponible)
-        
-        if lote_data.precio_unitario is not None:
-            update_fields.append("precio_unitario = %s")
-            params.append(lote_data.precio_unitario)
-        
-        if lote_data.proveedor is not None:
-            update_fields.append("proveedor = %s")
-            params.append(lote_data.proveedor)
-        
-        if lote_data.observaciones is not None:
-            update_fields.append("observaciones = %s")
-            params.append(lote_data.observaciones)
-        
-        if lote_data.activo is not None:
-            update_fields.append("activo = %s")
-            params.append(lote_data.activo)
-        
-        if not update_fields:
-            raise HTTPException(status_code=400, detail="No hay campos para actualizar")
-        
-        params.append(lote_id)
-        
-        execute_query(
-            f"UPDATE lotes SET {', '.join(update_fields)} WHERE id = %s",
-            params
-        )
-        
-        # Obtener el lote actualizado
-        lote = execute_query(
-            "SELECT * FROM lotes WHERE id = %s",
-            (lote_id,),
-            fetch_one=True
-        )
-        
-        return lote
-        
+        async with transaccion_async() as db:
+            # Verificar si el lote existe
+            existing = await db.execute(
+                "SELECT id FROM lotes WHERE id = %s",
+                (lote_id,),
+                fetch_one=True
+            )
+            
+            if not existing:
+                raise HTTPException(status_code=404, detail="Lote no encontrado")
+            
+            # Construir consulta de actualización
+            update_fields = []
+            params = []
+            
+            if lote_data.fecha_ingreso is not None:
+                update_fields.append("fecha_ingreso = %s")
+                params.append(lote_data.fecha_ingreso)
+            
+            if lote_data.fecha_vencimiento is not None:
+                update_fields.append("fecha_vencimiento = %s")
+                params.append(lote_data.fecha_vencimiento)
+            
+            if lote_data.cantidad_inicial is not None:
+                update_fields.append("cantidad_inicial = %s")
+                params.append(lote_data.cantidad_inicial)
+            
+            if lote_data.cantidad_disponible is not None:
+                update_fields.append("cantidad_disponible = %s")
+                params.append(lote_data.cantidad_disponible)
+            
+            if lote_data.precio_unitario is not None:
+                update_fields.append("precio_unitario = %s")
+                params.append(lote_data.precio_unitario)
+            
+            if lote_data.proveedor is not None:
+                update_fields.append("proveedor = %s")
+                params.append(lote_data.proveedor)
+            
+            if lote_data.observaciones is not None:
+                update_fields.append("observaciones = %s")
+                params.append(lote_data.observaciones)
+            
+            if lote_data.activo is not None:
+                update_fields.append("activo = %s")
+                params.append(lote_data.activo)
+            
+            if not update_fields:
+                raise HTTPException(status_code=400, detail="No hay campos para actualizar")
+            
+            params.append(lote_id)
+            
+            await db.execute(
+                f"UPDATE lotes SET {', '.join(update_fields)} WHERE id = %s",
+                params
+            )
+            
+            # Obtener el lote actualizado
+            lote = await db.execute(
+                "SELECT * FROM lotes WHERE id = %s",
+                (lote_id,),
+                fetch_one=True
+            )
+            
+            return lote
+            
     except HTTPException:
         raise
     except Exception as e:
@@ -278,27 +297,28 @@ async def delete_lote(
 ):
     """Eliminar lote (soft delete)"""
     try:
-        # Verificar si el lote existe
-        existing = execute_query(
-            "SELECT id FROM lotes WHERE id = %s",
-            (lote_id,),
-            fetch_one=True
-        )
-        
-        if not existing:
-            raise HTTPException(status_code=404, detail="Lote no encontrado")
-        
-        # Soft delete
-        execute_query(
-            "UPDATE lotes SET activo = FALSE WHERE id = %s",
-            (lote_id,)
-        )
-        
-        return MessageResponse(
-            message="Lote eliminado exitosamente",
-            success=True
-        )
-        
+        async with transaccion_async() as db:
+            # Verificar si el lote existe
+            existing = await db.execute(
+                "SELECT id FROM lotes WHERE id = %s",
+                (lote_id,),
+                fetch_one=True
+            )
+            
+            if not existing:
+                raise HTTPException(status_code=404, detail="Lote no encontrado")
+            
+            # Soft delete
+            await db.execute(
+                "UPDATE lotes SET activo = FALSE WHERE id = %s",
+                (lote_id,)
+            )
+            
+            return MessageResponse(
+                message="Lote eliminado exitosamente",
+                success=True
+            )
+            
     except HTTPException:
         raise
     except Exception as e:
@@ -318,20 +338,8 @@ async def get_lotes_proximos_vencer(
 ):
     """Obtener lotes próximos a vencer"""
     try:
-        lotes = execute_query(
-            """SELECT l.*, p.codigo as producto_codigo, p.nombre as producto_nombre,
-                      p.descripcion as producto_descripcion, p.categoria as producto_categoria,
-                      p.unidad_medida as producto_unidad_medida, p.stock_minimo as producto_stock_minimo,
-                      p.es_material_formacion as producto_es_material_formacion,
-                      p.activo as producto_activo, p.fecha_creacion as producto_fecha_creacion,
-                      p.fecha_actualizacion as producto_fecha_actualizacion
-               FROM lotes l
-               INNER JOIN productos p ON l.producto_id = p.id
-               WHERE l.activo = TRUE 
-               AND l.fecha_vencimiento IS NOT NULL
-               AND l.fecha_vencimiento <= DATE_ADD(CURDATE(), INTERVAL %s DAY)
-               AND l.fecha_vencimiento > CURDATE()
-               ORDER BY l.fecha_vencimiento ASC""",
+        lotes = await execute_query_async(
+            CONSULTA_PROXIMOS_VENCER,
             (dias,),
             fetch_all=True
         )
@@ -369,19 +377,8 @@ async def get_lotes_vencidos(
 ):
     """Obtener lotes vencidos"""
     try:
-        lotes = execute_query(
-            """SELECT l.*, p.codigo as producto_codigo, p.nombre as producto_nombre,
-                      p.descripcion as producto_descripcion, p.categoria as producto_categoria,
-                      p.unidad_medida as producto_unidad_medida, p.stock_minimo as producto_stock_minimo,
-                      p.es_material_formacion as producto_es_material_formacion,
-                      p.activo as producto_activo, p.fecha_creacion as producto_fecha_creacion,
-                      p.fecha_actualizacion as producto_fecha_actualizacion
-               FROM lotes l
-               INNER JOIN productos p ON l.producto_id = p.id
-               WHERE l.activo = TRUE 
-               AND l.fecha_vencimiento IS NOT NULL
-               AND l.fecha_vencimiento < CURDATE()
-               ORDER BY l.fecha_vencimiento ASC""",
+        lotes = await execute_query_async(
+            CONSULTA_VENCIDOS,
             fetch_all=True
         )
         
@@ -419,7 +416,7 @@ async def actualizar_estados_lotes(
     """Actualizar estados de lotes automáticamente"""
     try:
         # Actualizar estados basado en fechas de vencimiento
-        execute_query(
+        await execute_query_async(
             """UPDATE lotes 
                SET estado = CASE 
                    WHEN fecha_vencimiento IS NULL THEN 'vigente'
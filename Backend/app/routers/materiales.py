@@ -6,7 +6,7 @@ from ..models import (
     Material, MaterialCreate, MaterialUpdate, MaterialResponse,
     MessageResponse, Usuario, UsuarioResponse
 )
-from ..database import execute_query
+from ..database import execute_query, transaccion
 from .auth import get_current_user
 
 router = APIRouter()
@@ -71,43 +71,44 @@ async def create_material(
 ):
     """Crear nuevo material"""
     try:
-        # Verificar permisos (solo instructores pueden crear materiales)
-        if current_user.rol not in ["instructor", "inspector"]:
-            raise HTTPException(status_code=403, detail="No tiene permisos para crear materiales")
-        
-        # Verificar si el nombre ya existe
-        existing = execute_query(
-            "SELECT id_material FROM materiales WHERE nombre = %s",
-            (material_data.nombre,),
-            fetch_one=True
-        )
-        
-        if existing:
-            raise HTTPException(status_code=400, detail="Ya existe un material con ese nombre")
-        
-        # Insertar nuevo material
-        material_id = execute_query(
-            """INSERT INTO materiales (nombre, tipo_material, description, cantidad, relaciones)
-               VALUES (%s, %s, %s, %s, %s)""",
-            (
-                material_data.nombre,
-                material_data.tipo_material.value,
-                material_data.description,
-                material_data.cantidad,
-                material_data.relaciones
-            ),
-            return_id=True
-        )
-        
-        # Obtener el material creado
-        material = execute_query(
-            "SELECT * FROM materiales WHERE id_material = %s",
-            (material_id,),
-            fetch_one=True
-        )
-        
-        return material
-        
+        with transaccion() as db:
+            # Verificar permisos (solo instructores pueden crear materiales)
+            if current_user.rol not in ["instructor", "inspector"]:
+                raise HTTPException(status_code=403, detail="No tiene permisos para crear materiales")
+            
+            # Verificar si el nombre ya existe
+            existing = db.execute(
+                "SELECT id_material FROM materiales WHERE nombre = %s",
+                (material_data.nombre,),
+                fetch_one=True
+            )
+            
+            if existing:
+                raise HTTPException(status_code=400, detail="Ya existe un material con ese nombre")
+            
+            # Insertar nuevo material
+            material_id = db.execute(
+                """INSERT INTO materiales (nombre, tipo_material, description, cantidad, relaciones)
+                   VALUES (%s, %s, %s, %s, %s)""",
+                (
+                    material_data.nombre,
+                    material_data.tipo_material.value,
+                    material_data.description,
+                    material_data.cantidad,
+                    material_data.relaciones
+                ),
+                return_id=True
+            )
+            
+            # Obtener el material creado
+            material = db.execute(
+                "SELECT * FROM materiales WHERE id_material = %s",
+                (material_id,),
+                fetch_one=True
+            )
+            
+            return material
+            
     except HTTPException:
         raise
     except Exception as e:
@@ -121,63 +122,64 @@ async def update_material(
 ):
     """Actualizar material"""
     try:
-        # Verificar permisos
-        if current_user.rol not in ["instructor", "inspector"]:
-            raise HTTPException(status_code=403, detail="No tiene permisos para actualizar materiales")
-        
-        # Verificar si el material existe
-        existing = execute_query(
-            "SELECT id_material FROM materiales WHERE id_material = %s",
-            (material_id,),
-            fetch_one=True
-        )
-        
-        if not existing:
-            raise HTTPException(status_code=404, detail="Material no encontrado")
-        
-        # Construir consulta de actualización
-        update_fields = []
-        params = []
-        
-        if material_data.nombre is not None:
-            update_fields.append("nombre = %s")
-            params.append(material_data.nombre)
-        
-        if material_data.tipo_material is not None:
-            update_fields.append("tipo_material = %s")
-            params.append(material_data.tipo_material.value)
-        
-        if material_data.description is not None:
-            update_fields.append("description = %s")
-            params.append(material_data.description)
-        
-        if material_data.cantidad is not None:
-            update_fields.append("cantidad = %s")
-            params.append(material_data.cantidad)
-        
-        if material_data.relaciones is not None:
-            update_fields.append("relaciones = %s")
-            params.append(material_data.relaciones)
-        
-        if not update_fields:
-            raise HTTPException(status_code=400, detail="No hay campos para actualizar")
-        
-        params.append(material_id)
-        
-        execute_query(
-            f"UPDATE materiales SET {', '.join(update_fields)} WHERE id_material = %s",
-            params
-        )
-        
-        # Obtener el material actualizado
-        material = execute_query(
-            "SELECT * FROM materiales WHERE id_material = %s",
-            (material_id,),
-            fetch_one=True
-        )
-        
-        return material
-        
+        with transaccion() as db:
+            # Verificar permisos
+            if current_user.rol not in ["instructor", "inspector"]:
+                raise HTTPException(status_code=403, detail="No tiene permisos para actualizar materiales")
+            
+            # Verificar si el material existe
+            existing = db.execute(
+                "SELECT id_material FROM materiales WHERE id_material = %s",
+                (material_id,),
+                fetch_one=True
+            )
+            
+            if not existing:
+                raise HTTPException(status_code=404, detail="Material no encontrado")
+            
+            # Construir consulta de actualización
+            update_fields = []
+            params = []
+            
+            if material_data.nombre is not None:
+                update_fields.append("nombre = %s")
+                params.append(material_data.nombre)
+            
+            if material_data.tipo_material is not None:
+                update_fields.append("tipo_material = %s")
+                params.append(material_data.tipo_material.value)
+            
+            if material_data.description is not None:
+                update_fields.append("description = %s")
+                params.append(material_data.description)
+            
+            if material_data.cantidad is not None:
+                update_fields.append("cantidad = %s")
+                params.append(material_data.cantidad)
+            
+            if material_data.relaciones is not None:
+                update_fields.append("relaciones = %s")
+                params.append(material_data.relaciones)
+            
+            if not update_fields:
+                raise HTTPException(status_code=400, detail="No hay campos para actualizar")
+            
+            params.append(material_id)
+            
+            db.execute(
+                f"UPDATE materiales SET {', '.join(update_fields)} WHERE id_material = %s",
+                params
+            )
+            
+            # Obtener el material actualizado
+            material = db.execute(
+                "SELECT * FROM materiales WHERE id_material = %s",
+                (material_id,),
+                fetch_one=True
+            )
+            
+            return material
+            
     except HTTPException:
         raise
     except Exception as e:
@@ -190,31 +192,32 @@ async def delete_material(
 ):
     """Eliminar material"""
     try:
-        # Verificar permisos (solo instructores pueden eliminar)
-        if current_user.rol != "instructor":
-            raise HTTPException(status_code=403, detail="Solo los instructores pueden eliminar materiales")
-        
-        # Verificar si el material existe
-        existing = execute_query(
-            "SELECT id_material FROM materiales WHERE id_material = %s",
-            (material_id,),
-            fetch_one=True
-        )
-        
-        if not existing:
-            raise HTTPException(status_code=404, detail="Material no encontrado")
-        
-        # Eliminar material
-        execute_query(
-            "DELETE FROM materiales WHERE id_material = %s",
-            (material_id,)
-        )
-        
-        return MessageResponse(
-            message="Material eliminado exitosamente",
-            success=True
-        )
-        
+        with transaccion() as db:
+            # Verificar permisos (solo instructores pueden eliminar)
+            if current_user.rol != "instructor":
+                raise HTTPException(status_code=403, detail="Solo los instructores pueden eliminar materiales")
+            
+            # Verificar si el material existe
+            existing = db.execute(
+                "SELECT id_material FROM materiales WHERE id_material = %s",
+                (material_id,),
+                fetch_one=True
+            )
+            
+            if not existing:
+                raise HTTPException(status_code=404, detail="Material no encontrado")
+            
+            # Eliminar material
+            db.execute(
+                "DELETE FROM materiales WHERE id_material = %s",
+                (material_id,)
+            )
+            
+            return MessageResponse(
+                message="Material eliminado exitosamente",
+                success=True
+            )
+            
     except HTTPException:
         raise
     except Exception as e:
@@ -227,41 +230,42 @@ async def get_usuarios_asignados(
 ):
     """Obtener usuarios asignados a un material específico"""
     try:
-        # Verificar si el material existe
-        material = execute_query(
-            "SELECT relaciones FROM materiales WHERE id_material = %s",
-            (material_id,),
-            fetch_one=True
-        )
-        
-        if not material:
-            raise HTTPException(status_code=404, detail="Material no encontrado")
-        
-        # Si no hay relaciones, devolver lista vacía
-        if not material['relaciones']:
-            return []
-        
-        # Extraer IDs de usuarios de las relaciones JSON
-        import json
-        relaciones = json.loads(material['relaciones']) if isinstance(material['relaciones'], str) else material['relaciones']
-        
-        usuarios_ids = []
-        if 'id_usuario' in relaciones and relaciones['id_usuario']:
-            usuarios_ids.append(relaciones['id_usuario'])
-        
-        if not usuarios_ids:
-            return []
-        
-        # Obtener usuarios
-        placeholders = ','.join(['%s'] * len(usuarios_ids))
-        usuarios = execute_query(
-            f"SELECT id, documento, nombre, email, rol, activo FROM usuarios WHERE id IN ({placeholders})",
-            usuarios_ids,
-            fetch_all=True
-        )
-        
-        return usuarios
-        
+        with transaccion() as db:
+            # Verificar si el material existe
+            material = db.execute(
+                "SELECT relaciones FROM materiales WHERE id_material = %s",
+                (material_id,),
+                fetch_one=True
+            )
+            
+            if not material:
+                raise HTTPException(status_code=404, detail="Material no encontrado")
+            
+            # Si no hay relaciones, devolver lista vacía
+            if not material['relaciones']:
+                return []
+            
+            # Extraer IDs de usuarios de las relaciones JSON
+            import json
+            relaciones = json.loads(material['relaciones']) if isinstance(material['relaciones'], str) else material['relaciones']
+            
+            usuarios_ids = []
+            if 'id_usuario' in relaciones and relaciones['id_usuario']:
+                usuarios_ids.append(relaciones['id_usuario'])
+            
+            if not usuarios_ids:
+                return []
+            
+            # Obtener usuarios
+            placeholders = ','.join(['%s'] * len(usuarios_ids))
+            usuarios = db.execute(
+                f"SELECT id, documento, nombre, email, rol, activo FROM usuarios WHERE id IN ({placeholders})",
+                usuarios_ids,
+                fetch_all=True
+            )
+            
+            return usuarios
+            
     except HTTPException:
         raise
     except Exception as e:
@@ -275,44 +279,45 @@ async def asignar_usuario_material(
 ):
     """Asignar un usuario a un material"""
     try:
-        # Verificar permisos
-        if current_user.rol not in ["instructor", "inspector"]:
-            raise HTTPException(status_code=403, detail="No tiene permisos para asignar usuarios")
-        
-        # Verificar que existan el material y usuario
-        material = execute_query(
-            "SELECT relaciones FROM materiales WHERE id_material = %s",
-            (material_id,),
-            fetch_one=True
-        )
-        
-        if not material:
-            raise HTTPException(status_code=404, detail="Material no encontrado")
-        
-        usuario = execute_query(
-            "SELECT id FROM usuarios WHERE id = %s",
-            (usuario_id,),
-            fetch_one=True
-        )
-        
-        if not usuario:
-            raise HTTPException(status_code=404, detail="Usuario no encontrado")
-        
-        # Actualizar relaciones
-        import json
-        relaciones = json.loads(material['relaciones']) if material['relaciones'] else {}
-        relaciones['id_usuario'] = str(usuario_id)
-        
-        execute_query(
-            "UPDATE materiales SET relaciones = %s WHERE id_material = %s",
-            (json.dumps(relaciones), material_id)
-        )
-        
-        return MessageResponse(
-            message="Usuario asignado al material exitosamente",
-            success=True
-        )
-        
+        with transaccion() as db:
+            # Verificar permisos
+            if current_user.rol not in ["instructor", "inspector"]:
+                raise HTTPException(status_code=403, detail="No tiene permisos para asignar usuarios")
+            
+            # Verificar que existan el material y usuario
+            material = db.execute(
+                "SELECT relaciones FROM materiales WHERE id_material = %s",
+                (material_id,),
+                fetch_one=True
+            )
+            
+            if not material:
+                raise HTTPException(status_code=404, detail="Material no encontrado")
+            
+            usuario = db.execute(
+                "SELECT id FROM usuarios WHERE id = %s",
+                (usuario_id,),
+                fetch_one=True
+            )
+            
+            if not usuario:
+                raise HTTPException(status_code=404, detail="Usuario no encontrado")
+            
+            # Actualizar relaciones
+            import json
+            relaciones = json.loads(material['relaciones']) if material['relaciones'] else {}
+            relaciones['id_usuario'] = str(usuario_id)
+            
+            db.execute(
+                "UPDATE materiales SET relaciones = %s WHERE id_material = %s",
+                (json.dumps(relaciones), material_id)
+            )
+            
+            return MessageResponse(
+                message="Usuario asignado al material exitosamente",
+                success=True
+            )
+            
     except HTTPException:
         raise
     except Exception as e:
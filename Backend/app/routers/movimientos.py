@@ -1,30 +1,151 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, date, timedelta
+import csv
+import io
+import json
+import uuid
 
 from ..models import (
     Movimiento, MovimientoCreate, MovimientoConDetalles,
+    MovimientosMasivoResponse, ResultadoMovimientoMasivo,
     MessageResponse
 )
-from ..database import execute_query
+from ..core.paginacion import Listado, paginar
+from ..database import execute_query_async, transaccion_async, stream_query_async
 from .auth import get_current_user, UsuarioResponse
 
 router = APIRouter()
 
+# Listado de movimientos, los más recientes primero
+LISTADO_MOVIMIENTOS = Listado("SELECT * FROM movimientos", ("fecha_movimiento", "id"), descendente=True)
+
+# Máximo de movimientos por solicitud masiva
+MAX_MOVIMIENTOS_MASIVO = 1000
+
+# Consulta de movimientos con datos de lote, producto y usuario
+CONSULTA_DETALLES = """SELECT m.*, l.numero_lote, l.fecha_ingreso, l.fecha_vencimiento,
+                              l.cantidad_disponible, l.estado, l.precio_unitario,
+                              p.codigo as producto_codigo, p.nombre as producto_nombre,
+                              u.documento as usuario_documento, u.nombre as usuario_nombre,
+                              u.rol as usuario_rol
+                       FROM movimientos m
+                       INNER JOIN lotes l ON m.lote_id = l.id
+                       INNER JOIN productos p ON l.producto_id = p.id
+                       INNER JOIN usuarios u ON m.usuario_id = u.id"""
+
+# Movimientos con detalles, los más recientes primero. Sin `formato` se
+# paginan por cursor; las exportaciones NDJSON/CSV recorren todas las filas
+LISTADO_DETALLES = Listado(CONSULTA_DETALLES, ("m.fecha_movimiento", "m.id"), descendente=True)
+
+# Columnas de la exportación CSV
+COLUMNAS_CSV = [
+    'id', 'fecha_movimiento', 'tipo', 'cantidad', 'motivo', 'observaciones',
+    'lote_id', 'numero_lote', 'producto_codigo', 'producto_nombre',
+    'usuario_id', 'usuario_documento', 'usuario_nombre', 'usuario_rol'
+]
+
+def _transformar_movimiento(movimiento):
+    """Convertir una fila de CONSULTA_DETALLES en MovimientoConDetalles"""
+    return {
+        'id': movimiento['id'],
+        'lote_id': movimiento['lote_id'],
+        'usuario_id': movimiento['usuario_id'],
+        'tipo': movimiento['tipo'],
+        'cantidad': movimiento['cantidad'],
+        'motivo': movimiento['motivo'],
+        'observaciones': movimiento['observaciones'],
+        'fecha_movimiento': movimiento['fecha_movimiento'],
+        # Información del lote
+        'lote': {
+            'id': movimiento['lote_id'],
+            'numero_lote': movimiento['numero_lote'],
+            'fecha_ingreso': movimiento['fecha_ingreso'],
+            'fecha_vencimiento': movimiento['fecha_vencimiento'],
+            'cantidad_disponible': movimiento['cantidad_disponible'],
+            'estado': movimiento['estado'],
+            'precio_unitario': movimiento['precio_unitario']
+        },
+        # Información del usuario
+        'usuario': {
+            'id': movimiento['usuario_id'],
+            'documento': movimiento['usuario_documento'],
+            'nombre': movimiento['usuario_nombre'],
+            'rol': movimiento['usuario_rol']
+        }
+    }
+
+async def _generar_ndjson(query, params):
+    """Un objeto JSON por línea, enviado por lotes a medida que llegan las filas"""
+    async for filas in stream_query_async(query, params):
+        yield "".join(
+            json.dumps(_transformar_movimiento(fila), default=str, ensure_ascii=False) + "\n"
+            for fila in filas
+        )
+
+async def _generar_csv(query, params):
+    """CSV plano con encabezado, enviado por lotes a medida que llegan las filas"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNAS_CSV)
+    yield buffer.getvalue()
+    
+    async for filas in stream_query_async(query, params):
+        buffer.seek(0)
+        buffer.truncate(0)
+        for fila in filas:
+            writer.writerow([fila[columna] for columna in COLUMNAS_CSV])
+        yield buffer.getvalue()
+
+async def _responder_movimientos_con_detalles(response, conditions, params, fecha_desde, fecha_hasta,
+                                              formato, nombre_archivo, limit, cursor):
+    """
+    Lista de movimientos con detalles paginada por cursor; con `formato` se
+    exporta en streaming (NDJSON o CSV) sin cargar el resultado completo en
+    memoria.
+    """
+    conditions = list(conditions)
+    params = list(params)
+    
+    if fecha_desde:
+        conditions.append("m.fecha_movimiento >= %s")
+        params.append(fecha_desde)
+    
+    if fecha_hasta:
+        # Límite exclusivo al día siguiente para seguir usando el índice por fecha
+        conditions.append("m.fecha_movimiento < %s")
+        params.append(fecha_hasta + timedelta(days=1))
+    
+    if formato:
+        query, params = LISTADO_DETALLES.consulta(conditions, params)
+    
+    if formato == "ndjson":
+        return StreamingResponse(_generar_ndjson(query, params), media_type="application/x-ndjson")
+    
+    if formato == "csv":
+        return StreamingResponse(
+            _generar_csv(query, params),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": f'attachment; filename="{nombre_archivo}.csv"'}
+        )
+    
+    movimientos = await paginar(response, LISTADO_DETALLES, conditions, params, limit, cursor)
+    return [_transformar_movimiento(movimiento) for movimiento in movimientos]
+
 @router.get("/", response_model=List[Movimiento])
 async def get_movimientos(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     lote_id: Optional[int] = Query(None),
     usuario_id: Optional[int] = Query(None),
     tipo: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (cabecera X-Next-Cursor)"),
     current_user: UsuarioResponse = Depends(get_current_user)
 ):
     """Obtener lista de movimientos"""
     try:
-        # Construir consulta base
-        query = "SELECT * FROM movimientos"
-        
         conditions = []
         params = []
         
@@ -40,15 +161,10 @@ async def get_movimientos(
             conditions.append("tipo = %s")
             params.append(tipo)
         
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-        
-        query += " ORDER BY fecha_movimiento DESC LIMIT %s OFFSET %s"
-        params.extend([limit, skip])
-        
-        movimientos = execute_query(query, params, fetch_all=True)
-        return movimientos
+        return await paginar(response, LISTADO_MOVIMIENTOS, conditions, params, limit, cursor, skip)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener movimientos: {str(e)}")
 
@@ -59,17 +175,8 @@ async def get_movimiento(
 ):
     """Obtener movimiento específico"""
     try:
-        movimiento = execute_query(
-            """SELECT m.*, l.numero_lote, l.fecha_ingreso, l.fecha_vencimiento,
-                      l.cantidad_disponible, l.estado, l.precio_unitario,
-                      p.codigo as producto_codigo, p.nombre as producto_nombre,
-                      u.documento as usuario_documento, u.nombre as usuario_nombre,
-                      u.rol as usuario_rol
-               FROM movimientos m
-               INNER JOIN lotes l ON m.lote_id = l.id
-               INNER JOIN productos p ON l.producto_id = p.id
-               INNER JOIN usuarios u ON m.usuario_id = u.id
-               WHERE m.id = %s""",
+        movimiento = await execute_query_async(
+            CONSULTA_DETALLES + " WHERE m.id = %s",
             (movimiento_id,),
             fetch_one=True
         )
@@ -77,36 +184,7 @@ async def get_movimiento(
         if not movimiento:
             raise HTTPException(status_code=404, detail="Movimiento no encontrado")
         
-        # Transformar resultado
-        movimiento_data = {
-            'id': movimiento['id'],
-            'lote_id': movimiento['lote_id'],
-            'usuario_id': movimiento['usuario_id'],
-            'tipo': movimiento['tipo'],
-            'cantidad': movimiento['cantidad'],
-            'motivo': movimiento['motivo'],
-            'observaciones': movimiento['observaciones'],
-            'fecha_movimiento': movimiento['fecha_movimiento']
-        }
-        
-        # Agregar información del lote
-        movimiento_data['lote'] = {
-            'id': movimiento['lote_id'],
-            'numero_lote': movimiento['numero_lote'],
-            'fecha_ingreso': movimiento['fecha_ingreso'],
-            'fecha_vencimiento': movimiento['fecha_vencimiento'],
-            'cantidad_disponible': movimiento['cantidad_disponible'],
-            'estado': movimiento['estado'],
-            'precio_unitario': movimiento['precio_unitario']
-        }
-        
-        # Agregar información del usuario
-        movimiento_data['usuario'] = {
-            'id': movimiento['usuario_id'],
-            'documento': movimiento['usuario_documento'],
-            'nombre': movimiento['usuario_nombre'],
-            'rol': movimiento['usuario_rol']
-        }
+        movimiento_data = _transformar_movimiento(movimiento)
         
         return movimiento_data
         
@@ -122,189 +200,255 @@ async def create_movimiento(
 ):
     """Crear nuevo movimiento"""
     try:
-        # Verificar si el lote existe
-        lote = execute_query(
-            "SELECT id, cantidad_disponible FROM lotes WHERE id = %s AND activo = TRUE",
-            (movimiento_data.lote_id,),
-            fetch_one=True
-        )
-        
-        if not lote:
-            raise HTTPException(status_code=404, detail="Lote no encontrado")
-        
-        # Verificar disponibilidad para salidas
-        if movimiento_data.tipo == "salida":
-            if lote['cantidad_disponible'] < movimiento_data.cantidad:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"No hay suficiente stock. Disponible: {lote['cantidad_disponible']}"
+        async with transaccion_async() as db:
+            # Actualizar el lote en una sola sentencia atómica: la salida solo
+            # descuenta si queda stock suficiente, sin leer-verificar-escribir
+            if movimiento_data.tipo == "entrada":
+                await db.execute(
+                    """UPDATE lotes SET cantidad_disponible = cantidad_disponible + %s
+                       WHERE id = %s AND activo = TRUE""",
+                    (movimiento_data.cantidad, movimiento_data.lote_id)
+                )
+            elif movimiento_data.tipo == "salida":
+                await db.execute(
+                    """UPDATE lotes SET cantidad_disponible = cantidad_disponible - %s
+                       WHERE id = %s AND activo = TRUE AND cantidad_disponible >= %s""",
+                    (movimiento_data.cantidad, movimiento_data.lote_id, movimiento_data.cantidad)
+                )
+            else:  # ajuste
+                await db.execute(
+                    "UPDATE lotes SET cantidad_disponible = %s WHERE id = %s AND activo = TRUE",
+                    (movimiento_data.cantidad, movimiento_data.lote_id)
+                )
+            
+            if db.rowcount == 0:
+                # Ninguna fila afectada: lote inexistente, stock insuficiente
+                # o un ajuste/entrada que no cambió el valor
+                lote = await db.execute(
+                    "SELECT id, cantidad_disponible FROM lotes WHERE id = %s AND activo = TRUE",
+                    (movimiento_data.lote_id,),
+                    fetch_one=True
+                )
+                
+                if not lote:
+                    raise HTTPException(status_code=404, detail="Lote no encontrado")
+                
+                if movimiento_data.tipo == "salida":
+                    raise HTTPException(
+                        status_code=400, 
+                        detail=f"No hay suficiente stock. Disponible: {lote['cantidad_disponible']}"
+                    )
+            
+            # Insertar el movimiento en la misma transacción
+            movimiento_id = await db.execute(
+                """INSERT INTO movimientos (lote_id, usuario_id, tipo, cantidad, motivo, observaciones)
+                   VALUES (%s, %s, %s, %s, %s, %s)""",
+                (
+                    movimiento_data.lote_id,
+                    current_user.id,
+                    movimiento_data.tipo.value,
+                    movimiento_data.cantidad,
+                    movimiento_data.motivo,
+                    movimiento_data.observaciones
                 )
-        
-        # Insertar nuevo movimiento
-        movimiento_id = execute_query(
-            """INSERT INTO movimientos (lote_id, usuario_id, tipo, cantidad, motivo, observaciones)
-               VALUES (%s, %s, %s, %s, %s, %s)""",
-            (
-                movimiento_data.lote_id,
-                current_user.id,
-                movimiento_data.tipo,
-                movimiento_data.cantidad,
-                movimiento_data.motivo,
-                movimiento_data.observaciones
             )
-        )
+            
+            # Obtener el movimiento creado
+            movimiento = await db.execute(
+                "SELECT * FROM movimientos WHERE id = %s",
+                (movimiento_id,),
+                fetch_one=True
+            )
         
-        # Actualizar cantidad disponible en el lote
-        if movimiento_data.tipo == "entrada":
-            nueva_cantidad = lote['cantidad_disponible'] + movimiento_data.cantidad
-        elif movimiento_data.tipo == "salida":
-            nueva_cantidad = lote['cantidad_disponible'] - movimiento_data.cantidad
-        else:  # ajuste
-            nueva_cantidad = movimiento_data.cantidad
+        return movimiento
         
-        execute_query(
-            "UPDATE lotes SET cantidad_disponible = %s WHERE id = %s",
-            (nueva_cantidad, movimiento_data.lote_id)
-        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al crear movimiento: {str(e)}")
+
+@router.post("/masivo/", response_model=MovimientosMasivoResponse)
+async def create_movimientos_masivo(
+    movimientos_data: List[MovimientoCreate],
+    current_user: UsuarioResponse = Depends(get_current_user)
+):
+    """
+    Registrar varios movimientos en una sola transacción.
+    Los movimientos se aplican en orden; los que no son válidos (lote
+    inexistente o stock insuficiente) se rechazan individualmente.
+    """
+    try:
+        if not movimientos_data:
+            raise HTTPException(status_code=400, detail="Debe enviar al menos un movimiento")
         
-        # Obtener el movimiento creado
-        movimiento = execute_query(
-            "SELECT * FROM movimientos WHERE id = %s",
-            (movimiento_id,),
-            fetch_one=True
-        )
+        if len(movimientos_data) > MAX_MOVIMIENTOS_MASIVO:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Máximo {MAX_MOVIMIENTOS_MASIVO} movimientos por solicitud"
+            )
         
-        return movimiento
+        lote_ids = sorted({m.lote_id for m in movimientos_data})
+        
+        async with transaccion_async() as db:
+            # Validar y bloquear todos los lotes con una sola consulta
+            placeholders = ", ".join(["%s"] * len(lote_ids))
+            lotes = await db.execute(
+                f"""SELECT id, cantidad_disponible FROM lotes
+                    WHERE id IN ({placeholders}) AND activo = TRUE
+                    FOR UPDATE""",
+                lote_ids,
+                fetch_all=True
+            )
+            saldos = {lote['id']: lote['cantidad_disponible'] for lote in lotes}
+            saldos_iniciales = dict(saldos)
+            
+            # Aplicar los movimientos en memoria, en el orden recibido
+            resultados = []
+            aceptados = []
+            for indice, movimiento in enumerate(movimientos_data):
+                resultado = ResultadoMovimientoMasivo(
+                    indice=indice,
+                    lote_id=movimiento.lote_id,
+                    exito=False
+                )
+                resultados.append(resultado)
+                
+                saldo = saldos.get(movimiento.lote_id)
+                if saldo is None:
+                    resultado.error = "Lote no encontrado"
+                    continue
+                
+                if movimiento.tipo == "entrada":
+                    saldo += movimiento.cantidad
+                elif movimiento.tipo == "salida":
+                    if saldo < movimiento.cantidad:
+                        resultado.error = f"No hay suficiente stock. Disponible: {saldo}"
+                        continue
+                    saldo -= movimiento.cantidad
+                else:  # ajuste
+                    saldo = movimiento.cantidad
+                
+                saldos[movimiento.lote_id] = saldo
+                resultado.exito = True
+                resultado.cantidad_disponible = saldo
+                aceptados.append((resultado, movimiento))
+            
+            if aceptados:
+                # Insertar todos los movimientos válidos en un INSERT de varias
+                # filas, marcados con un identificador de esta carga
+                carga = uuid.uuid4().hex
+                await db.executemany(
+                    """INSERT INTO movimientos (lote_id, usuario_id, tipo, cantidad, motivo, observaciones, carga_masiva)
+                       VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+                    [
+                        (
+                            movimiento.lote_id,
+                            current_user.id,
+                            movimiento.tipo.value,
+                            movimiento.cantidad,
+                            movimiento.motivo,
+                            movimiento.observaciones,
+                            carga
+                        )
+                        for _, movimiento in aceptados
+                    ]
+                )
+                
+                # Los ids no son necesariamente consecutivos (innodb_autoinc_lock_mode=2),
+                # pero dentro de la carga crecen en el orden de inserción
+                filas = await db.execute(
+                    "SELECT id FROM movimientos WHERE carga_masiva = %s ORDER BY id",
+                    (carga,),
+                    fetch_all=True
+                )
+                if len(filas) != len(aceptados):
+                    raise RuntimeError(
+                        f"Se insertaron {len(filas)} movimientos de {len(aceptados)} en la carga {carga}"
+                    )
+                for (resultado, _), fila in zip(aceptados, filas):
+                    resultado.movimiento_id = fila['id']
+                
+                # Actualizar los lotes modificados con un único UPDATE agrupado
+                modificados = [lote_id for lote_id in lote_ids
+                               if lote_id in saldos and saldos[lote_id] != saldos_iniciales[lote_id]]
+                if modificados:
+                    casos = " ".join(["WHEN %s THEN %s"] * len(modificados))
+                    params = []
+                    for lote_id in modificados:
+                        params.extend([lote_id, saldos[lote_id]])
+                    params.extend(modificados)
+                    await db.execute(
+                        f"""UPDATE lotes SET cantidad_disponible = CASE id {casos} END
+                            WHERE id IN ({", ".join(["%s"] * len(modificados))})""",
+                        params
+                    )
+        
+        exitosos = len(aceptados)
+        return MovimientosMasivoResponse(
+            total=len(resultados),
+            exitosos=exitosos,
+            fallidos=len(resultados) - exitosos,
+            resultados=resultados
+        )
         
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al crear movimiento: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al crear movimientos: {str(e)}")
 
 @router.get("/con-detalles/", response_model=List[MovimientoConDetalles])
 async def get_movimientos_con_detalles(
+    response: Response,
+    fecha_desde: Optional[date] = Query(None),
+    fecha_hasta: Optional[date] = Query(None),
+    formato: Optional[str] = Query(None, pattern="^(ndjson|csv)$", description="Exportar en streaming: ndjson o csv"),
+    limit: int = Query(100, ge=1, le=1000, description="Filas por página cuando no se exporta"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (cabecera X-Next-Cursor)"),
     current_user: UsuarioResponse = Depends(get_current_user)
 ):
     """Obtener movimientos con detalles de lotes y usuarios"""
     try:
-        movimientos = execute_query(
-            """SELECT m.*, l.numero_lote, l.fecha_ingreso, l.fecha_vencimiento,
-                      l.cantidad_disponible, l.estado, l.precio_unitario,
-                      p.codigo as producto_codigo, p.nombre as producto_nombre,
-                      u.documento as usuario_documento, u.nombre as usuario_nombre,
-                      u.rol as usuario_rol
-               FROM movimientos m
-               INNER JOIN lotes l ON m.lote_id = l.id
-               INNER JOIN productos p ON l.producto_id = p.id
-               INNER JOIN usuarios u ON m.usuario_id = u.id
-               ORDER BY m.fecha_movimiento DESC""",
-            fetch_all=True
+        return await _responder_movimientos_con_detalles(
+            response, [], [], fecha_desde, fecha_hasta, formato, "movimientos", limit, cursor
         )
         
-        # Transformar resultados
-        movimientos_con_detalles = []
-        for movimiento in movimientos:
-            movimiento_data = {
-                'id': movimiento['id'],
-                'lote_id': movimiento['lote_id'],
-                'usuario_id': movimiento['usuario_id'],
-                'tipo': movimiento['tipo'],
-                'cantidad': movimiento['cantidad'],
-                'motivo': movimiento['motivo'],
-                'observaciones': movimiento['observaciones'],
-                'fecha_movimiento': movimiento['fecha_movimiento']
-            }
-            
-            # Agregar información del lote
-            movimiento_data['lote'] = {
-                'id': movimiento['lote_id'],
-                'numero_lote': movimiento['numero_lote'],
-                'fecha_ingreso': movimiento['fecha_ingreso'],
-                'fecha_vencimiento': movimiento['fecha_vencimiento'],
-                'cantidad_disponible': movimiento['cantidad_disponible'],
-                'estado': movimiento['estado'],
-                'precio_unitario': movimiento['precio_unitario']
-            }
-            
-            # Agregar información del usuario
-            movimiento_data['usuario'] = {
-                'id': movimiento['usuario_id'],
-                'documento': movimiento['usuario_documento'],
-                'nombre': movimiento['usuario_nombre'],
-                'rol': movimiento['usuario_rol']
-            }
-            
-            movimientos_con_detalles.append(movimiento_data)
-        
-        return movimientos_con_detalles
-        
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener movimientos con detalles: {str(e)}")
 
 @router.get("/por-usuario/{usuario_id}", response_model=List[MovimientoConDetalles])
 async def get_movimientos_por_usuario(
+    response: Response,
     usuario_id: int,
+    fecha_desde: Optional[date] = Query(None),
+    fecha_hasta: Optional[date] = Query(None),
+    formato: Optional[str] = Query(None, pattern="^(ndjson|csv)$", description="Exportar en streaming: ndjson o csv"),
+    limit: int = Query(100, ge=1, le=1000, description="Filas por página cuando no se exporta"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (cabecera X-Next-Cursor)"),
     current_user: UsuarioResponse = Depends(get_current_user)
 ):
     """Obtener movimientos por usuario específico"""
     try:
-        movimientos = execute_query(
-            """SELECT m.*, l.numero_lote, l.fecha_ingreso, l.fecha_vencimiento,
-                      l.cantidad_disponible, l.estado, l.precio_unitario,
-                      p.codigo as producto_codigo, p.nombre as producto_nombre,
-                      u.documento as usuario_documento, u.nombre as usuario_nombre,
-                      u.rol as usuario_rol
-               FROM movimientos m
-               INNER JOIN lotes l ON m.lote_id = l.id
-               INNER JOIN productos p ON l.producto_id = p.id
-               INNER JOIN usuarios u ON m.usuario_id = u.id
-               WHERE m.usuario_id = %s
-               ORDER BY m.fecha_movimiento DESC""",
-            (usuario_id,),
-            fetch_all=True
+        return await _responder_movimientos_con_detalles(
+            response, ["m.usuario_id = %s"], [usuario_id], fecha_desde, fecha_hasta, formato,
+            f"movimientos_usuario_{usuario_id}", limit, cursor
         )
         
-        # Transformar resultados (mismo código que get_movimientos_con_detalles)
-        movimientos_con_detalles = []
-        for movimiento in movimientos:
-            movimiento_data = {
-                'id': movimiento['id'],
-                'lote_id': movimiento['lote_id'],
-                'usuario_id': movimiento['usuario_id'],
-                'tipo': movimiento['tipo'],
-                'cantidad': movimiento['cantidad'],
-                'motivo': movimiento['motivo'],
-                'observaciones': movimiento['observaciones'],
-                'fecha_movimiento': movimiento['fecha_movimiento']
-            }
-            
-            movimiento_data['lote'] = {
-                'id': movimiento['lote_id'],
-                'numero_lote': movimiento['numero_lote'],
-                'fecha_ingreso': movimiento['fecha_ingreso'],
-                'fecha_vencimiento': movimiento['fecha_vencimiento'],
-                'cantidad_disponible': movimiento['cantidad_disponible'],
-                'estado': movimiento['estado'],
-                'precio_unitario': movimiento['precio_unitario']
-            }
-            
-            movimiento_data['usuario'] = {
-                'id': movimiento['usuario_id'],
-                'documento': movimiento['usuario_documento'],
-                'nombre': movimiento['usuario_nombre'],
-                'rol': movimiento['usuario_rol']
-            }
-            
-            movimientos_con_detalles.append(movimiento_data)
-        
-        return movimientos_con_detalles
-        
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener movimientos por usuario: {str(e)}")
 
 @router.get("/por-tipo/{tipo}", response_model=List[MovimientoConDetalles])
 async def get_movimientos_por_tipo(
+    response: Response,
     tipo: str,
+    fecha_desde: Optional[date] = Query(None),
+    fecha_hasta: Optional[date] = Query(None),
+    formato: Optional[str] = Query(None, pattern="^(ndjson|csv)$", description="Exportar en streaming: ndjson o csv"),
+    limit: int = Query(100, ge=1, le=1000, description="Filas por página cuando no se exporta"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (cabecera X-Next-Cursor)"),
     current_user: UsuarioResponse = Depends(get_current_user)
 ):
     """Obtener movimientos por tipo específico"""
@@ -314,56 +458,12 @@ async def get_movimientos_por_tipo(
         if tipo not in tipos_validos:
             raise HTTPException(status_code=400, detail=f"Tipo inválido. Tipos válidos: {tipos_validos}")
         
-        movimientos = execute_query(
-            """SELECT m.*, l.numero_lote, l.fecha_ingreso, l.fecha_vencimiento,
-                      l.cantidad_disponible, l.estado, l.precio_unitario,
-                      p.codigo as producto_codigo, p.nombre as producto_nombre,
-                      u.documento as usuario_documento, u.nombre as usuario_nombre,
-                      u.rol as usuario_rol
-               FROM movimientos m
-               INNER JOIN lotes l ON m.lote_id = l.id
-               INNER JOIN productos p ON l.producto_id = p.id
-               INNER JOIN usuarios u ON m.usuario_id = u.id
-               WHERE m.tipo = %s
-               ORDER BY m.fecha_movimiento DESC""",
-            (tipo,),
-            fetch_all=True
+        return await _responder_movimientos_con_detalles(
+            response, ["m.tipo = %s"], [tipo], fecha_desde, fecha_hasta, formato,
+            f"movimientos_{tipo}", limit, cursor
         )
         
-        # Transformar resultados (mismo código que get_movimientos_con_detalles)
-        movimientos_con_detalles = []
-        for movimiento in movimientos:
-            movimiento_data = {
-                'id': movimiento['id'],
-                'lote_id': movimiento['lote_id'],
-                'usuario_id': movimiento['usuario_id'],
-                'tipo': movimiento['tipo'],
-                'cantidad': movimiento['cantidad'],
-                'motivo': movimiento['motivo'],
-                'observaciones': movimiento['observaciones'],
-                'fecha_movimiento': movimiento['fecha_movimiento']
-            }
-            
-            movimiento_data['lote'] = {
-                'id': movimiento['lote_id'],
-                'numero_lote': movimiento['numero_lote'],
-                'fecha_ingreso': movimiento['fecha_ingreso'],
-                'fecha_vencimiento': movimiento['fecha_vencimiento'],
-                'cantidad_disponible': movimiento['cantidad_disponible'],
-                'estado': movimiento['estado'],
-                'precio_unitario': movimiento['precio_unitario']
-            }
-            
-            movimiento_data['usuario'] = {
-                'id': movimiento['usuario_id'],
-                'documento': movimiento['usuario_documento'],
-                'nombre': movimiento['usuario_nombre'],
-                'rol': movimiento['usuario_rol']
-            }
-            
-            movimientos_con_detalles.append(movimiento_data)
-        
-        return movimientos_con_detalles
-        
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener movimientos por tipo: {str(e)}")
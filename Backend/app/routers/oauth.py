@@ -9,6 +9,8 @@ from typing import Optional
 from pydantic import BaseModel
 
 from ..services.oauth_service import oauth_service
+from ..services.token_store import REFRESH, CODIGO
+from ..database import ejecutar_en_hilo
 from ..models import MessageResponse
 
 router = APIRouter()
@@ -262,13 +264,14 @@ async def authenticate_user(
     """Autenticar usuario y generar código de autorización"""
     try:
         # Autenticar usuario
-        user = oauth_service.authenticate_user(documento, password)
+        user = await oauth_service.authenticate_user(documento, password)
         
         if not user:
             raise HTTPException(status_code=401, detail="Credenciales inválidas")
         
         # Crear código de autorización
-        auth_code = oauth_service.create_authorization_code(
+        auth_code = await ejecutar_en_hilo(
+            oauth_service.create_authorization_code,
             client_id=client_id,
             username=documento,
             redirect_uri=redirect_uri
@@ -300,7 +303,8 @@ async def token_endpoint(
     Implementa el método token() del Servicio_de_autenticacion
     """
     try:
-        token_response = oauth_service.token(
+        token_response = await ejecutar_en_hilo(
+            oauth_service.token,
             grant_type=grant_type,
             client_id=client_id,
             client_secret=client_secret,
@@ -325,7 +329,7 @@ async def introspect_endpoint(
     Implementa el método introspect() del Servicio_de_autenticacion
     """
     try:
-        introspection = oauth_service.introspect(token)
+        introspection = await oauth_service.introspect_async(token)
         return introspection
         
     except Exception as e:
@@ -341,7 +345,7 @@ async def revoke_endpoint(
     Implementa el método revoke() del Servicio_de_autenticacion
     """
     try:
-        revocation = oauth_service.revoke(token, token_type_hint)
+        revocation = await ejecutar_en_hilo(oauth_service.revoke, token, token_type_hint)
         return revocation
         
     except Exception as e:
@@ -361,7 +365,7 @@ async def userinfo_endpoint(
             raise HTTPException(status_code=401, detail="Token Bearer requerido")
         
         token = authorization.replace("Bearer ", "")
-        user_info = oauth_service.userinfo(token)
+        user_info = await oauth_service.userinfo_async(token)
         return user_info
         
     except HTTPException:
@@ -373,9 +377,9 @@ async def userinfo_endpoint(
 async def cleanup_expired_tokens():
     """Endpoint para limpiar tokens expirados (solo para administradores)"""
     try:
-        oauth_service.cleanup_expired_tokens()
+        eliminados = await ejecutar_en_hilo(oauth_service.cleanup_expired_tokens)
         return MessageResponse(
-            message="Tokens expirados limpiados exitosamente",
+            message=f"Tokens expirados limpiados exitosamente: {eliminados}",
             success=True
         )
     except Exception as e:
@@ -402,11 +406,16 @@ async def get_oauth_clients():
 async def oauth_status():
     """Estado del servicio OAuth2"""
     try:
+        conteo = await ejecutar_en_hilo(oauth_service.store.contar)
         status = {
             "service_active": True,
             "total_clients": len(oauth_service.oauth_clients),
-            "active_refresh_tokens": len(oauth_service.refresh_tokens),
-            "pending_auth_codes": len(oauth_service.authorization_codes),
+            "active_refresh_tokens": conteo[REFRESH],
+            "pending_auth_codes": conteo[CODIGO],
+            "token_store": oauth_service.store.stats(),
+            "barrido": oauth_service.get_barrido_status(),
+            "cache_introspeccion": oauth_service.cache_introspeccion.stats(),
+            "cache_userinfo": oauth_service.cache_userinfo.stats(),
             "endpoints": [
                 "/oauth/authorize",
                 "/oauth/token", 
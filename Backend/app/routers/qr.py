@@ -1,24 +1,22 @@
-from fastapi import APIRouter, Form, UploadFile, File, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, Form, UploadFile, File, HTTPException, Query, Request, Response
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-import qrcode
-from io import BytesIO
-import base64
-import socket
+from urllib.parse import quote
 import os
 from datetime import datetime
-import shutil
-import cv2
-import json
 from pathlib import Path
+from typing import Optional
 
-# Importar YOLO con manejo de errores
-try:
-    from ultralytics import YOLO
-    YOLO_AVAILABLE = True
-except ImportError:
-    YOLO_AVAILABLE = False
-    print("Warning: YOLO not available. Install ultralytics to use object detection features.")
+from ..services.qr_render import obtener_png, parametros, clave_qr, get_local_ip, cache_qr
+from ..services.etiquetas_qr import etiquetas_service
+from ..services.registro_qr import registro_qr
+from ..services.inferencia_service import inferencia_service
+from ..services.modelos import modelos, YOLO_AVAILABLE
+from ..services.imagenes import decodificar_imagen, guardar_bytes, guardar_anotada
+from ..database import ejecutar_en_hilo
+from ..core.config import settings
+from ..models import EtiquetasRequest
+from .auth import get_current_user, UsuarioResponse
 
 router = APIRouter()
 
@@ -33,30 +31,99 @@ UPLOAD_DIR.mkdir(exist_ok=True)
 RESULTS_DIR.mkdir(exist_ok=True)
 STATIC_DIR.mkdir(exist_ok=True)
 
-# Cargar modelo YOLO si está disponible
-model = None
-if YOLO_AVAILABLE:
-    model_path = BACKEND_DIR / "best.pt"
-    if model_path.exists():
-        try:
-            model = YOLO(str(model_path))
-            print(f"✅ Modelo YOLO cargado desde {model_path}")
-        except Exception as e:
-            print(f"❌ Error al cargar modelo YOLO: {e}")
-            model = None
-    else:
-        print(f"❌ Archivo del modelo no encontrado: {model_path}")
+# El modelo YOLO se carga en el primer uso desde el registro compartido
+# (services/modelos.py); las fotos se procesan por lotes en inferencia_service
+
+def _etag_coincide(if_none_match: str, etag: str) -> bool:
+    """
+    Comparación débil de If-None-Match (RFC 9110): lista separada por comas,
+    se ignora el prefijo W/ y `*` coincide con cualquier representación
+    """
+    for valor in if_none_match.split(","):
+        valor = valor.strip()
+        if valor == "*":
+            return True
+        if valor.startswith("W/"):
+            valor = valor[2:]
+        if valor == etag:
+            return True
+    return False
+
+@router.get("/imagen.png")
+async def qr_imagen(
+    request: Request,
+    datos: str = Query(..., max_length=1000, description="Texto o URL a codificar"),
+    box_size: int = Query(10, ge=1, le=40),
+    border: int = Query(4, ge=0, le=20),
+    error_correction: str = Query("L", pattern="^[LMQH]$")
+):
+    """
+    Imagen PNG de un código QR. La imagen depende solo de los parámetros,
+    así que se sirve desde la caché con ETag y caché larga en el navegador.
+    """
+    params = parametros(box_size=box_size, border=border, error_correction=error_correction)
+    etag = f'"{clave_qr(datos, params)}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=86400, immutable"}
+
+    # El cliente ya tiene la imagen: no hace falta ni buscarla en la caché
+    if _etag_coincide(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+
+    png, _ = await ejecutar_en_hilo(obtener_png, datos, **params)
+    return Response(content=png, media_type="image/png", headers=headers)
 
-def get_local_ip():
-    """Obtiene la IP local automáticamente."""
+@router.post("/etiquetas")
+async def generar_etiquetas(
+    solicitud: EtiquetasRequest,
+    current_user: UsuarioResponse = Depends(get_current_user)
+):
+    """
+    Etiquetas QR en lote para imprimir: productos por id, categoría u orden
+    y lotes por id. Los QR se renderizan en paralelo en un pool de procesos
+    y la respuesta se envía a medida que se generan las páginas.
+    """
     try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-        s.close()
-        return ip
-    except Exception:
-        return "127.0.0.1"
+        etiquetas = await ejecutar_en_hilo(
+            etiquetas_service.seleccionar,
+            solicitud.producto_ids, solicitud.lote_ids,
+            solicitud.categoria, solicitud.orden_id, solicitud.copias
+        )
+        if not etiquetas:
+            raise HTTPException(status_code=404, detail="No se encontraron productos ni lotes para las etiquetas")
+
+        nombre = f"etiquetas_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        if solicitud.formato == "pdf":
+            contenido = etiquetas_service.generar_pdf(
+                etiquetas, solicitud.columnas, solicitud.filas,
+                error_correction=solicitud.error_correction
+            )
+            media_type, nombre = "application/pdf", f"{nombre}.pdf"
+        elif solicitud.formato == "png":
+            contenido = etiquetas_service.generar_zip_paginas(
+                etiquetas, solicitud.columnas, solicitud.filas,
+                error_correction=solicitud.error_correction
+            )
+            media_type, nombre = "application/zip", f"{nombre}_paginas.zip"
+        else:
+            contenido = etiquetas_service.generar_zip_etiquetas(
+                etiquetas, error_correction=solicitud.error_correction
+            )
+            media_type, nombre = "application/zip", f"{nombre}.zip"
+
+        return StreamingResponse(
+            contenido,
+            media_type=media_type,
+            headers={
+                "Content-Disposition": f'attachment; filename="{nombre}"',
+                "X-Total-Etiquetas": str(len(etiquetas))
+            }
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al generar etiquetas: {str(e)}")
 
 @router.get("/", response_class=HTMLResponse)
 async def generate_qr():
@@ -64,21 +131,8 @@ async def generate_qr():
     local_ip = get_local_ip()
     url = f"http://{local_ip}:8000/api/qr/connect"
 
-    # Generar QR
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(url)
-    qr.make(fit=True)
-
-    img = qr.make_image(fill_color="black", back_color="white")
-    img_byte_arr = BytesIO()
-    img.save(img_byte_arr, format='PNG')
-    img_byte_arr = img_byte_arr.getvalue()
-    qr_base64 = base64.b64encode(img_byte_arr).decode("utf-8")
+    # La imagen se pide al endpoint PNG (en caché) en lugar de incrustarla en base64
+    qr_src = f"/api/qr/imagen.png?datos={quote(url, safe='')}"
 
     html_content = f"""
     <!DOCTYPE html>
@@ -156,7 +210,7 @@ async def generate_qr():
             <p class="subtitle">Escanea el código QR para usar la app móvil</p>
             
             <div class="qr-container">
-                <img src="data:image/png;base64,{qr_base64}" alt="QR Code" class="qr-code">
+                <img src="{qr_src}" alt="QR Code" class="qr-code">
             </div>
             
             <div class="url-info">
@@ -510,34 +564,26 @@ async def receive_data(data: str = Form(...)):
         "data": data
     }
     
-    log_file = BACKEND_DIR / "qr_data_log.json"
-    logs = []
-    
-    # Leer logs existentes
-    if log_file.exists():
-        try:
-            with open(log_file, 'r', encoding='utf-8') as f:
-                logs = json.load(f)
-        except:
-            logs = []
-    
-    # Agregar nuevo log
-    logs.append(log_entry)
-    
-    # Mantener solo los últimos 1000 registros
-    if len(logs) > 1000:
-        logs = logs[-1000:]
-    
-    # Guardar logs
-    with open(log_file, 'w', encoding='utf-8') as f:
-        json.dump(logs, f, ensure_ascii=False, indent=2)
+    # Se agrega al registro en segundo plano, sin reescribir el archivo
+    registro_qr.registrar(log_entry)
     
     return {"message": f"Datos recibidos y guardados: {data}", "timestamp": timestamp}
 
+def _persistir_foto(contenido: bytes, file_path: Optional[Path], result, result_path: Optional[Path]):
+    """Guardar la foto original y la anotada después de responder (opcional)"""
+    try:
+        if file_path is not None:
+            guardar_bytes(file_path, contenido)
+            print(f"📸 Foto guardada en {file_path}")
+        if result_path is not None and guardar_anotada(result_path, result):
+            print(f"✅ Resultado procesado y guardado en {result_path}")
+    except Exception as e:
+        print(f"❌ Error guardando la foto: {e}")
+
 @router.post("/upload_photo")
-async def upload_photo(file: UploadFile = File(...)):
+async def upload_photo(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     """Recibe y procesa fotos desde dispositivos móviles usando YOLO"""
-    if not model and YOLO_AVAILABLE:
+    if not inferencia_service.disponible and YOLO_AVAILABLE:
         raise HTTPException(status_code=500, detail="Modelo YOLO no disponible")
     elif not YOLO_AVAILABLE:
         raise HTTPException(status_code=500, detail="YOLO no está instalado. Instala 'ultralytics' para usar esta función.")
@@ -547,44 +593,50 @@ async def upload_photo(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="El archivo debe ser una imagen")
     
     try:
-        # Generar nombre único
+        # Generar nombre único (sin rutas que vengan del cliente)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{timestamp}_{file.filename}"
-        file_path = UPLOAD_DIR / filename
+        nombre = f"{timestamp}_{Path(file.filename or 'foto.jpg').name}"
         
-        # Guardar archivo
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Decodificar en memoria: la foto no pasa por disco antes de YOLO
+        contenido = await file.read()
+        if len(contenido) > settings.yolo_max_bytes:
+            raise HTTPException(status_code=413, detail="La imagen supera el tamaño máximo permitido")
+        try:
+            imagen = await ejecutar_en_hilo(decodificar_imagen, contenido)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        print(f"📸 Foto recibida y guardada en {file_path}")
+        print(f"📸 Foto recibida: {nombre} ({len(contenido)} bytes)")
         
-        # Procesar con YOLO
-        results = model(str(file_path))
+        # Procesar con YOLO: la foto se agrupa con las que lleguen a la vez
+        # y se infiere en el hilo del modelo, sin bloquear el event loop
+        result, metricas = await inferencia_service.inferir(imagen)
         
         # Obtener información de detecciones
         detections_info = []
-        if results and len(results) > 0:
-            boxes = results[0].boxes
+        if result is not None:
+            boxes = result.boxes
             if boxes is not None:
                 for box in boxes:
                     confidence = float(box.conf[0])
                     class_id = int(box.cls[0])
-                    class_name = model.names[class_id] if hasattr(model, 'names') else f"Class_{class_id}"
+                    class_name = result.names[class_id] if hasattr(result, 'names') else f"Class_{class_id}"
                     detections_info.append({
                         "class": class_name,
                         "confidence": round(confidence * 100, 2)
                     })
         
-        # Crear imagen anotada
-        annotated_frame = results[0].plot() if results else None
-        
-        # Guardar resultado
-        result_filename = f"result_{filename}"
-        result_path = RESULTS_DIR / result_filename
-        
-        if annotated_frame is not None:
-            cv2.imwrite(str(result_path), annotated_frame)
-            print(f"✅ Resultado procesado y guardado en {result_path}")
+        # Guardar original y anotada (si está configurado) después de responder
+        filename = nombre if settings.yolo_guardar_originales else None
+        result_filename = f"result_{nombre}" if settings.yolo_guardar_resultados and result is not None else None
+        if filename or result_filename:
+            background_tasks.add_task(
+                _persistir_foto,
+                contenido,
+                UPLOAD_DIR / filename if filename else None,
+                result,
+                RESULTS_DIR / result_filename if result_filename else None
+            )
         
         # Guardar log de procesamiento
         log_entry = {
@@ -592,54 +644,38 @@ async def upload_photo(file: UploadFile = File(...)):
             "type": "photo_processing",
             "original_file": filename,
             "result_file": result_filename,
-            "detections": detections_info
+            "detections": detections_info,
+            "inferencia": metricas
         }
         
-        log_file = BACKEND_DIR / "qr_data_log.json"
-        logs = []
-        
-        if log_file.exists():
-            try:
-                with open(log_file, 'r', encoding='utf-8') as f:
-                    logs = json.load(f)
-            except:
-                logs = []
-        
-        logs.append(log_entry)
-        
-        if len(logs) > 1000:
-            logs = logs[-1000:]
-        
-        with open(log_file, 'w', encoding='utf-8') as f:
-            json.dump(logs, f, ensure_ascii=False, indent=2)
+        registro_qr.registrar(log_entry)
         
         return {
             "message": "Foto subida y procesada con éxito",
             "filename": filename,
             "result": result_filename,
             "detections": f"Encontrados {len(detections_info)} objetos" if detections_info else "No se detectaron objetos",
-            "detection_details": detections_info
+            "detection_details": detections_info,
+            "inferencia": metricas
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error procesando foto: {e}")
         raise HTTPException(status_code=500, detail=f"Error procesando imagen: {str(e)}")
 
 @router.get("/logs")
-async def get_qr_logs():
-    """Obtiene los logs de datos QR recibidos"""
-    log_file = BACKEND_DIR / "qr_data_log.json"
-    
-    if not log_file.exists():
-        return {"logs": [], "message": "No hay logs disponibles"}
-    
+async def get_qr_logs(limit: int = Query(50, ge=1, le=1000)):
+    """Obtiene los logs de datos QR recibidos (solo se lee el final del registro)"""
     try:
-        with open(log_file, 'r', encoding='utf-8') as f:
-            logs = json.load(f)
+        logs = await ejecutar_en_hilo(registro_qr.ultimas, limit)
+        if not logs:
+            return {"logs": [], "message": "No hay logs disponibles"}
         
         return {
-            "logs": logs[-50:],  # Últimos 50 registros
-            "total_logs": len(logs),
+            "logs": logs,
+            "total_logs": await ejecutar_en_hilo(registro_qr.total),
             "message": "Logs obtenidos exitosamente"
         }
     except Exception as e:
@@ -650,9 +686,14 @@ async def qr_system_status():
     """Obtiene el estado del sistema QR"""
     return {
         "yolo_available": YOLO_AVAILABLE,
-        "model_loaded": model is not None,
+        "model_loaded": modelos.cargado("yolo"),
+        "inferencia": inferencia_service.stats(),
+        "modelos": modelos.stats(),
         "upload_dir_exists": UPLOAD_DIR.exists(),
         "results_dir_exists": RESULTS_DIR.exists(),
         "local_ip": get_local_ip(),
+        "cache_qr": cache_qr.stats(),
+        "etiquetas": etiquetas_service.stats(),
+        "registro": registro_qr.stats(),
         "timestamp": datetime.now().isoformat()
     }
\ No newline at end of file
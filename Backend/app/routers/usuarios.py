@@ -30,7 +30,7 @@ async def change_password(
     Implementa el método changePassword() de la clase Usuario
     """
     try:
-        success = usuario_service.change_password(
+        success = await usuario_service.change_password(
             user_id=current_user.id,
             old_password=password_data.old_password,
             new_password=password_data.new_password
@@ -59,7 +59,7 @@ async def verify_password(
     Implementa el método verifyPassword() de la clase Usuario
     """
     try:
-        is_valid = usuario_service.verify_password(
+        is_valid = await usuario_service.verify_password(
             user_id=current_user.id,
             password=password
         )
@@ -69,6 +69,8 @@ async def verify_password(
             "message": "Contraseña verificada" if is_valid else "Contraseña incorrecta"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al verificar contraseña: {str(e)}")
 
@@ -0,0 +1,71 @@
+"""
+Backends de inferencia para el modelo YOLO
+best.pt se puede ejecutar con PyTorch (ultralytics), o exportado a ONNX
+Runtime u OpenVINO, que en CPU suelen ser bastante más rápidos. Los archivos
+exportados los genera exportar_modelo.py junto a best.pt y ultralytics los
+carga con la misma interfaz (mismos resultados, plot(), names), así que el
+resto del backend no cambia. YOLO_BACKEND y YOLO_INT8 eligen cuál se usa.
+"""
+
+import importlib.util
+from pathlib import Path
+from typing import Dict, Tuple
+
+from ..core.config import settings
+
+BACKENDS = ("pytorch", "onnx", "openvino")
+
+# Paquete que necesita cada backend además de ultralytics. Solo se comprueba
+# que esté instalado: se importa al cargar el modelo, no al iniciar
+RUNTIMES = {"pytorch": "torch", "onnx": "onnxruntime", "openvino": "openvino"}
+
+def runtime_disponible(backend: str) -> bool:
+    return importlib.util.find_spec(RUNTIMES[backend]) is not None
+
+def ruta_backend(ruta_pt: Path, backend: str, int8: bool = False) -> Path:
+    """
+    Archivo del modelo para un backend: best.pt, best.onnx / best_int8.onnx,
+    best_openvino_model/ / best_int8_openvino_model/
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de inferencia desconocido: {backend} (opciones: {', '.join(BACKENDS)})")
+    if backend == "pytorch":
+        return ruta_pt
+    sufijo = "_int8" if int8 else ""
+    if backend == "onnx":
+        return ruta_pt.with_name(f"{ruta_pt.stem}{sufijo}.onnx")
+    return ruta_pt.with_name(f"{ruta_pt.stem}{sufijo}_openvino_model")
+
+def nombre_backend(backend: str, int8: bool = False) -> str:
+    return f"{backend}-int8" if int8 and backend != "pytorch" else backend
+
+def resolver(ruta_pt: Path, backend: str = None, int8: bool = None) -> Tuple[str, Path]:
+    """
+    Backend y archivo a cargar según la configuración. Si el modelo exportado
+    no existe o su runtime no está instalado se usa best.pt con PyTorch.
+    """
+    backend = (backend or settings.yolo_backend).strip().lower()
+    int8 = settings.yolo_int8 if int8 is None else int8
+    ruta = ruta_backend(ruta_pt, backend, int8)
+    if backend == "pytorch":
+        return backend, ruta
+
+    nombre = nombre_backend(backend, int8)
+    if not ruta.exists():
+        print(f"Warning: no existe {ruta.name} para el backend {nombre}; ejecuta exportar_modelo.py. Se usa PyTorch.")
+        return "pytorch", ruta_pt
+    if not runtime_disponible(backend):
+        print(f"Warning: {RUNTIMES[backend]} no está instalado para el backend {nombre}. Se usa PyTorch.")
+        return "pytorch", ruta_pt
+    return nombre, ruta
+
+def stats(ruta_pt: Path) -> Dict[str, Dict[str, bool]]:
+    """Backends instalados y modelos exportados disponibles"""
+    return {
+        nombre_backend(backend, int8): {
+            "runtime": runtime_disponible(backend),
+            "exportado": ruta_backend(ruta_pt, backend, int8).exists()
+        }
+        for backend in BACKENDS
+        for int8 in ((False,) if backend == "pytorch" else (False, True))
+    }
@@ -0,0 +1,199 @@
+"""
+Índice en memoria del catálogo de productos para resolver códigos QR
+Mantiene id -> producto y codigo -> id de los productos activos y se
+actualiza por diferencias usando productos.fecha_actualizacion, de modo que
+un escaneo se resuelve sin consultar la base (o con una sola consulta
+incremental cuando toca refrescar).
+"""
+
+import json
+import re
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from ..core.config import settings
+from ..database import execute_query
+from . import qr_payload
+
+# Patrones de URL que contienen el ID del producto (se compilan una sola vez)
+PATRONES_URL = [
+    re.compile(r'/productos?/(\d+)'),
+    re.compile(r'producto_id=(\d+)'),
+    re.compile(r'id=(\d+)'),
+]
+
+# Margen para no perder filas cuyo commit llegó después de la última lectura
+MARGEN_REFRESCO = timedelta(seconds=5)
+
+# Productos modificados desde la última lectura (usa idx_productos_actualizacion)
+CONSULTA_REFRESCO = "SELECT * FROM productos WHERE fecha_actualizacion >= %s"
+
+class CatalogoService:
+    """Catálogo de productos activos indexado por id y por código"""
+
+    def __init__(self):
+        self._por_id: Dict[int, Dict[str, Any]] = {}
+        self._por_codigo: Dict[str, int] = {}
+        self._marca = None
+        self._cargado = False
+        self._ultima_revision = 0.0
+        self._ultima_recarga = 0.0
+        self._lock = threading.Lock()
+        # Un solo hilo refresca a la vez; los demás usan el índice actual
+        self._refresco = threading.Lock()
+        self.recargas_completas = 0
+        self.refrescos_incrementales = 0
+        self.aciertos = 0
+        self.fallos = 0
+
+    def recargar(self):
+        """Cargar el catálogo completo (también detecta productos eliminados)"""
+        productos = execute_query("SELECT * FROM productos WHERE activo = TRUE", fetch_all=True)
+        marca = execute_query(
+            "SELECT MAX(fecha_actualizacion) as marca FROM productos", fetch_one=True
+        )['marca']
+
+        with self._lock:
+            self._por_id = {p['id']: p for p in productos}
+            self._por_codigo = {p['codigo']: p['id'] for p in productos}
+            self._marca = marca
+            self._cargado = True
+            self._ultima_revision = self._ultima_recarga = time.monotonic()
+            self.recargas_completas += 1
+
+    def refrescar(self):
+        """Aplicar solo los productos modificados desde la última lectura"""
+        if self._marca is None:
+            # Tabla vacía en la última lectura: cualquier producto es nuevo
+            cambios = execute_query("SELECT * FROM productos", fetch_all=True)
+        else:
+            cambios = execute_query(
+                CONSULTA_REFRESCO,
+                (self._marca - MARGEN_REFRESCO,),
+                fetch_all=True
+            )
+
+        with self._lock:
+            for producto in cambios:
+                anterior = self._por_id.pop(producto['id'], None)
+                if anterior is not None:
+                    self._por_codigo.pop(anterior['codigo'], None)
+                if producto['activo']:
+                    self._por_id[producto['id']] = producto
+                    self._por_codigo[producto['codigo']] = producto['id']
+                if self._marca is None or producto['fecha_actualizacion'] > self._marca:
+                    self._marca = producto['fecha_actualizacion']
+            self._ultima_revision = time.monotonic()
+            self.refrescos_incrementales += 1
+
+    def _asegurar_vigente(self):
+        """Refrescar si venció el intervalo (a lo sumo una consulta incremental)"""
+        if not self._cargado:
+            with self._refresco:
+                if not self._cargado:
+                    self.recargar()
+            return
+
+        ahora = time.monotonic()
+        recargar = ahora - self._ultima_recarga >= settings.catalogo_recarga_completa
+        if not recargar and ahora - self._ultima_revision < settings.catalogo_refresco:
+            return
+
+        if not self._refresco.acquire(blocking=False):
+            return
+        try:
+            if recargar:
+                self.recargar()
+            else:
+                self.refrescar()
+        finally:
+            self._refresco.release()
+
+    def marcar_cambio(self):
+        """Forzar el refresco en la próxima consulta (tras crear o editar productos)"""
+        self._ultima_revision = 0.0
+
+    def por_id(self, producto_id: int) -> Optional[Dict[str, Any]]:
+        self._asegurar_vigente()
+        with self._lock:
+            producto = self._por_id.get(producto_id)
+        return self._contar(producto)
+
+    def por_codigo(self, codigo: str) -> Optional[Dict[str, Any]]:
+        self._asegurar_vigente()
+        with self._lock:
+            producto_id = self._por_codigo.get(codigo)
+            producto = self._por_id.get(producto_id) if producto_id is not None else None
+        return self._contar(producto)
+
+    def _contar(self, producto):
+        if producto is None:
+            self.fallos += 1
+            return None
+        self.aciertos += 1
+        return dict(producto)
+
+    def resolver(self, qr_data: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Resolver el contenido de un QR a un producto activo.
+        Devuelve (producto, origen) con origen en compacto, id, codigo, url o json.
+        """
+        qr_data = qr_data.strip()
+
+        # Contenido compacto firmado
+        if qr_payload.es_compacto(qr_data):
+            recurso = qr_payload.decodificar(qr_data)
+            if recurso and recurso[0] == 'producto':
+                return self.por_id(recurso[1]), 'compacto'
+            return None, None
+
+        # ID numérico directo
+        if qr_data.isdigit():
+            producto = self.por_id(int(qr_data))
+            if producto:
+                return producto, 'id'
+
+        # Código de producto
+        producto = self.por_codigo(qr_data)
+        if producto:
+            return producto, 'codigo'
+
+        # URL con el ID del producto
+        if qr_data.startswith('http'):
+            for patron in PATRONES_URL:
+                match = patron.search(qr_data)
+                if match:
+                    return self.por_id(int(match.group(1))), 'url'
+            return None, None
+
+        # JSON con datos estructurados
+        if qr_data.startswith('{'):
+            try:
+                datos = json.loads(qr_data)
+                if 'producto_id' in datos:
+                    return self.por_id(int(datos['producto_id'])), 'json'
+                if 'codigo' in datos:
+                    return self.por_codigo(str(datos['codigo'])), 'json'
+            except (ValueError, TypeError):
+                return None, None
+
+        return None, None
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado del índice"""
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "productos": len(self._por_id),
+                "marca": self._marca,
+                "recargas_completas": self.recargas_completas,
+                "refrescos_incrementales": self.refrescos_incrementales,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0
+            }
+
+# Instancia global del catálogo
+catalogo_service = CatalogoService()
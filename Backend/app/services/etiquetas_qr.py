@@ -0,0 +1,335 @@
+"""
+Hojas de etiquetas QR para imprimir en lote
+Los QR se renderizan en un pool de procesos (qrcode y Pillow son CPU puro y
+no liberan el GIL) y el resultado se envía al cliente a medida que cada
+página o grupo de etiquetas queda listo: PDF paginado, ZIP con páginas PNG
+o ZIP con una imagen por etiqueta.
+"""
+
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from ..core.config import settings
+from ..database import execute_query
+from . import qr_payload
+from .qr_render import PAGINA_ALTO, PAGINA_ANCHO, parametros, renderizar_etiquetas, renderizar_pagina
+
+# Etiquetas por tarea en el formato ZIP: amortiza el envío entre procesos
+ETIQUETAS_POR_TAREA = 25
+
+class _SalidaZip:
+    """Destino no posicionable para zipfile: acumula lo escrito hasta retirarlo"""
+
+    def __init__(self):
+        self._partes: List[bytes] = []
+
+    def write(self, datos) -> int:
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def retirar(self) -> bytes:
+        datos = b"".join(self._partes)
+        self._partes = []
+        return datos
+
+class EscritorPDF:
+    """
+    PDF mínimo escrito de forma incremental: cada página es una imagen en
+    escala de grises a página completa. El árbol de páginas y la tabla xref
+    se escriben al final, así que las páginas se pueden enviar según llegan.
+    """
+
+    # A4 en puntos
+    ANCHO_PT = 595.28
+    ALTO_PT = 841.89
+
+    def __init__(self):
+        self._posicion = 0
+        self._offsets: Dict[int, int] = {}
+        self._paginas: List[int] = []
+        # 1 = catálogo, 2 = árbol de páginas
+        self._siguiente = 3
+
+    def _objeto(self, numero: int, cuerpo: bytes, stream: Optional[bytes] = None) -> bytes:
+        self._offsets[numero] = self._posicion
+        datos = b"%d 0 obj\n" % numero + cuerpo
+        if stream is not None:
+            datos += b"\nstream\n" + stream + b"\nendstream"
+        datos += b"\nendobj\n"
+        self._posicion += len(datos)
+        return datos
+
+    def inicio(self) -> bytes:
+        cabecera = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+        self._posicion += len(cabecera)
+        return cabecera
+
+    def pagina(self, pixeles: bytes, ancho: int, alto: int) -> bytes:
+        """Página con una imagen de ancho x alto píxeles grises comprimidos con zlib"""
+        imagen, contenido, pagina = self._siguiente, self._siguiente + 1, self._siguiente + 2
+        self._siguiente += 3
+        self._paginas.append(pagina)
+
+        dibujo = b"q %.2f 0 0 %.2f 0 0 cm /Im0 Do Q" % (self.ANCHO_PT, self.ALTO_PT)
+        return (
+            self._objeto(
+                imagen,
+                b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray "
+                b"/BitsPerComponent 8 /Filter /FlateDecode /Length %d >>" % (ancho, alto, len(pixeles)),
+                pixeles
+            )
+            + self._objeto(contenido, b"<< /Length %d >>" % len(dibujo), dibujo)
+            + self._objeto(
+                pagina,
+                b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] "
+                b"/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>"
+                % (self.ANCHO_PT, self.ALTO_PT, imagen, contenido)
+            )
+        )
+
+    def fin(self) -> bytes:
+        hijos = b" ".join(b"%d 0 R" % numero for numero in self._paginas)
+        datos = self._objeto(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (hijos, len(self._paginas)))
+        datos += self._objeto(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+        inicio_xref = self._posicion
+        total = self._siguiente
+        xref = [b"xref\n0 %d\n" % total, b"0000000000 65535 f \n"]
+        xref.extend(b"%010d 00000 n \n" % self._offsets[numero] for numero in range(1, total))
+        xref.append(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (total, inicio_xref))
+        return datos + b"".join(xref)
+
+class EtiquetasService:
+    """Selección de etiquetas y renderizado en paralelo en un pool de procesos"""
+
+    def __init__(self):
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.procesos = settings.etiquetas_procesos or os.cpu_count() or 1
+        self.solicitudes = 0
+        self.etiquetas_generadas = 0
+        self.paginas_generadas = 0
+
+    def get_pool(self) -> ProcessPoolExecutor:
+        """Pool de procesos, creado en la primera solicitud"""
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    # spawn: los procesos hijos no heredan hilos ni conexiones abiertas
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.procesos,
+                        mp_context=multiprocessing.get_context("spawn")
+                    )
+        return self._pool
+
+    def cerrar(self):
+        """Detener el pool de procesos (al apagar la aplicación)"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    # Selección
+
+    def _etiqueta_producto(self, producto: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "nombre": f"producto_{producto['codigo']}",
+            "datos": qr_payload.codificar("producto", producto['id']),
+            "lineas": [str(producto['codigo']), str(producto['nombre'])]
+        }
+
+    def _etiqueta_lote(self, lote: Dict[str, Any]) -> Dict[str, Any]:
+        detalle = str(lote['producto_codigo'])
+        if lote['fecha_vencimiento']:
+            detalle += f" - vence {lote['fecha_vencimiento'].isoformat()}"
+        return {
+            "nombre": f"lote_{lote['numero_lote']}",
+            "datos": qr_payload.codificar("lote", lote['id']),
+            "lineas": [f"Lote {lote['numero_lote']}", detalle]
+        }
+
+    def seleccionar(self, producto_ids: List[int], lote_ids: List[int],
+                    categoria: Optional[str] = None, orden_id: Optional[int] = None,
+                    copias: int = 1) -> List[Dict[str, Any]]:
+        """
+        Etiquetas a imprimir: productos por id, por categoría o de una orden,
+        y lotes por id. Cada producto o lote aparece una vez (por copia).
+        """
+        productos: Dict[int, Dict[str, Any]] = {}
+
+        if producto_ids:
+            marcadores = ", ".join(["%s"] * len(producto_ids))
+            filas = execute_query(
+                f"SELECT id, codigo, nombre FROM productos WHERE activo = TRUE AND id IN ({marcadores})",
+                tuple(producto_ids),
+                fetch_all=True
+            )
+            por_id = {fila['id']: fila for fila in filas}
+            for producto_id in producto_ids:
+                if producto_id in por_id:
+                    productos.setdefault(producto_id, por_id[producto_id])
+
+        if categoria:
+            filas = execute_query(
+                """SELECT id, codigo, nombre FROM productos
+                   WHERE activo = TRUE AND categoria = %s
+                   ORDER BY nombre, id""",
+                (categoria,),
+                fetch_all=True
+            )
+            for fila in filas:
+                productos.setdefault(fila['id'], fila)
+
+        if orden_id is not None:
+            filas = execute_query(
+                """SELECT pr.id, pr.codigo, pr.nombre
+                   FROM ordenes_detalles od
+                   JOIN productos pr ON od.id_producto = pr.id
+                   WHERE od.id_orden = %s
+                   ORDER BY pr.nombre""",
+                (orden_id,),
+                fetch_all=True
+            )
+            for fila in filas:
+                productos.setdefault(fila['id'], fila)
+
+        etiquetas = [self._etiqueta_producto(producto) for producto in productos.values()]
+
+        if lote_ids:
+            marcadores = ", ".join(["%s"] * len(lote_ids))
+            filas = execute_query(
+                f"""SELECT l.id, l.numero_lote, l.fecha_vencimiento, p.codigo as producto_codigo
+                    FROM lotes l
+                    JOIN productos p ON l.producto_id = p.id
+                    WHERE l.activo = TRUE AND l.id IN ({marcadores})""",
+                tuple(lote_ids),
+                fetch_all=True
+            )
+            por_id = {fila['id']: fila for fila in filas}
+            vistos = set()
+            for lote_id in lote_ids:
+                if lote_id in por_id and lote_id not in vistos:
+                    vistos.add(lote_id)
+                    etiquetas.append(self._etiqueta_lote(por_id[lote_id]))
+
+        etiquetas = [etiqueta for etiqueta in etiquetas for _ in range(copias)]
+        if len(etiquetas) > settings.etiquetas_max:
+            raise ValueError(
+                f"La solicitud genera {len(etiquetas)} etiquetas; el máximo es {settings.etiquetas_max}"
+            )
+        return etiquetas
+
+    # Renderizado
+
+    async def _en_paralelo(self, funcion, grupos: List[list]) -> AsyncIterator[Any]:
+        """
+        Ejecutar funcion(grupo) en el pool y entregar los resultados en orden.
+        Se mantienen a lo sumo 2 tareas por proceso en vuelo, de modo que la
+        memoria no crece con el tamaño del lote y el cliente recibe datos
+        desde la primera página.
+        """
+        loop = asyncio.get_running_loop()
+        pool = self.get_pool()
+        pendientes = deque()
+        try:
+            for grupo in grupos:
+                pendientes.append(loop.run_in_executor(pool, funcion, grupo))
+                if len(pendientes) >= 2 * self.procesos:
+                    yield await pendientes.popleft()
+            while pendientes:
+                yield await pendientes.popleft()
+        finally:
+            # Cliente desconectado: no seguir renderizando lo que nadie leerá
+            for futuro in pendientes:
+                futuro.cancel()
+
+    def _paginas(self, etiquetas: List[Dict[str, Any]], columnas: int, filas: int) -> List[list]:
+        por_pagina = columnas * filas
+        return [
+            [(e["datos"], e["lineas"]) for e in etiquetas[inicio:inicio + por_pagina]]
+            for inicio in range(0, len(etiquetas), por_pagina)
+        ]
+
+    async def generar_pdf(self, etiquetas: List[Dict[str, Any]], columnas: int, filas: int,
+                          **cambios) -> AsyncIterator[bytes]:
+        """PDF A4 paginado, enviado página por página"""
+        self.solicitudes += 1
+        funcion = functools.partial(
+            renderizar_pagina, params=parametros(**cambios),
+            columnas=columnas, filas=filas, formato="PDF"
+        )
+        escritor = EscritorPDF()
+        yield escritor.inicio()
+        async for pixeles in self._en_paralelo(funcion, self._paginas(etiquetas, columnas, filas)):
+            self.paginas_generadas += 1
+            yield escritor.pagina(pixeles, PAGINA_ANCHO, PAGINA_ALTO)
+        self.etiquetas_generadas += len(etiquetas)
+        yield escritor.fin()
+
+    async def generar_zip_paginas(self, etiquetas: List[Dict[str, Any]], columnas: int, filas: int,
+                                  **cambios) -> AsyncIterator[bytes]:
+        """ZIP con una imagen PNG por página (pagina_001.png, ...)"""
+        self.solicitudes += 1
+        funcion = functools.partial(
+            renderizar_pagina, params=parametros(**cambios),
+            columnas=columnas, filas=filas, formato="PNG"
+        )
+        salida = _SalidaZip()
+        with zipfile.ZipFile(salida, "w", zipfile.ZIP_STORED) as archivo:
+            numero = 0
+            async for png in self._en_paralelo(funcion, self._paginas(etiquetas, columnas, filas)):
+                numero += 1
+                self.paginas_generadas += 1
+                archivo.writestr(f"pagina_{numero:03d}.png", png)
+                yield salida.retirar()
+        self.etiquetas_generadas += len(etiquetas)
+        yield salida.retirar()
+
+    async def generar_zip_etiquetas(self, etiquetas: List[Dict[str, Any]], **cambios) -> AsyncIterator[bytes]:
+        """ZIP con un PNG por etiqueta, nombrado por código de producto o número de lote"""
+        self.solicitudes += 1
+        funcion = functools.partial(renderizar_etiquetas, params=parametros(**cambios))
+        grupos = [
+            [(e["datos"], e["lineas"]) for e in etiquetas[inicio:inicio + ETIQUETAS_POR_TAREA]]
+            for inicio in range(0, len(etiquetas), ETIQUETAS_POR_TAREA)
+        ]
+
+        salida = _SalidaZip()
+        usados: Dict[str, int] = {}
+        with zipfile.ZipFile(salida, "w", zipfile.ZIP_STORED) as archivo:
+            indice = 0
+            async for pngs in self._en_paralelo(funcion, grupos):
+                for png in pngs:
+                    nombre = etiquetas[indice]["nombre"].replace("/", "_")
+                    usados[nombre] = usados.get(nombre, 0) + 1
+                    if usados[nombre] > 1:
+                        nombre = f"{nombre}_{usados[nombre]}"
+                    archivo.writestr(f"{nombre}.png", png)
+                    indice += 1
+                yield salida.retirar()
+        self.etiquetas_generadas += len(etiquetas)
+        yield salida.retirar()
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado del pool de etiquetas"""
+        return {
+            "procesos": self.procesos,
+            "pool_activo": self._pool is not None,
+            "maximo_etiquetas": settings.etiquetas_max,
+            "solicitudes": self.solicitudes,
+            "etiquetas_generadas": self.etiquetas_generadas,
+            "paginas_generadas": self.paginas_generadas
+        }
+
+# Instancia global del servicio de etiquetas
+etiquetas_service = EtiquetasService()
@@ -0,0 +1,42 @@
+"""
+Utilidades de imágenes en memoria
+Las fotos subidas se decodifican directamente desde los bytes recibidos
+(sin escribirlas a disco para volver a leerlas) y guardarlas queda como un
+paso opcional que se hace después de responder.
+"""
+
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+def decodificar_imagen(datos: bytes, gris: bool = False) -> np.ndarray:
+    """
+    Bytes de un JPEG/PNG/... a un arreglo de OpenCV (BGR o escala de grises).
+    np.frombuffer no copia los bytes; solo cv2.imdecode reserva la imagen.
+    """
+    bandera = cv2.IMREAD_GRAYSCALE if gris else cv2.IMREAD_COLOR
+    imagen = cv2.imdecode(np.frombuffer(datos, dtype=np.uint8), bandera)
+    if imagen is None:
+        raise ValueError("No se pudo decodificar la imagen")
+    return imagen
+
+def a_escala_de_grises(imagen: np.ndarray) -> np.ndarray:
+    """Arreglo RGB o RGBA (convención de PIL) a escala de grises para pyzbar"""
+    if imagen.ndim == 2:
+        return imagen
+    if imagen.shape[2] == 4:
+        return cv2.cvtColor(imagen, cv2.COLOR_RGBA2GRAY)
+    return cv2.cvtColor(imagen, cv2.COLOR_RGB2GRAY)
+
+def guardar_bytes(ruta: Path, datos: bytes):
+    """Guardar el archivo original tal como llegó (sin volver a codificarlo)"""
+    with open(ruta, "wb") as archivo:
+        archivo.write(datos)
+
+def guardar_anotada(ruta: Path, resultado) -> bool:
+    """Dibujar las detecciones de un resultado de YOLO y guardar la imagen"""
+    anotada = resultado.plot()
+    if anotada is None:
+        return False
+    return bool(cv2.imwrite(str(ruta), anotada))
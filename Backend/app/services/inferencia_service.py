@@ -0,0 +1,184 @@
+"""
+Inferencia YOLO por lotes fuera del event loop
+Las imágenes que llegan dentro de una ventana corta se agrupan en una sola
+llamada model([...]), que en CPU y GPU rinde bastante más que una llamada por
+imagen. El modelo se ejecuta en un hilo dedicado (no es seguro usarlo desde
+varios hilos a la vez) y cada petición espera su propio future. Si la cola
+está llena se responde 503 en lugar de acumular latencia.
+"""
+
+import asyncio
+import statistics
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from ..core.config import settings
+from .modelos import modelos
+
+class InferenciaService:
+    """Cola de inferencia con micro-lotes y métricas por petición"""
+
+    def __init__(self, nombre_modelo: str = "yolo"):
+        # El modelo se obtiene del registro compartido (se carga en el primer lote)
+        self.nombre_modelo = nombre_modelo
+        self._cola: Optional[asyncio.Queue] = None
+        self._tarea: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # (espera en cola, tamaño del lote, inferencia) de las últimas peticiones
+        self._metricas = deque(maxlen=1000)
+        self.lotes = 0
+        self.imagenes = 0
+        self.rechazadas = 0
+        self.errores = 0
+
+    @property
+    def disponible(self) -> bool:
+        return modelos.disponible(self.nombre_modelo)
+
+    def _inferir_lote(self, imagenes: list, nombre_modelo: Optional[str] = None):
+        return modelos.obtener(nombre_modelo or self.nombre_modelo)(imagenes)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Hilo único donde se ejecuta toda inferencia (se crea al primer uso)"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="yolo")
+        return self._executor
+
+    def iniciar(self):
+        """Crear la cola y la tarea que arma los lotes (en el event loop actual)"""
+        if self._tarea is not None:
+            return
+        self._cola = asyncio.Queue(maxsize=settings.yolo_cola_max)
+        self._get_executor()
+        self._tarea = asyncio.create_task(self._trabajar())
+
+    async def detener(self):
+        """Detener la tarea y fallar las peticiones pendientes (al apagar la aplicación)"""
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            while not self._cola.empty():
+                _, futuro, _ = self._cola.get_nowait()
+                if not futuro.done():
+                    futuro.set_exception(HTTPException(status_code=503, detail="Servicio de inferencia detenido"))
+        # El hilo puede existir sin la cola si solo hubo llamadas síncronas
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._tarea = self._cola = self._executor = None
+
+    async def inferir(self, imagen: Any) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Encolar una imagen (ruta o arreglo) y esperar su resultado.
+        Devuelve (resultado de YOLO, métricas de la petición).
+        """
+        if self._tarea is None:
+            self.iniciar()
+
+        futuro = asyncio.get_running_loop().create_future()
+        try:
+            self._cola.put_nowait((imagen, futuro, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rechazadas += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Servidor ocupado procesando imágenes, intente de nuevo",
+                headers={"Retry-After": str(settings.yolo_retry_after)}
+            )
+        return await futuro
+
+    def inferir_sincrono(self, imagen: Any, nombre_modelo: Optional[str] = None) -> list:
+        """
+        Inferencia de una imagen para código síncrono (YoloService), fuera del
+        event loop: no pasa por la cola, pero se ejecuta en el mismo hilo que
+        los lotes para no usar el modelo desde dos hilos a la vez.
+        """
+        return self._get_executor().submit(self._inferir_lote, [imagen], nombre_modelo).result()
+
+    async def _armar_lote(self) -> List[tuple]:
+        """Primera petición en cola más las que lleguen dentro de la ventana"""
+        lote = [await self._cola.get()]
+        limite = time.perf_counter() + settings.yolo_ventana_ms / 1000
+        while len(lote) < settings.yolo_lote_max:
+            restante = limite - time.perf_counter()
+            if restante <= 0:
+                break
+            try:
+                lote.append(await asyncio.wait_for(self._cola.get(), restante))
+            except asyncio.TimeoutError:
+                break
+        return lote
+
+    async def _trabajar(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            lote = await self._armar_lote()
+            inicio = time.perf_counter()
+            try:
+                resultados = await loop.run_in_executor(
+                    self._executor, self._inferir_lote, [imagen for imagen, _, _ in lote]
+                )
+            except asyncio.CancelledError:
+                for _, futuro, _ in lote:
+                    if not futuro.done():
+                        futuro.set_exception(HTTPException(status_code=503, detail="Servicio de inferencia detenido"))
+                raise
+            except Exception as e:
+                self.errores += len(lote)
+                for _, futuro, _ in lote:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+                continue
+
+            inferencia = time.perf_counter() - inicio
+            self.lotes += 1
+            self.imagenes += len(lote)
+            for (_, futuro, encolado), resultado in zip(lote, resultados):
+                metricas = {
+                    "espera_cola_ms": round((inicio - encolado) * 1000, 1),
+                    "tamano_lote": len(lote),
+                    "inferencia_ms": round(inferencia * 1000, 1)
+                }
+                self._metricas.append(metricas)
+                # El cliente pudo haberse desconectado (future cancelado)
+                if not futuro.done():
+                    futuro.set_result((resultado, metricas))
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado de la cola y métricas de las últimas peticiones"""
+        metricas = list(self._metricas)
+
+        def percentiles(clave):
+            valores = sorted(m[clave] for m in metricas)
+            if not valores:
+                return None
+            return {
+                "p50": valores[len(valores) // 2],
+                "p95": valores[min(len(valores) - 1, int(len(valores) * 0.95))],
+                "max": valores[-1]
+            }
+
+        return {
+            "modelo": self.nombre_modelo,
+            "modelo_cargado": modelos.cargado(self.nombre_modelo),
+            "en_cola": self._cola.qsize() if self._cola is not None else 0,
+            "cola_max": settings.yolo_cola_max,
+            "lote_max": settings.yolo_lote_max,
+            "ventana_ms": settings.yolo_ventana_ms,
+            "lotes": self.lotes,
+            "imagenes": self.imagenes,
+            "rechazadas": self.rechazadas,
+            "errores": self.errores,
+            "tamano_lote_promedio": round(statistics.mean(m["tamano_lote"] for m in metricas), 2) if metricas else None,
+            "espera_cola_ms": percentiles("espera_cola_ms"),
+            "inferencia_ms": percentiles("inferencia_ms")
+        }
+
+# Instancia global del servicio de inferencia
+inferencia_service = InferenciaService()
@@ -0,0 +1,221 @@
+"""
+Registro compartido de modelos de detección
+Cada modelo se carga una sola vez por proceso, en el primer uso o en un
+precalentamiento en segundo plano al iniciar (MODELOS_PRECARGA), y se
+descarga si pasa MODELOS_INACTIVIDAD segundos sin usarse. El router QR, la
+cola de inferencia y YoloService obtienen el modelo desde aquí en lugar de
+cargar best.pt cada uno al importarse. El backend (PyTorch, ONNX Runtime u
+OpenVINO) se elige con YOLO_BACKEND, ver backends_yolo.py.
+"""
+
+import asyncio
+import gc
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from ..core.config import settings
+from ..database import ejecutar_en_hilo
+from . import backends_yolo
+
+# Importar YOLO con manejo de errores
+try:
+    from ultralytics import YOLO
+    YOLO_AVAILABLE = True
+except ImportError:
+    YOLO_AVAILABLE = False
+    print("Warning: YOLO not available. Install ultralytics to use object detection features.")
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent.parent
+
+class ModeloRegistrado:
+    """Un modelo conocido por el registro, cargado o no"""
+
+    def __init__(self, nombre: str, ruta: Path, cargador: Callable[[str], Any], backend: str):
+        self.nombre = nombre
+        self.ruta = ruta
+        self.cargador = cargador
+        self.backend = backend
+        self.modelo = None
+        self.cargado_en: Optional[str] = None
+        self.segundos_carga: Optional[float] = None
+        self.ultimo_uso = 0.0
+        self.usos = 0
+        self.cargas = 0
+        self.error: Optional[str] = None
+        # Una carga a la vez por modelo; las demás peticiones esperan esa misma carga
+        self.lock = threading.Lock()
+
+class RegistroModelos:
+    """Modelos compartidos con carga perezosa y descarga por inactividad"""
+
+    def __init__(self):
+        self._modelos: Dict[str, ModeloRegistrado] = {}
+        self._tarea: Optional[asyncio.Task] = None
+
+    def registrar(self, nombre: str, ruta: Path, cargador: Optional[Callable[[str], Any]] = None,
+                  backend: str = "pytorch"):
+        """Declarar un modelo (no se carga hasta que se use)"""
+        if nombre not in self._modelos:
+            self._modelos[nombre] = ModeloRegistrado(nombre, Path(ruta), cargador or self._cargar_yolo, backend)
+
+    @staticmethod
+    def _cargar_yolo(ruta: str):
+        if not YOLO_AVAILABLE:
+            raise RuntimeError("YOLO no está instalado. Instala 'ultralytics' para usar esta función.")
+        # Los modelos exportados (ONNX, OpenVINO) no guardan la tarea como best.pt
+        return YOLO(ruta) if ruta.endswith(".pt") else YOLO(ruta, task="detect")
+
+    def _entrada(self, nombre: str) -> ModeloRegistrado:
+        if nombre not in self._modelos:
+            raise KeyError(f"Modelo no registrado: {nombre}")
+        return self._modelos[nombre]
+
+    def disponible(self, nombre: str) -> bool:
+        """True si el modelo se puede cargar (sin cargarlo)"""
+        entrada = self._modelos.get(nombre)
+        return entrada is not None and YOLO_AVAILABLE and entrada.ruta.exists()
+
+    def cargado(self, nombre: str) -> bool:
+        entrada = self._modelos.get(nombre)
+        return entrada is not None and entrada.modelo is not None
+
+    def obtener(self, nombre: str):
+        """
+        Modelo listo para usar, cargándolo si hace falta. Bloquea durante la
+        carga (segundos): desde código async llamarlo con ejecutar_en_hilo.
+        """
+        entrada = self._entrada(nombre)
+        entrada.ultimo_uso = time.monotonic()
+        entrada.usos += 1
+        if entrada.modelo is not None:
+            return entrada.modelo
+
+        with entrada.lock:
+            if entrada.modelo is None:
+                if not entrada.ruta.exists():
+                    entrada.error = f"Archivo del modelo no encontrado: {entrada.ruta}"
+                    raise RuntimeError(entrada.error)
+                inicio = time.perf_counter()
+                try:
+                    entrada.modelo = entrada.cargador(str(entrada.ruta))
+                except Exception as e:
+                    entrada.error = str(e)
+                    raise
+                entrada.segundos_carga = round(time.perf_counter() - inicio, 2)
+                entrada.cargado_en = datetime.now().isoformat()
+                entrada.cargas += 1
+                entrada.error = None
+                print(f"✅ Modelo {nombre} cargado desde {entrada.ruta} en {entrada.segundos_carga} s")
+        return entrada.modelo
+
+    def precalentar(self, nombre: str):
+        """Cargar el modelo y hacer una inferencia de prueba para inicializarlo"""
+        modelo = self.obtener(nombre)
+        try:
+            import numpy as np
+            modelo(np.zeros((64, 64, 3), dtype=np.uint8), verbose=False)
+        except Exception as e:
+            print(f"Warning: precalentamiento de {nombre} incompleto: {e}")
+
+    def descargar(self, nombre: str) -> bool:
+        """Liberar el modelo de memoria; se vuelve a cargar en el próximo uso"""
+        entrada = self._entrada(nombre)
+        with entrada.lock:
+            if entrada.modelo is None:
+                return False
+            entrada.modelo = None
+            entrada.cargado_en = None
+        gc.collect()
+        # Devolver al driver la memoria de GPU que torch tenga reservada
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        print(f"Modelo {nombre} descargado por inactividad")
+        return True
+
+    def descargar_inactivos(self) -> List[str]:
+        """Descargar los modelos sin uso durante MODELOS_INACTIVIDAD segundos"""
+        if settings.modelos_inactividad <= 0:
+            return []
+        limite = time.monotonic() - settings.modelos_inactividad
+        return [
+            nombre for nombre, entrada in self._modelos.items()
+            if entrada.modelo is not None and entrada.ultimo_uso < limite and self.descargar(nombre)
+        ]
+
+    # Ciclo de vida
+
+    async def _vigilar(self):
+        for nombre in [n.strip() for n in settings.modelos_precarga.split(",") if n.strip()]:
+            if self.disponible(nombre):
+                try:
+                    await ejecutar_en_hilo(self.precalentar, nombre)
+                except Exception as e:
+                    print(f"❌ Error al precargar el modelo {nombre}: {e}")
+
+        if settings.modelos_inactividad <= 0:
+            return
+        intervalo = min(60.0, settings.modelos_inactividad / 2)
+        while True:
+            await asyncio.sleep(intervalo)
+            try:
+                await ejecutar_en_hilo(self.descargar_inactivos)
+            except Exception as e:
+                print(f"❌ Error al descargar modelos inactivos: {e}")
+
+    def iniciar(self):
+        """Precarga en segundo plano y revisión periódica de inactividad"""
+        if self._tarea is None:
+            self._tarea = asyncio.create_task(self._vigilar())
+
+    async def detener(self):
+        if self._tarea is None:
+            return
+        self._tarea.cancel()
+        try:
+            await self._tarea
+        except asyncio.CancelledError:
+            pass
+        self._tarea = None
+
+    def info(self, nombre: str) -> Dict[str, Any]:
+        """Estado de un modelo"""
+        entrada = self._entrada(nombre)
+        modelo = entrada.modelo
+        if entrada.ruta.is_dir():
+            tamano = sum(archivo.stat().st_size for archivo in entrada.ruta.iterdir() if archivo.is_file())
+        else:
+            tamano = entrada.ruta.stat().st_size if entrada.ruta.exists() else None
+        return {
+            "model_path": str(entrada.ruta),
+            "model_size": tamano,
+            "backend": entrada.backend,
+            "disponible": self.disponible(nombre),
+            "cargado": modelo is not None,
+            "loaded_at": entrada.cargado_en,
+            "segundos_carga": entrada.segundos_carga,
+            "cargas": entrada.cargas,
+            "usos": entrada.usos,
+            "inactivo_segundos": round(time.monotonic() - entrada.ultimo_uso, 1) if entrada.ultimo_uso else None,
+            "classes": getattr(modelo, 'names', {}) if modelo is not None else {},
+            "error": entrada.error,
+            "model_type": "YOLO"
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "yolo_available": YOLO_AVAILABLE,
+            "inactividad_segundos": settings.modelos_inactividad,
+            "backends": backends_yolo.stats(BACKEND_DIR / "best.pt"),
+            "modelos": {nombre: self.info(nombre) for nombre in self._modelos}
+        }
+
+# Instancia global del registro, con el modelo de detección del proyecto
+# en el backend configurado (YOLO_BACKEND / YOLO_INT8)
+modelos = RegistroModelos()
+_backend, _ruta = backends_yolo.resolver(BACKEND_DIR / "best.pt")
+modelos.registrar("yolo", _ruta, backend=_backend)
@@ -3,19 +3,23 @@ Servicio OAuth2 completo según la documentación del proyecto
 Implementa las clases: Servicio_de_autenticacion, Token_de_refresco, OauthClient, Codigo_de_autenticacion
 """
 
+import asyncio
 import jwt
 import secrets
 import string
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 from fastapi import HTTPException
 import json
 import os
 from dotenv import load_dotenv
 
-from ..database import execute_query
-from ..auth.security import verify_password
+from ..core.cache import CacheTTL
+from ..core.config import settings
+from ..database import execute_query, execute_query_async, ejecutar_en_hilo
+from ..auth.security import verificar_credenciales
+from .token_store import TokenStore, crear_token_store, digest_token, REFRESH, CODIGO
 
 load_dotenv()
 
@@ -99,11 +103,23 @@ class CodigoDeAutenticacion:
 class ServicioDeAutenticacion:
     """Clase Servicio_de_autenticacion según documentación (Clase --9)"""
     
-    def __init__(self):
-        self.refresh_tokens: Dict[str, TokenDeRefresco] = {}
-        self.authorization_codes: Dict[str, CodigoDeAutenticacion] = {}
+    def __init__(self, store: Optional[TokenStore] = None):
+        # Refresh tokens y códigos de autorización compartidos entre workers
+        self.store: TokenStore = store or crear_token_store()
         self.oauth_clients: Dict[str, OauthClient] = {}
         
+        # Introspección y userinfo por digest del token; la vida de cada
+        # entrada nunca supera el `exp` del token
+        self.cache_introspeccion = CacheTTL(settings.oauth_introspect_cache_max, settings.oauth_introspect_cache_ttl)
+        self.cache_userinfo = CacheTTL(settings.oauth_introspect_cache_max, settings.oauth_introspect_cache_ttl)
+        
+        # Barrido periódico de tokens expirados
+        self._barrido: Optional[asyncio.Task] = None
+        self.ultimo_barrido: Optional[datetime] = None
+        self.ultimos_eliminados = 0
+        self.total_eliminados = 0
+        self.ultimo_retraso = 0.0
+        
         # Inicializar con cliente por defecto
         self._init_default_client()
     
@@ -186,7 +202,9 @@ class ServicioDeAutenticacion:
             redirect_url=redirect_uri
         )
         
-        self.authorization_codes[code] = auth_code
+        datos = asdict(auth_code)
+        del datos["code"]
+        self.store.guardar(CODIGO, code, datos, auth_code.expires_at)
         return code
     
     def token(
@@ -219,20 +237,19 @@ class ServicioDeAutenticacion:
             else:
                 raise HTTPException(status_code=400, detail="Tipo de grant no soportado")
                 
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error en token: {str(e)}")
     
     def _handle_authorization_code_grant(self, code: str, code_verifier: str, client_id: str) -> Dict[str, Any]:
         """Manejar grant type authorization_code"""
-        if not code or code not in self.authorization_codes:
-            raise HTTPException(status_code=400, detail="Código de autorización inválido")
+        # El código es de un solo uso: se consume atómicamente antes de validarlo
+        datos = self.store.consumir(CODIGO, code) if code else None
+        if not datos:
+            raise HTTPException(status_code=400, detail="Código de autorización inválido o expirado")
         
-        auth_code = self.authorization_codes[code]
-        
-        # Verificar expiración
-        if auth_code.is_expired():
-            del self.authorization_codes[code]
-            raise HTTPException(status_code=400, detail="Código de autorización expirado")
+        auth_code = CodigoDeAutenticacion(code=code, **datos)
         
         # Verificar cliente
         if auth_code.client_id != client_id:
@@ -247,9 +264,6 @@ class ServicioDeAutenticacion:
         access_token = self._create_access_token(auth_code.userName)
         refresh_token = self._create_refresh_token(auth_code.userName, client_id)
         
-        # Limpiar código usado
-        del self.authorization_codes[code]
-        
         return {
             "access_token": access_token,
             "token_type": "Bearer",
@@ -260,15 +274,11 @@ class ServicioDeAutenticacion:
     
     def _handle_refresh_token_grant(self, refresh_token: str, client_id: str) -> Dict[str, Any]:
         """Manejar grant type refresh_token"""
-        if not refresh_token or refresh_token not in self.refresh_tokens:
-            raise HTTPException(status_code=400, detail="Refresh token inválido")
+        datos = self.store.obtener(REFRESH, refresh_token) if refresh_token else None
+        if not datos:
+            raise HTTPException(status_code=400, detail="Refresh token inválido o expirado")
         
-        token_obj = self.refresh_tokens[refresh_token]
-        
-        # Verificar expiración
-        if token_obj.is_expired():
-            del self.refresh_tokens[refresh_token]
-            raise HTTPException(status_code=400, detail="Refresh token expirado")
+        token_obj = TokenDeRefresco.from_dict({**datos, "token": refresh_token})
         
         # Verificar cliente
         if token_obj.client_id != client_id:
@@ -307,7 +317,10 @@ class ServicioDeAutenticacion:
             expires_at=expires_at.timestamp()
         )
         
-        self.refresh_tokens[token] = refresh_token
+        # El valor del token no se almacena: solo su hash es la clave
+        datos = refresh_token.to_dict()
+        del datos["token"]
+        self.store.guardar(REFRESH, token, datos, refresh_token.expires_at)
         return token
     
     def introspect(self, token: str) -> Dict[str, Any]:
@@ -316,6 +329,10 @@ class ServicioDeAutenticacion:
         Método introspect() de la clase Servicio_de_autenticacion
         """
         try:
+            en_cache = self.cache_introspeccion.get(digest_token(token))
+            if en_cache is not None:
+                return en_cache
+            
             # Decodificar token JWT (implementa decodeToken de Token_de_servicio)
             payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
             
@@ -329,7 +346,7 @@ class ServicioDeAutenticacion:
             if not user or not user['activo']:
                 return {"active": False}
             
-            return {
+            resultado = {
                 "active": True,
                 "sub": payload["sub"],
                 "exp": payload["exp"],
@@ -342,6 +359,11 @@ class ServicioDeAutenticacion:
                     "rol": user["rol"]
                 }
             }
+            # Solo se cachean tokens activos, hasta su expiración como máximo
+            self.cache_introspeccion.set(
+                digest_token(token), resultado, ttl=payload["exp"] - datetime.now().timestamp()
+            )
+            return resultado
             
         except jwt.ExpiredSignatureError:
             return {"active": False, "error": "Token expired"}
@@ -356,13 +378,15 @@ class ServicioDeAutenticacion:
         Método revoke() de la clase Servicio_de_autenticacion
         """
         try:
-            if token_type_hint == "refresh_token" or token in self.refresh_tokens:
-                # Revocar refresh token
-                if token in self.refresh_tokens:
-                    del self.refresh_tokens[token]
-                    return {"revoked": True, "token_type": "refresh_token"}
-                else:
-                    return {"revoked": False, "error": "Refresh token not found"}
+            # Descartar de inmediato los resultados cacheados del token
+            self.invalidar_cache_token(token)
+            
+            # Revocar refresh token (también sin hint si el token existe)
+            if self.store.eliminar(REFRESH, token):
+                return {"revoked": True, "token_type": "refresh_token"}
+            
+            if token_type_hint == "refresh_token":
+                return {"revoked": False, "error": "Refresh token not found"}
             
             else:
                 # Para access tokens JWT, no podemos revocarlos directamente
@@ -382,6 +406,10 @@ class ServicioDeAutenticacion:
         Método userinfo() de la clase Servicio_de_autenticacion
         """
         try:
+            en_cache = self.cache_userinfo.get(digest_token(token))
+            if en_cache is not None:
+                return en_cache
+            
             # Validar token primero
             introspection = self.introspect(token)
             
@@ -400,7 +428,7 @@ class ServicioDeAutenticacion:
             if not user_details:
                 raise HTTPException(status_code=404, detail="Usuario no encontrado")
             
-            return {
+            claims = {
                 "sub": user_details["documento"],
                 "name": user_details["nombre"],
                 "email": user_details.get("email"),
@@ -409,16 +437,40 @@ class ServicioDeAutenticacion:
                 "created_at": user_details["fecha_creacion"].isoformat() if user_details["fecha_creacion"] else None,
                 "user_id": user_info["id"]
             }
+            self.cache_userinfo.set(
+                digest_token(token), claims, ttl=introspection["exp"] - datetime.now().timestamp()
+            )
+            return claims
             
         except HTTPException:
             raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error en userinfo: {str(e)}")
     
-    def authenticate_user(self, documento: str, password: str) -> Optional[Dict[str, Any]]:
+    def invalidar_cache_token(self, token: str):
+        """Eliminar la introspección y el userinfo cacheados de un token"""
+        clave = digest_token(token)
+        self.cache_introspeccion.invalidar(clave)
+        self.cache_userinfo.invalidar(clave)
+    
+    async def introspect_async(self, token: str) -> Dict[str, Any]:
+        """introspect() respondiendo desde la caché sin salir del event loop"""
+        en_cache = self.cache_introspeccion.get(digest_token(token))
+        if en_cache is not None:
+            return en_cache
+        return await ejecutar_en_hilo(self.introspect, token)
+    
+    async def userinfo_async(self, token: str) -> Dict[str, Any]:
+        """userinfo() respondiendo desde la caché sin salir del event loop"""
+        en_cache = self.cache_userinfo.get(digest_token(token))
+        if en_cache is not None:
+            return en_cache
+        return await ejecutar_en_hilo(self.userinfo, token)
+    
+    async def authenticate_user(self, documento: str, password: str) -> Optional[Dict[str, Any]]:
         """Autenticar usuario para el flujo OAuth"""
         try:
-            user = execute_query(
+            user = await execute_query_async(
                 "SELECT id, documento, nombre, email, rol, password_hash, activo FROM usuarios WHERE documento = %s",
                 (documento,),
                 fetch_one=True
@@ -427,7 +479,7 @@ class ServicioDeAutenticacion:
             if not user or not user['activo']:
                 return None
             
-            if not verify_password(password, user['password_hash']):
+            if not await verificar_credenciales(user['id'], password, user['password_hash']):
                 return None
             
             return {
@@ -438,28 +490,61 @@ class ServicioDeAutenticacion:
                 "rol": user['rol']
             }
             
+        except HTTPException:
+            raise
         except Exception:
             return None
     
-    def cleanup_expired_tokens(self):
-        """Limpiar tokens y códigos expirados"""
-        current_time = datetime.now().timestamp()
-        
-        # Limpiar refresh tokens expirados
-        expired_refresh = [
-            token for token, obj in self.refresh_tokens.items()
-            if obj.expires_at < current_time
-        ]
-        for token in expired_refresh:
-            del self.refresh_tokens[token]
+    def cleanup_expired_tokens(self) -> int:
+        """
+        Limpiar tokens y códigos expirados; devuelve cuántos se eliminaron.
+        Solo se recorren los expirados, en orden de expiración (O(k log n)).
+        """
+        # Retraso: cuánto lleva vencido el token más antiguo al momento del barrido
+        proxima = self.store.proxima_expiracion()
+        ahora = datetime.now().timestamp()
+        self.ultimo_retraso = max(0.0, ahora - proxima) if proxima is not None else 0.0
         
-        # Limpiar códigos de autorización expirados
-        expired_codes = [
-            code for code, obj in self.authorization_codes.items()
-            if obj.expires_at < current_time
-        ]
-        for code in expired_codes:
-            del self.authorization_codes[code]
+        eliminados = self.store.limpiar_expirados()
+        self.ultimo_barrido = datetime.now()
+        self.ultimos_eliminados = eliminados
+        self.total_eliminados += eliminados
+        return eliminados
+    
+    def get_barrido_status(self) -> Dict[str, Any]:
+        """Estado del barrido de tokens expirados"""
+        return {
+            "intervalo_segundos": settings.oauth_barrido_intervalo,
+            "activo": self._barrido is not None and not self._barrido.done(),
+            "ultimo_barrido": self.ultimo_barrido,
+            "ultimos_eliminados": self.ultimos_eliminados,
+            "total_eliminados": self.total_eliminados,
+            "retraso_segundos": round(self.ultimo_retraso, 3)
+        }
+    
+    async def _ciclo_barrido(self, intervalo: float):
+        while True:
+            await asyncio.sleep(intervalo)
+            try:
+                await ejecutar_en_hilo(self.cleanup_expired_tokens)
+            except Exception as e:
+                print(f"Error en el barrido de tokens OAuth: {e}")
+    
+    def iniciar_barrido(self):
+        """Programar el barrido periódico en el event loop actual"""
+        intervalo = settings.oauth_barrido_intervalo
+        if intervalo > 0 and self._barrido is None:
+            self._barrido = asyncio.create_task(self._ciclo_barrido(intervalo))
+    
+    async def detener_barrido(self):
+        """Cancelar el barrido periódico"""
+        if self._barrido is not None:
+            self._barrido.cancel()
+            try:
+                await self._barrido
+            except asyncio.CancelledError:
+                pass
+            self._barrido = None
 
 # Instancia global del servicio OAuth
 oauth_service = ServicioDeAutenticacion()
@@ -0,0 +1,94 @@
+"""
+Contenido compacto y firmado para los códigos QR
+Formato: Q:<tipo><id en base32>.<firma>, por ejemplo "Q:PAE.K3J7QW2M".
+Solo usa mayúsculas, dígitos, ':' y '.', que qrcode codifica en modo
+alfanumérico: un producto, lote o movimiento cabe en un QR versión 1
+(21x21 módulos), legible a tamaño pequeño y rápido de leer con la cámara.
+La firma es un HMAC-SHA256 truncado a 40 bits, de modo que no se pueden
+fabricar etiquetas válidas sin la clave QR_FIRMA_CLAVE.
+"""
+
+import hashlib
+import hmac
+import re
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from ..core.config import settings
+
+PREFIJO = "Q:"
+ALFABETO = "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"
+LARGO_FIRMA = 8  # caracteres base32 = 40 bits
+
+TIPOS = {"producto": "P", "lote": "L", "movimiento": "M"}
+RECURSOS = {letra: recurso for recurso, letra in TIPOS.items()}
+
+PATRON = re.compile(r"^Q:([PLM])([A-Z2-7]{1,13})\.([A-Z2-7]{%d})$" % LARGO_FIRMA)
+
+# Clave derivada: no se usa la clave configurada directamente para firmar
+_clave = hmac.new(settings.qr_firma_clave.encode("utf-8"), b"qr-payload", hashlib.sha256).digest()
+
+_lock = threading.Lock()
+_validos = 0
+_rechazados = 0
+
+def _a_base32(numero: int) -> str:
+    digitos = []
+    while True:
+        numero, resto = divmod(numero, 32)
+        digitos.append(ALFABETO[resto])
+        if numero == 0:
+            return "".join(reversed(digitos))
+
+def _de_base32(texto: str) -> int:
+    numero = 0
+    for caracter in texto:
+        numero = numero * 32 + ALFABETO.index(caracter)
+    return numero
+
+def _firma(cuerpo: str) -> str:
+    digest = hmac.new(_clave, cuerpo.encode("ascii"), hashlib.sha256).digest()
+    # Los primeros 40 bits del HMAC como 8 caracteres base32
+    return _a_base32(int.from_bytes(digest[:5], "big")).rjust(LARGO_FIRMA, ALFABETO[0])
+
+def codificar(recurso: str, recurso_id: int) -> str:
+    """Contenido compacto firmado para un producto, lote o movimiento"""
+    if recurso not in TIPOS:
+        raise ValueError(f"Tipo de recurso no soportado en QR: {recurso}")
+    if recurso_id < 0:
+        raise ValueError("El ID del recurso no puede ser negativo")
+
+    cuerpo = f"{PREFIJO}{TIPOS[recurso]}{_a_base32(recurso_id)}"
+    return f"{cuerpo}.{_firma(cuerpo)}"
+
+def es_compacto(texto: str) -> bool:
+    """True si el texto tiene el formato compacto (sin verificar la firma)"""
+    return texto.startswith(PREFIJO)
+
+def decodificar(texto: str) -> Optional[Tuple[str, int]]:
+    """
+    (recurso, id) si el texto es un contenido compacto con firma válida.
+    None si tiene otro formato o si la firma no coincide (etiqueta alterada).
+    """
+    global _validos, _rechazados
+    match = PATRON.match(texto.strip())
+    if not match:
+        if es_compacto(texto.strip()):
+            with _lock:
+                _rechazados += 1
+        return None
+
+    letra, id_base32, firma = match.groups()
+    if not hmac.compare_digest(firma, _firma(f"{PREFIJO}{letra}{id_base32}")):
+        with _lock:
+            _rechazados += 1
+        return None
+
+    with _lock:
+        _validos += 1
+    return RECURSOS[letra], _de_base32(id_base32)
+
+def stats() -> Dict[str, Any]:
+    """Contenidos compactos verificados y rechazados"""
+    with _lock:
+        return {"validos": _validos, "rechazados": _rechazados}
@@ -0,0 +1,281 @@
+"""
+Renderizado de códigos QR con caché por contenido
+La imagen PNG depende solo del texto y de los parámetros de renderizado, así
+que se identifica con el SHA-256 de ambos: la misma clave sirve como ETag y
+como nombre de archivo en la caché en disco.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import zlib
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import qrcode
+from PIL import Image, ImageDraw, ImageFont
+
+from ..core.cache import CacheTTL
+from ..core.config import settings
+
+NIVELES_CORRECCION = {
+    "L": qrcode.constants.ERROR_CORRECT_L,
+    "M": qrcode.constants.ERROR_CORRECT_M,
+    "Q": qrcode.constants.ERROR_CORRECT_Q,
+    "H": qrcode.constants.ERROR_CORRECT_H,
+}
+
+# Parámetros por defecto (los mismos que usaba QRService)
+PARAMETROS_QR: Dict[str, Any] = {
+    "version": 1,
+    "error_correction": "L",
+    "box_size": 10,
+    "border": 4,
+}
+
+def renderizar_png(datos: str, version: int = 1, error_correction: str = "L",
+                   box_size: int = 10, border: int = 4) -> bytes:
+    """Generar el PNG de un QR. Función pura: puede ejecutarse en otro proceso"""
+    qr = qrcode.QRCode(
+        version=version,
+        error_correction=NIVELES_CORRECCION[error_correction],
+        box_size=box_size,
+        border=border
+    )
+    qr.add_data(datos)
+    qr.make(fit=True)
+
+    img = qr.make_image(fill_color="black", back_color="white")
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+# Hoja A4 a 150 ppp para las etiquetas impresas
+PAGINA_ANCHO = 1240
+PAGINA_ALTO = 1754
+PAGINA_MARGEN = 40
+TAMANO_FUENTE = 18
+ALTO_LINEA = 22
+# Fuentes TrueType habituales (Linux, Windows); si no hay ninguna se usa la de Pillow
+FUENTES = ("DejaVuSans.ttf", "arial.ttf", "LiberationSans-Regular.ttf")
+
+# Máscara fija para las etiquetas en lote: cualquier máscara es legible y
+# evita evaluar las 8 posibles, que es la mayor parte del costo de qrcode
+MASCARA_ETIQUETAS = 0
+
+def _imagen_qr(datos: str, params: Dict[str, Any]) -> Image.Image:
+    qr = qrcode.QRCode(
+        version=params["version"],
+        error_correction=NIVELES_CORRECCION[params["error_correction"]],
+        box_size=params["box_size"],
+        border=params["border"],
+        mask_pattern=MASCARA_ETIQUETAS
+    )
+    qr.add_data(datos)
+    qr.make(fit=True)
+
+    # Imagen directa desde la matriz (incluye el borde): evita dibujar módulo a módulo
+    matriz = qr.get_matrix()
+    lado = len(matriz)
+    pixeles = bytes(0 if modulo else 255 for fila in matriz for modulo in fila)
+    imagen = Image.frombytes("L", (lado, lado), pixeles)
+    if params["box_size"] > 1:
+        imagen = imagen.resize((lado * params["box_size"],) * 2, Image.NEAREST)
+    return imagen
+
+_fuente = None
+
+def _get_fuente():
+    """Fuente de las etiquetas, cargada una vez por proceso"""
+    global _fuente
+    if _fuente is None:
+        for nombre in FUENTES:
+            try:
+                _fuente = ImageFont.truetype(nombre, TAMANO_FUENTE)
+                break
+            except OSError:
+                continue
+        else:
+            _fuente = ImageFont.load_default(size=TAMANO_FUENTE)
+    return _fuente
+
+def _recortar_texto(dibujo: ImageDraw.ImageDraw, texto: str, fuente, ancho: int) -> str:
+    if dibujo.textlength(texto, font=fuente) <= ancho:
+        return texto
+    while texto and dibujo.textlength(texto + "...", font=fuente) > ancho:
+        texto = texto[:-1]
+    return texto + "..."
+
+def _dibujar_etiqueta(hoja: Image.Image, x: int, y: int, ancho: int, alto: int,
+                      qr: Image.Image, lineas: List[str]):
+    """QR centrado en la celda (x, y, ancho, alto) con sus líneas de texto debajo"""
+    dibujo = ImageDraw.Draw(hoja)
+    fuente = _get_fuente()
+    alto_texto = ALTO_LINEA * len(lineas)
+
+    lado = max(1, min(ancho, alto - alto_texto))
+    if qr.size[0] != lado:
+        # NEAREST mantiene los módulos nítidos al escalar
+        qr = qr.resize((lado, lado), Image.NEAREST)
+    hoja.paste(qr, (x + (ancho - lado) // 2, y))
+
+    texto_y = y + lado
+    for linea in lineas:
+        linea = _recortar_texto(dibujo, linea, fuente, ancho)
+        texto_x = x + (ancho - int(dibujo.textlength(linea, font=fuente))) // 2
+        dibujo.text((texto_x, texto_y), linea, fill=0, font=fuente)
+        texto_y += ALTO_LINEA
+
+def renderizar_etiquetas(etiquetas: List[Tuple[str, List[str]]], params: Dict[str, Any]) -> List[bytes]:
+    """
+    PNG de varias etiquetas (QR con su texto). Trabaja por grupos para que
+    cada envío al pool de procesos amortice el costo de serialización.
+    """
+    resultado = []
+    for datos, lineas in etiquetas:
+        qr = _imagen_qr(datos, params)
+        lado = qr.size[0]
+        hoja = Image.new("L", (lado, lado + ALTO_LINEA * len(lineas)), 255)
+        _dibujar_etiqueta(hoja, 0, 0, lado, hoja.size[1], qr, lineas)
+        buffer = BytesIO()
+        hoja.save(buffer, format="PNG")
+        resultado.append(buffer.getvalue())
+    return resultado
+
+def renderizar_pagina(etiquetas: List[Tuple[str, List[str]]], params: Dict[str, Any],
+                      columnas: int, filas: int, formato: str = "PNG") -> bytes:
+    """
+    Hoja A4 con hasta columnas x filas etiquetas.
+    formato "PNG" devuelve la imagen; "PDF" los píxeles en escala de grises
+    comprimidos con zlib, listos para un stream /FlateDecode de PDF.
+    """
+    hoja = Image.new("L", (PAGINA_ANCHO, PAGINA_ALTO), 255)
+    ancho = (PAGINA_ANCHO - 2 * PAGINA_MARGEN) // columnas
+    alto = (PAGINA_ALTO - 2 * PAGINA_MARGEN) // filas
+    separacion = 8
+    # Un píxel por módulo: el QR se escala a la celda con NEAREST de todos modos
+    params = dict(params, box_size=1)
+
+    for indice, (datos, lineas) in enumerate(etiquetas[:columnas * filas]):
+        fila, columna = divmod(indice, columnas)
+        _dibujar_etiqueta(
+            hoja,
+            PAGINA_MARGEN + columna * ancho + separacion // 2,
+            PAGINA_MARGEN + fila * alto + separacion // 2,
+            ancho - separacion, alto - separacion,
+            _imagen_qr(datos, params), lineas
+        )
+
+    if formato == "PDF":
+        return zlib.compress(hoja.tobytes(), 6)
+    buffer = BytesIO()
+    hoja.save(buffer, format="PNG", optimize=False)
+    return buffer.getvalue()
+
+def parametros(**cambios) -> Dict[str, Any]:
+    """Parámetros de renderizado completos a partir de los cambios indicados"""
+    resultado = dict(PARAMETROS_QR)
+    resultado.update({clave: valor for clave, valor in cambios.items() if valor is not None})
+    return resultado
+
+def clave_qr(datos: str, params: Dict[str, Any]) -> str:
+    """Clave de contenido: SHA-256 del texto y los parámetros de renderizado"""
+    material = json.dumps([datos, params], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+class CacheQR:
+    """Caché LRU en memoria con un nivel opcional en disco"""
+
+    def __init__(self, max_entradas: int, directorio: Optional[str] = None):
+        self.memoria = CacheTTL(max_entradas, settings.qr_cache_ttl)
+        self.directorio = Path(directorio) if directorio else None
+        if self.directorio:
+            self.directorio.mkdir(parents=True, exist_ok=True)
+        self.renderizados = 0
+        self.aciertos_disco = 0
+
+    def _ruta(self, clave: str) -> Path:
+        return self.directorio / f"{clave}.png"
+
+    def get(self, clave: str) -> Optional[bytes]:
+        png = self.memoria.get(clave)
+        if png is not None or self.directorio is None:
+            return png
+
+        try:
+            png = self._ruta(clave).read_bytes()
+        except OSError:
+            return None
+        self.aciertos_disco += 1
+        self.memoria.set(clave, png)
+        return png
+
+    def set(self, clave: str, png: bytes):
+        self.memoria.set(clave, png)
+        if self.directorio is None:
+            return
+
+        # Escritura atómica: otro proceso nunca lee un archivo a medias
+        try:
+            fd, temporal = tempfile.mkstemp(dir=self.directorio, suffix=".tmp")
+            with os.fdopen(fd, "wb") as archivo:
+                archivo.write(png)
+            os.replace(temporal, self._ruta(clave))
+        except OSError as e:
+            print(f"No se pudo guardar el QR en la caché en disco: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        estadisticas = self.memoria.stats()
+        estadisticas.update({
+            "renderizados": self.renderizados,
+            "aciertos_disco": self.aciertos_disco,
+            "directorio": str(self.directorio) if self.directorio else None
+        })
+        return estadisticas
+
+cache_qr = CacheQR(settings.qr_cache_max, settings.qr_cache_dir or None)
+
+def obtener_png(datos: str, **cambios) -> Tuple[bytes, str]:
+    """PNG del QR (desde la caché si ya se generó) y su clave de contenido"""
+    params = parametros(**cambios)
+    clave = clave_qr(datos, params)
+    png = cache_qr.get(clave)
+    if png is None:
+        png = renderizar_png(datos, **params)
+        cache_qr.renderizados += 1
+        cache_qr.set(clave, png)
+    return png, clave
+
+def obtener_base64(datos: str, **cambios) -> str:
+    """QR en base64, para incrustar en JSON o HTML"""
+    png, _ = obtener_png(datos, **cambios)
+    return base64.b64encode(png).decode("utf-8")
+
+_ip_local: Optional[str] = None
+_ip_local_expira = 0.0
+_ip_lock = threading.Lock()
+
+def get_local_ip() -> str:
+    """IP local, recalculada a lo sumo cada QR_IP_TTL segundos"""
+    global _ip_local, _ip_local_expira
+    with _ip_lock:
+        if _ip_local is not None and time.monotonic() < _ip_local_expira:
+            return _ip_local
+
+        try:
+            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            s.connect(("8.8.8.8", 80))
+            ip = s.getsockname()[0]
+            s.close()
+        except Exception:
+            ip = "127.0.0.1"
+
+        _ip_local = ip
+        _ip_local_expira = time.monotonic() + settings.qr_ip_ttl
+        return ip
@@ -3,21 +3,41 @@ Servicio QR dedicado según la documentación del proyecto
 Implementa la clase QRService (Clase --4)
 """
 
-import qrcode
 import cv2
 import numpy as np
-from io import BytesIO
-import base64
-import socket
 import json
 from datetime import datetime
 from typing import Optional, Dict, Any, Union
 from pathlib import Path
 from pyzbar import pyzbar
-from PIL import Image
+import re
+from urllib.parse import urlsplit
 import requests
+from requests.adapters import HTTPAdapter
 
+from ..core.config import settings
 from ..database import execute_query
+from .catalogo_service import catalogo_service
+from .qr_render import PARAMETROS_QR, obtener_base64, get_local_ip
+from .imagenes import decodificar_imagen, a_escala_de_grises
+from . import qr_payload
+
+# Rutas de la propia API que pueden aparecer en un QR: se resuelven con la
+# capa de datos en lugar de hacer una petición HTTP al mismo servidor
+RUTAS_INTERNAS = [
+    (re.compile(r'/api/productos/(\d+)$'), 'producto'),
+    (re.compile(r'/api/lotes/(\d+)$'), 'lote'),
+    (re.compile(r'/api/movimientos/(\d+)$'), 'movimiento'),
+]
+
+def ruta_interna(url: str) -> Optional[tuple]:
+    """(recurso, id) si la URL apunta a una ruta de esta API, si no None"""
+    ruta = urlsplit(url).path.rstrip('/')
+    for patron, recurso in RUTAS_INTERNAS:
+        match = patron.search(ruta)
+        if match:
+            return recurso, int(match.group(1))
+    return None
 
 class QRService:
     """
@@ -26,23 +46,13 @@ class QRService:
     """
     
     def __init__(self):
-        self.qr_config = {
-            "version": 1,
-            "error_correction": qrcode.constants.ERROR_CORRECT_L,
-            "box_size": 10,
-            "border": 4
-        }
+        self._sesion_http = None
+        # Parámetros de renderizado (forman parte de la clave de la caché)
+        self.qr_config = dict(PARAMETROS_QR)
     
     def get_local_ip(self) -> str:
-        """Obtener la IP local automáticamente"""
-        try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            s.connect(("8.8.8.8", 80))
-            ip = s.getsockname()[0]
-            s.close()
-            return ip
-        except Exception:
-            return "127.0.0.1"
+        """Obtener la IP local automáticamente (en caché por QR_IP_TTL segundos)"""
+        return get_local_ip()
     
     def generar_qr(self, url: str) -> str:
         """
@@ -50,28 +60,8 @@ class QRService:
         Implementa el método generarQR(url: str): str de la documentación
         """
         try:
-            # Crear objeto QR
-            qr = qrcode.QRCode(
-                version=self.qr_config["version"],
-                error_correction=self.qr_config["error_correction"],
-                box_size=self.qr_config["box_size"],
-                border=self.qr_config["border"]
-            )
-            
-            # Agregar datos
-            qr.add_data(url)
-            qr.make(fit=True)
-            
-            # Crear imagen
-            img = qr.make_image(fill_color="black", back_color="white")
-            
-            # Convertir a base64
-            img_byte_arr = BytesIO()
-            img.save(img_byte_arr, format='PNG')
-            img_byte_arr = img_byte_arr.getvalue()
-            qr_base64 = base64.b64encode(img_byte_arr).decode("utf-8")
-            
-            return qr_base64
+            # Mismo contenido y parámetros -> misma imagen, servida desde la caché
+            return obtener_base64(url, **self.qr_config)
             
         except Exception as e:
             raise Exception(f"Error al generar QR: {str(e)}")
@@ -89,12 +79,8 @@ class QRService:
             if not producto:
                 raise Exception("Producto no encontrado")
             
-            # Crear URL del producto
-            local_ip = self.get_local_ip()
-            producto_url = f"http://{local_ip}:8000/api/productos/{producto_id}"
-            
-            # Generar QR
-            qr_base64 = self.generar_qr(producto_url)
+            # Contenido compacto firmado (QR versión 1) en lugar de la URL completa
+            qr_base64 = self.generar_qr(qr_payload.codificar('producto', producto_id))
             
             return qr_base64
             
@@ -135,13 +121,13 @@ class QRService:
             raise Exception(f"Error al decodificar QR: {str(e)}")
     
     def _decodificar_qr_imagen(self, imagen_data: Union[bytes, np.ndarray]) -> list:
-        """Decodificar QR desde imagen usando pyzbar"""
+        """Decodificar QR desde imagen usando pyzbar sobre un arreglo en escala de grises"""
         try:
-            # Convertir a imagen PIL si es necesario
+            # Los bytes se decodifican en memoria directamente a escala de grises
             if isinstance(imagen_data, bytes):
-                imagen = Image.open(BytesIO(imagen_data))
+                imagen = decodificar_imagen(imagen_data, gris=True)
             elif isinstance(imagen_data, np.ndarray):
-                imagen = Image.fromarray(imagen_data)
+                imagen = a_escala_de_grises(imagen_data)
             else:
                 raise Exception("Formato de imagen no soportado")
             
@@ -161,31 +147,22 @@ class QRService:
     def _procesar_qr_string(self, qr_string: str) -> Optional[Dict[str, Any]]:
         """Procesar string de QR y obtener información del producto"""
         try:
-            # Caso 1: ID numérico directo
-            try:
-                producto_id = int(qr_string)
-                return self._obtener_producto_por_id(producto_id)
-            except ValueError:
-                pass
-            
-            # Caso 2: Código de producto
-            producto = self._obtener_producto_por_codigo(qr_string)
-            if producto:
-                return producto
-            
-            # Caso 3: URL que contiene información del producto
+            # Contenido compacto firmado (producto, lote o movimiento)
+            recurso = qr_payload.decodificar(qr_string)
+            if recurso:
+                return self._resolver_ruta_interna(*recurso, origen='compacto')
+            if qr_payload.es_compacto(qr_string):
+                # Firma inválida: etiqueta alterada o de otra instalación
+                return None
+            
+            # Formatos anteriores: URL de la propia API
             if qr_string.startswith('http'):
                 return self._procesar_qr_url(qr_string)
             
-            # Caso 4: JSON con datos estructurados
-            try:
-                datos_json = json.loads(qr_string)
-                if 'producto_id' in datos_json:
-                    return self._obtener_producto_por_id(datos_json['producto_id'])
-                elif 'codigo' in datos_json:
-                    return self._obtener_producto_por_codigo(datos_json['codigo'])
-            except json.JSONDecodeError:
-                pass
+            # ID, código o JSON resueltos desde el índice del catálogo
+            producto, origen = catalogo_service.resolver(qr_string)
+            if producto:
+                return self._marcar_decodificado(producto, origen)
             
             return None
             
@@ -193,60 +170,107 @@ class QRService:
             raise Exception(f"Error al procesar QR string: {str(e)}")
     
     def _procesar_qr_url(self, url: str) -> Optional[Dict[str, Any]]:
-        """Procesar URL de QR para extraer información del producto"""
+        """
+        Resolver una URL de QR dentro de la aplicación, sin llamadas HTTP:
+        rutas de productos, lotes y movimientos o parámetros con el ID del producto
+        """
         try:
-            import re
-            
-            # Buscar patrón de ID de producto en la URL
-            patterns = [
-                r'/productos?/(\d+)',
-                r'producto_id=(\d+)',
-                r'id=(\d+)',
-                r'/api/productos/(\d+)'
-            ]
-            
-            for pattern in patterns:
-                match = re.search(pattern, url)
-                if match:
-                    producto_id = int(match.group(1))
-                    return self._obtener_producto_por_id(producto_id)
-            
-            # Intentar hacer request a la URL si es un endpoint válido
-            if '/api/productos/' in url:
-                try:
-                    response = requests.get(url, timeout=5)
-                    if response.status_code == 200:
-                        return response.json()
-                except:
-                    pass
+            interna = ruta_interna(url)
+            if interna:
+                return self._resolver_ruta_interna(*interna)
+            
+            # Parámetros de consulta con el ID del producto (?producto_id=, ?id=)
+            producto, _ = catalogo_service.resolver(url)
+            if producto:
+                return self._marcar_decodificado(producto, 'url')
+            
+            # Endpoint de productos de otro servidor: se consulta por HTTP
+            # (nunca contra este mismo servidor)
+            if '/api/productos/' in url and not self._es_servidor_propio(url):
+                return self._consultar_url_externa(url)
             
             return None
             
         except Exception:
             return None
     
+    def _resolver_ruta_interna(self, recurso: str, recurso_id: int, origen: str = 'url') -> Optional[Dict[str, Any]]:
+        """Obtener el recurso de una ruta interna o de un QR compacto desde la capa de datos"""
+        if recurso == 'producto':
+            datos = catalogo_service.por_id(recurso_id)
+        elif recurso == 'lote':
+            datos = execute_query(
+                """SELECT l.*, p.codigo as producto_codigo, p.nombre as producto_nombre
+                   FROM lotes l
+                   JOIN productos p ON l.producto_id = p.id
+                   WHERE l.id = %s AND l.activo = TRUE""",
+                (recurso_id,),
+                fetch_one=True
+            )
+        else:
+            datos = execute_query(
+                """SELECT m.*, l.numero_lote, p.id as producto_id, p.nombre as producto_nombre
+                   FROM movimientos m
+                   JOIN lotes l ON m.lote_id = l.id
+                   JOIN productos p ON l.producto_id = p.id
+                   WHERE m.id = %s""",
+                (recurso_id,),
+                fetch_one=True
+            )
+        
+        if not datos:
+            return None
+        datos['recurso'] = recurso
+        return self._marcar_decodificado(datos, origen)
+    
+    def _es_servidor_propio(self, url: str) -> bool:
+        host = urlsplit(url).hostname or ''
+        return host in ('localhost', '127.0.0.1', get_local_ip())
+    
+    def _get_sesion_http(self) -> requests.Session:
+        """Sesión HTTP con pool de conexiones (se crea al primer uso)"""
+        if self._sesion_http is None:
+            sesion = requests.Session()
+            adaptador = HTTPAdapter(pool_maxsize=settings.qr_http_max_conexiones)
+            sesion.mount('http://', adaptador)
+            sesion.mount('https://', adaptador)
+            self._sesion_http = sesion
+        return self._sesion_http
+    
+    def _consultar_url_externa(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtener los datos JSON de una URL externa contenida en un QR, con
+        timeout estricto y sin seguir redirecciones
+        """
+        try:
+            response = self._get_sesion_http().get(
+                url, timeout=settings.qr_http_timeout, allow_redirects=False
+            )
+            if response.status_code == 200 and 'json' in response.headers.get('content-type', ''):
+                datos = response.json()
+                if isinstance(datos, dict):
+                    return self._marcar_decodificado(datos, 'url_externa')
+        except Exception:
+            pass
+        return None
+    
+    def cerrar(self):
+        """Cerrar la sesión HTTP (al apagar la aplicación)"""
+        if self._sesion_http is not None:
+            self._sesion_http.close()
+            self._sesion_http = None
+    
+    def _marcar_decodificado(self, producto: Dict[str, Any], origen: str) -> Dict[str, Any]:
+        """Agregar información de la decodificación al producto"""
+        producto['qr_decoded_from'] = origen
+        producto['qr_decoded_at'] = datetime.now().isoformat()
+        return producto
+    
     def _obtener_producto_por_id(self, producto_id: int) -> Optional[Dict[str, Any]]:
         """Obtener producto por ID"""
         try:
-            producto = execute_query(
-                """SELECT p.*, 
-                          COALESCE(SUM(l.cantidad_disponible), 0) as stock_actual,
-                          pr.nombre as proveedor_nombre
-                   FROM productos p
-                   LEFT JOIN lotes l ON p.id = l.producto_id AND l.activo = TRUE
-                   LEFT JOIN proveedores pr ON p.id_proveedor = pr.id_proveedor
-                   WHERE p.id = %s AND p.activo = TRUE
-                   GROUP BY p.id""",
-                (producto_id,),
-                fetch_one=True
-            )
-            
-            if producto:
-                # Agregar información adicional
-                producto['qr_decoded_from'] = 'id'
-                producto['qr_decoded_at'] = datetime.now().isoformat()
-                
-            return producto
+            producto = catalogo_service.por_id(producto_id)
+            return self._marcar_decodificado(producto, 'id') if producto else None
             
         except Exception:
             return None
@@ -254,25 +278,8 @@ class QRService:
     def _obtener_producto_por_codigo(self, codigo: str) -> Optional[Dict[str, Any]]:
         """Obtener producto por código"""
         try:
-            producto = execute_query(
-                """SELECT p.*, 
-                          COALESCE(SUM(l.cantidad_disponible), 0) as stock_actual,
-                          pr.nombre as proveedor_nombre
-                   FROM productos p
-                   LEFT JOIN lotes l ON p.id = l.producto_id AND l.activo = TRUE
-                   LEFT JOIN proveedores pr ON p.id_proveedor = pr.id_proveedor
-                   WHERE p.codigo = %s AND p.activo = TRUE
-                   GROUP BY p.id""",
-                (codigo,),
-                fetch_one=True
-            )
-            
-            if producto:
-                # Agregar información adicional
-                producto['qr_decoded_from'] = 'codigo'
-                producto['qr_decoded_at'] = datetime.now().isoformat()
-                
-            return producto
+            producto = catalogo_service.por_codigo(codigo)
+            return self._marcar_decodificado(producto, 'codigo') if producto else None
             
         except Exception:
             return None
@@ -293,34 +300,31 @@ class QRService:
             if not lote:
                 raise Exception("Lote no encontrado")
             
-            # Crear datos del lote para QR
-            datos_lote = {
-                "tipo": "lote",
-                "lote_id": lote_id,
-                "numero_lote": lote['numero_lote'],
-                "producto_id": lote['producto_id'],
-                "producto_codigo": lote['producto_codigo'],
-                "cantidad_disponible": lote['cantidad_disponible'],
-                "fecha_vencimiento": lote['fecha_vencimiento'].isoformat() if lote['fecha_vencimiento'] else None
-            }
-            
-            return self.generar_qr_con_datos(datos_lote)
+            # Contenido compacto firmado del lote
+            return self.generar_qr(qr_payload.codificar('lote', lote_id))
             
         except Exception as e:
             raise Exception(f"Error al generar QR del lote: {str(e)}")
     
+    def decodificar_qr_desde_bytes(self, datos: bytes) -> Optional[Dict[str, Any]]:
+        """
+        Decodificar QR desde los bytes de una imagen (por ejemplo, un UploadFile
+        ya leído) sin escribirla a disco
+        """
+        try:
+            return self.decodificar_qr(datos)
+        except Exception as e:
+            raise Exception(f"Error al decodificar QR desde bytes: {str(e)}")
+    
     def decodificar_qr_desde_archivo(self, file_path: str) -> Optional[Dict[str, Any]]:
         """Decodificar QR desde archivo de imagen"""
         try:
-            # Leer imagen
-            imagen = cv2.imread(file_path)
+            # Leer directamente en escala de grises, que es lo que usa pyzbar
+            imagen = cv2.imread(file_path, cv2.IMREAD_GRAYSCALE)
             if imagen is None:
                 raise Exception("No se pudo leer la imagen")
             
-            # Convertir a RGB para PIL
-            imagen_rgb = cv2.cvtColor(imagen, cv2.COLOR_BGR2RGB)
-            
-            return self.decodificar_qr(imagen_rgb)
+            return self.decodificar_qr(imagen)
             
         except Exception as e:
             raise Exception(f"Error al decodificar QR desde archivo: {str(e)}")
@@ -355,11 +359,8 @@ class QRService:
             if not movimiento:
                 raise Exception("Movimiento no encontrado")
             
-            # Crear URL de tracking
-            local_ip = self.get_local_ip()
-            tracking_url = f"http://{local_ip}:8000/api/movimientos/{movimiento_id}"
-            
-            return self.generar_qr(tracking_url)
+            # Contenido compacto firmado del movimiento
+            return self.generar_qr(qr_payload.codificar('movimiento', movimiento_id))
             
         except Exception as e:
             raise Exception(f"Error al generar QR del movimiento: {str(e)}")
@@ -370,10 +371,12 @@ class QRService:
             # Estadísticas básicas (esto podría expandirse con una tabla de logs)
             stats = {
                 "qr_service_active": True,
-                "supported_formats": ["ID", "Código", "URL", "JSON"],
+                "supported_formats": ["Compacto firmado", "ID", "Código", "URL", "JSON"],
                 "supported_types": ["producto", "lote", "movimiento"],
                 "encoding_format": "UTF-8",
                 "image_format": "PNG",
+                "catalogo": catalogo_service.stats(),
+                "compactos": qr_payload.stats(),
                 "timestamp": datetime.now().isoformat()
             }
             
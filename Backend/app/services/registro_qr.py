@@ -0,0 +1,247 @@
+"""
+Registro de datos y fotos recibidos desde los dispositivos móviles
+Reemplaza a qr_data_log.json, que se leía y reescribía completo en cada
+petición. Las entradas se agregan al final de segmentos JSONL que rotan por
+tamaño; cada segmento tiene un índice .idx con el offset de cada línea
+(8 bytes por entrada), así que leer las últimas N entradas solo toca el
+final de los archivos. La escritura la hace un hilo en segundo plano.
+"""
+
+import json
+import os
+import queue
+import struct
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from ..core.config import settings
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent.parent
+ARCHIVO_ANTERIOR = BACKEND_DIR / "qr_data_log.json"
+
+OFFSET = struct.Struct("<Q")
+_FIN = object()
+
+class RegistroQR:
+    """Registro de solo anexado en segmentos JSONL con índice de offsets"""
+
+    def __init__(self, directorio: Path, tamano_segmento: int, segmentos: int, cola_max: int):
+        self.directorio = directorio
+        self.tamano_segmento = tamano_segmento
+        self.segmentos = segmentos
+        self._cola: "queue.Queue" = queue.Queue(maxsize=cola_max)
+        self._hilo: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._numero = 0
+        self._datos = None
+        self._indice = None
+        self.escritas = 0
+        self.descartadas = 0
+        self.rotaciones = 0
+
+    # Archivos
+
+    def _ruta(self, numero: int, extension: str) -> Path:
+        return self.directorio / f"segmento_{numero:06d}.{extension}"
+
+    def _numeros(self) -> List[int]:
+        """Números de los segmentos existentes, del más antiguo al más reciente"""
+        if not self.directorio.exists():
+            return []
+        return sorted(
+            int(ruta.stem.split("_")[1])
+            for ruta in self.directorio.glob("segmento_*.jsonl")
+        )
+
+    def _abrir(self, numero: int):
+        self._cerrar_archivos()
+        self._numero = numero
+        # Modo anexar: cada línea se escribe al final aunque otro proceso escriba también
+        self._datos = open(self._ruta(numero, "jsonl"), "ab")
+        self._indice = open(self._ruta(numero, "idx"), "ab")
+
+    def _cerrar_archivos(self):
+        for archivo in (self._datos, self._indice):
+            if archivo is not None:
+                archivo.close()
+        self._datos = self._indice = None
+
+    def _rotar_si_corresponde(self):
+        if self._datos is None:
+            numeros = self._numeros()
+            self._abrir(numeros[-1] if numeros else 1)
+        if self._datos.tell() < self.tamano_segmento:
+            return
+
+        # Otro proceso pudo haber rotado ya: continuar en el segmento más reciente
+        numeros = self._numeros()
+        siguiente = numeros[-1] if numeros and numeros[-1] > self._numero else self._numero + 1
+        self._abrir(siguiente)
+        self.rotaciones += 1
+
+        for numero in self._numeros()[:-self.segmentos]:
+            for extension in ("jsonl", "idx"):
+                try:
+                    self._ruta(numero, extension).unlink()
+                except OSError:
+                    pass
+
+    def _indexar(self, offsets: List[int]):
+        # El índice se escribe después de los datos: toda entrada indexada está completa
+        if offsets:
+            self._indice.write(b"".join(OFFSET.pack(offset) for offset in offsets))
+            self._indice.flush()
+
+    def _escribir(self, entradas: List[Dict[str, Any]]):
+        """Agregar un grupo de entradas al segmento actual y a su índice"""
+        offsets: List[int] = []
+        for entrada in entradas:
+            if self._datos is None or self._datos.tell() >= self.tamano_segmento:
+                self._indexar(offsets)
+                offsets = []
+                self._rotar_si_corresponde()
+
+            linea = (json.dumps(entrada, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+            self._datos.write(linea)
+            self._datos.flush()
+            # Con O_APPEND la escritura va siempre al final del archivo
+            offsets.append(self._datos.tell() - len(linea))
+        self._indexar(offsets)
+        self.escritas += len(entradas)
+
+    # Hilo escritor
+
+    def _trabajar(self):
+        while True:
+            entrada = self._cola.get()
+            grupo = []
+            terminar = entrada is _FIN
+            if not terminar:
+                grupo.append(entrada)
+            # Agrupar lo que ya esté en cola en una sola escritura
+            while not terminar and len(grupo) < 500:
+                try:
+                    entrada = self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                if entrada is _FIN:
+                    terminar = True
+                else:
+                    grupo.append(entrada)
+
+            if grupo:
+                try:
+                    with self._lock:
+                        self._escribir(grupo)
+                except Exception as e:
+                    print(f"❌ Error escribiendo el registro QR: {e}")
+            if terminar:
+                with self._lock:
+                    self._cerrar_archivos()
+                return
+
+    def iniciar(self):
+        """Crear el directorio, importar el archivo anterior y arrancar el escritor"""
+        with self._lock:
+            if self._hilo is not None:
+                return
+            self.directorio.mkdir(parents=True, exist_ok=True)
+            self._importar_anterior()
+            self._hilo = threading.Thread(target=self._trabajar, name="registro-qr", daemon=True)
+            self._hilo.start()
+
+    def _importar_anterior(self):
+        """Migrar una sola vez las entradas de qr_data_log.json"""
+        if not ARCHIVO_ANTERIOR.exists():
+            return
+        try:
+            with open(ARCHIVO_ANTERIOR, "r", encoding="utf-8") as f:
+                entradas = json.load(f)
+            if entradas:
+                self._escribir(entradas)
+            ARCHIVO_ANTERIOR.rename(ARCHIVO_ANTERIOR.with_suffix(".json.migrado"))
+            print(f"✅ {len(entradas)} entradas importadas de {ARCHIVO_ANTERIOR.name}")
+        except Exception as e:
+            print(f"❌ No se pudo importar {ARCHIVO_ANTERIOR.name}: {e}")
+
+    def registrar(self, entrada: Dict[str, Any]) -> bool:
+        """
+        Encolar una entrada sin bloquear. Si la cola está llena (disco lento)
+        la entrada se descarta y se cuenta en las estadísticas.
+        """
+        if self._hilo is None:
+            self.iniciar()
+        try:
+            self._cola.put_nowait(entrada)
+            return True
+        except queue.Full:
+            self.descartadas += 1
+            return False
+
+    def detener(self, timeout: float = 5.0):
+        """Escribir lo pendiente y detener el hilo (al apagar la aplicación)"""
+        hilo = self._hilo
+        if hilo is None:
+            return
+        self._cola.put(_FIN)
+        hilo.join(timeout)
+        self._hilo = None
+
+    # Lectura
+
+    def _contar(self, numero: int) -> int:
+        try:
+            return self._ruta(numero, "idx").stat().st_size // OFFSET.size
+        except OSError:
+            return 0
+
+    def ultimas(self, cantidad: int) -> List[Dict[str, Any]]:
+        """Últimas entradas, de la más antigua a la más reciente"""
+        resultado: List[Dict[str, Any]] = []
+        for numero in reversed(self._numeros()):
+            faltan = cantidad - len(resultado)
+            if faltan <= 0:
+                break
+            try:
+                with open(self._ruta(numero, "idx"), "rb") as indice:
+                    total = indice.seek(0, os.SEEK_END) // OFFSET.size
+                    desde = max(0, total - faltan)
+                    indice.seek(desde * OFFSET.size)
+                    bloque = indice.read((total - desde) * OFFSET.size)
+                offsets = [valor for (valor,) in OFFSET.iter_unpack(bloque)]
+
+                entradas = []
+                with open(self._ruta(numero, "jsonl"), "rb") as datos:
+                    for offset in offsets:
+                        datos.seek(offset)
+                        entradas.append(json.loads(datos.readline()))
+            except OSError:
+                # Segmento eliminado por la rotación mientras se leía
+                continue
+            resultado = entradas + resultado
+        return resultado
+
+    def total(self) -> int:
+        """Entradas retenidas en todos los segmentos (solo consulta el tamaño de los índices)"""
+        return sum(self._contar(numero) for numero in self._numeros())
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado del registro"""
+        return {
+            "directorio": str(self.directorio),
+            "segmentos": len(self._numeros()),
+            "segmento_actual": self._numero,
+            "en_cola": self._cola.qsize(),
+            "escritas": self.escritas,
+            "descartadas": self.descartadas,
+            "rotaciones": self.rotaciones
+        }
+
+# Instancia global del registro
+registro_qr = RegistroQR(
+    Path(settings.qr_log_dir) if settings.qr_log_dir else BACKEND_DIR / "qr_logs",
+    settings.qr_log_segmento_max,
+    settings.qr_log_segmentos,
+    settings.qr_log_cola_max
+)
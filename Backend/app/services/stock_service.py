@@ -0,0 +1,135 @@
+"""
+Servicio de conciliación del stock materializado
+Verifica que productos.stock_actual coincida con la suma de sus lotes activos
+y corrige las diferencias
+"""
+
+import asyncio
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+from ..core.config import settings
+from ..database import execute_query, transaccion, ejecutar_en_hilo
+
+class StockService:
+    """
+    Concilia productos.stock_actual (mantenido por triggers con diferencias)
+    contra SUM(lotes.cantidad_disponible) de los lotes activos
+    """
+
+    def __init__(self):
+        self.ultima_ejecucion: Optional[datetime] = None
+        self.ultimas_diferencias = 0
+        self.ultimas_reparaciones = 0
+        self._tarea: Optional[asyncio.Task] = None
+
+    def verificar(self) -> List[Dict[str, Any]]:
+        """Productos cuyo stock materializado no coincide con sus lotes"""
+        return execute_query(
+            """SELECT p.id as producto_id, p.nombre as producto_nombre,
+                      p.stock_actual, COALESCE(s.total, 0) as stock_calculado,
+                      COALESCE(s.total, 0) - p.stock_actual as diferencia
+               FROM productos p
+               LEFT JOIN (
+                   SELECT producto_id, SUM(cantidad_disponible) AS total
+                   FROM lotes
+                   WHERE activo = TRUE
+                   GROUP BY producto_id
+               ) s ON s.producto_id = p.id
+               WHERE p.stock_actual <> COALESCE(s.total, 0)
+               ORDER BY p.id""",
+            fetch_all=True
+        )
+
+    def reparar_producto(self, producto_id: int) -> bool:
+        """
+        Recalcula el stock de un producto bloqueando sus lotes para que
+        ningún movimiento concurrente se pierda durante la corrección.
+        Devuelve True si había diferencia.
+        """
+        with transaccion() as db:
+            # Mismo orden de bloqueo que los triggers (lotes y luego productos)
+            calculado = db.execute(
+                """SELECT COALESCE(SUM(cantidad_disponible), 0) as total
+                   FROM lotes
+                   WHERE producto_id = %s AND activo = TRUE
+                   FOR UPDATE""",
+                (producto_id,),
+                fetch_one=True
+            )['total']
+
+            producto = db.execute(
+                "SELECT stock_actual FROM productos WHERE id = %s FOR UPDATE",
+                (producto_id,),
+                fetch_one=True
+            )
+            if not producto:
+                return False
+
+            if producto['stock_actual'] == calculado:
+                return False
+
+            db.execute(
+                "UPDATE productos SET stock_actual = %s WHERE id = %s",
+                (calculado, producto_id)
+            )
+            return True
+
+    def conciliar(self, reparar: bool = True) -> Dict[str, Any]:
+        """Verificar el stock de todos los productos y, si se pide, corregirlo"""
+        diferencias = self.verificar()
+        reparados = []
+
+        if reparar:
+            for diferencia in diferencias:
+                if self.reparar_producto(diferencia['producto_id']):
+                    reparados.append(diferencia['producto_id'])
+
+        self.ultima_ejecucion = datetime.now()
+        self.ultimas_diferencias = len(diferencias)
+        self.ultimas_reparaciones = len(reparados)
+
+        return {
+            "fecha": self.ultima_ejecucion,
+            "diferencias": diferencias,
+            "productos_reparados": reparados
+        }
+
+    def get_status(self) -> Dict[str, Any]:
+        """Estado de la conciliación periódica"""
+        return {
+            "intervalo_segundos": settings.stock_conciliacion_intervalo,
+            "activa": self._tarea is not None and not self._tarea.done(),
+            "ultima_ejecucion": self.ultima_ejecucion,
+            "ultimas_diferencias": self.ultimas_diferencias,
+            "ultimas_reparaciones": self.ultimas_reparaciones
+        }
+
+    async def _ciclo_conciliacion(self, intervalo: float):
+        while True:
+            await asyncio.sleep(intervalo)
+            try:
+                resultado = await ejecutar_en_hilo(self.conciliar)
+                if resultado["productos_reparados"]:
+                    print(f"Conciliación de stock: {len(resultado['productos_reparados'])} productos corregidos")
+            except Exception as e:
+                print(f"Error en la conciliación de stock: {e}")
+
+    def iniciar(self):
+        """Programar la conciliación periódica en el event loop actual"""
+        intervalo = settings.stock_conciliacion_intervalo
+        if intervalo > 0 and self._tarea is None:
+            self._tarea = asyncio.create_task(self._ciclo_conciliacion(intervalo))
+
+    async def detener(self):
+        """Cancelar la conciliación periódica"""
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+
+# Instancia global del servicio de stock
+stock_service = StockService()
@@ -0,0 +1,436 @@
+"""
+Almacenamiento de tokens OAuth2 (refresh tokens y códigos de autorización)
+
+Los tokens se guardan indexados por el SHA-256 del valor, nunca en claro.
+Implementaciones:
+- TokenStoreMemoria: diccionarios del proceso (un solo worker, pruebas)
+- TokenStoreSQL: tabla oauth_tokens en MySQL (varios workers y reinicios)
+- TokenStoreArchivo: archivo SQLite local (un solo servidor, varios workers)
+
+TokenStoreConCache envuelve cualquiera de ellas con una caché de lectura en
+memoria para que /token y /introspect no consulten la base en cada acierto.
+"""
+
+import hashlib
+from abc import ABC, abstractmethod
+import heapq
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..core.cache import CacheTTL
+from ..core.config import settings
+from ..database import execute_query, transaccion
+
+# Tipos de token almacenados
+REFRESH = "refresh"
+CODIGO = "codigo"
+
+def digest_token(token: str) -> str:
+    """Clave de almacenamiento de un token (SHA-256 en hexadecimal)"""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+class TokenStore(ABC):
+    """
+    Interfaz de almacenamiento. `datos` es un diccionario serializable a JSON
+    y `expires_at` un timestamp (segundos desde epoch). Un backend que no
+    implemente todos los métodos falla al instanciarse.
+    """
+
+    nombre = "base"
+
+    @abstractmethod
+    def guardar(self, tipo: str, token: str, datos: Dict[str, Any], expires_at: float):
+        ...
+
+    @abstractmethod
+    def obtener(self, tipo: str, token: str) -> Optional[Dict[str, Any]]:
+        """Datos del token vigente o None"""
+        ...
+
+    @abstractmethod
+    def consumir(self, tipo: str, token: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtener y eliminar en una sola operación atómica: si dos workers
+        consumen el mismo código a la vez, solo uno recibe los datos.
+        """
+        ...
+
+    @abstractmethod
+    def eliminar(self, tipo: str, token: str) -> bool:
+        ...
+
+    @abstractmethod
+    def limpiar_expirados(self) -> int:
+        """
+        Eliminar tokens expirados; devuelve cuántos se eliminaron.
+        Las implementaciones recorren solo los expirados en orden de
+        expiración (heap o índice), no todos los tokens.
+        """
+        ...
+
+    @abstractmethod
+    def proxima_expiracion(self) -> Optional[float]:
+        """expires_at más antiguo almacenado (vencido o no), None si está vacío"""
+        ...
+
+    @abstractmethod
+    def contar(self) -> Dict[str, int]:
+        """Tokens vigentes por tipo"""
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.nombre}
+
+class TokenStoreMemoria(TokenStore):
+    """Tokens en diccionarios del proceso; se pierden al reiniciar"""
+
+    nombre = "memoria"
+
+    def __init__(self):
+        self._datos: Dict[str, tuple] = {}
+        # Min-heap de (expires_at, clave). Las entradas de tokens ya
+        # consumidos o reemplazados se descartan al llegar a la cima.
+        self._expiraciones: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def guardar(self, tipo, token, datos, expires_at):
+        clave = digest_token(token)
+        with self._lock:
+            self._datos[clave] = (tipo, dict(datos), expires_at)
+            heapq.heappush(self._expiraciones, (expires_at, clave))
+            self._compactar()
+
+    def _compactar(self):
+        """Reconstruir el heap si acumula demasiadas entradas obsoletas"""
+        if len(self._expiraciones) > 2 * len(self._datos) + 1024:
+            self._expiraciones = [(entrada[2], clave) for clave, entrada in self._datos.items()]
+            heapq.heapify(self._expiraciones)
+
+    def obtener(self, tipo, token):
+        with self._lock:
+            entrada = self._datos.get(digest_token(token))
+        if entrada is None or entrada[0] != tipo or entrada[2] < time.time():
+            return None
+        return dict(entrada[1])
+
+    def consumir(self, tipo, token):
+        clave = digest_token(token)
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None or entrada[0] != tipo:
+                return None
+            del self._datos[clave]
+        if entrada[2] < time.time():
+            return None
+        return dict(entrada[1])
+
+    def eliminar(self, tipo, token):
+        clave = digest_token(token)
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None or entrada[0] != tipo:
+                return False
+            del self._datos[clave]
+            return True
+
+    def limpiar_expirados(self):
+        ahora = time.time()
+        eliminados = 0
+        with self._lock:
+            while self._expiraciones and self._expiraciones[0][0] < ahora:
+                expires_at, clave = heapq.heappop(self._expiraciones)
+                entrada = self._datos.get(clave)
+                # Solo si la entrada sigue siendo la que se programó
+                if entrada is not None and entrada[2] == expires_at:
+                    del self._datos[clave]
+                    eliminados += 1
+        return eliminados
+
+    def proxima_expiracion(self):
+        with self._lock:
+            while self._expiraciones:
+                expires_at, clave = self._expiraciones[0]
+                entrada = self._datos.get(clave)
+                if entrada is not None and entrada[2] == expires_at:
+                    return expires_at
+                heapq.heappop(self._expiraciones)
+        return None
+
+    def contar(self):
+        ahora = time.time()
+        conteo = {REFRESH: 0, CODIGO: 0}
+        with self._lock:
+            for tipo, _, expires_at in self._datos.values():
+                if expires_at >= ahora:
+                    conteo[tipo] = conteo.get(tipo, 0) + 1
+        return conteo
+
+    def stats(self):
+        with self._lock:
+            return {"backend": self.nombre, "tokens": len(self._datos), "heap": len(self._expiraciones)}
+
+class TokenStoreSQL(TokenStore):
+    """Tokens en la tabla oauth_tokens (migración 2)"""
+
+    nombre = "sql"
+
+    def guardar(self, tipo, token, datos, expires_at):
+        execute_query(
+            """INSERT INTO oauth_tokens (token_hash, tipo, datos, expires_at)
+               VALUES (%s, %s, %s, %s)
+               ON DUPLICATE KEY UPDATE tipo = VALUES(tipo), datos = VALUES(datos),
+                                       expires_at = VALUES(expires_at)""",
+            (digest_token(token), tipo, json.dumps(datos), expires_at)
+        )
+
+    def obtener(self, tipo, token):
+        fila = execute_query(
+            """SELECT datos FROM oauth_tokens
+               WHERE token_hash = %s AND tipo = %s AND expires_at >= %s""",
+            (digest_token(token), tipo, time.time()),
+            fetch_one=True
+        )
+        return json.loads(fila['datos']) if fila else None
+
+    def consumir(self, tipo, token):
+        clave = digest_token(token)
+        with transaccion() as db:
+            fila = db.execute(
+                """SELECT datos, expires_at FROM oauth_tokens
+                   WHERE token_hash = %s AND tipo = %s""",
+                (clave, tipo),
+                fetch_one=True
+            )
+            if not fila:
+                return None
+
+            # Solo quien elimina la fila se queda con el token
+            db.execute("DELETE FROM oauth_tokens WHERE token_hash = %s", (clave,))
+            if db.rowcount != 1 or fila['expires_at'] < time.time():
+                return None
+            return json.loads(fila['datos'])
+
+    def eliminar(self, tipo, token):
+        with transaccion() as db:
+            db.execute(
+                "DELETE FROM oauth_tokens WHERE token_hash = %s AND tipo = %s",
+                (digest_token(token), tipo)
+            )
+            return db.rowcount > 0
+
+    def limpiar_expirados(self):
+        # Por bloques en orden de expiración (índice idx_oauth_tokens_expira)
+        # para no bloquear la tabla mucho tiempo en una limpieza grande
+        ahora = time.time()
+        # Con 0 el ciclo no terminaría nunca y un negativo es un error de SQL
+        lote = max(1, settings.oauth_barrido_lote)
+        eliminados = 0
+        while True:
+            with transaccion() as db:
+                db.execute(
+                    "DELETE FROM oauth_tokens WHERE expires_at < %s ORDER BY expires_at LIMIT %s",
+                    (ahora, lote)
+                )
+                borrados = db.rowcount
+            eliminados += borrados
+            if borrados < lote:
+                return eliminados
+
+    def proxima_expiracion(self):
+        fila = execute_query("SELECT MIN(expires_at) as proxima FROM oauth_tokens", fetch_one=True)
+        return fila['proxima'] if fila else None
+
+    def contar(self):
+        filas = execute_query(
+            """SELECT tipo, COUNT(*) as total FROM oauth_tokens
+               WHERE expires_at >= %s GROUP BY tipo""",
+            (time.time(),),
+            fetch_all=True
+        )
+        conteo = {REFRESH: 0, CODIGO: 0}
+        for fila in filas:
+            conteo[fila['tipo']] = fila['total']
+        return conteo
+
+class TokenStoreArchivo(TokenStore):
+    """
+    Tokens en un archivo SQLite local. SQLite bloquea el archivo entre
+    procesos, así que sirve para varios workers en el mismo servidor.
+    """
+
+    nombre = "archivo"
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._local = threading.local()
+        with self._conexion() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS oauth_tokens (
+                    token_hash TEXT PRIMARY KEY,
+                    tipo TEXT NOT NULL,
+                    datos TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_oauth_tokens_expira ON oauth_tokens (expires_at)")
+
+    def _conexion(self) -> sqlite3.Connection:
+        """Una conexión por hilo (sqlite3 no comparte conexiones entre hilos)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.ruta, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn = _ConexionSQLite(conn)
+            self._local.conn = conn
+        return conn
+
+    def guardar(self, tipo, token, datos, expires_at):
+        with self._conexion() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO oauth_tokens (token_hash, tipo, datos, expires_at) VALUES (?, ?, ?, ?)",
+                (digest_token(token), tipo, json.dumps(datos), expires_at)
+            )
+
+    def obtener(self, tipo, token):
+        with self._conexion() as conn:
+            fila = conn.execute(
+                "SELECT datos FROM oauth_tokens WHERE token_hash = ? AND tipo = ? AND expires_at >= ?",
+                (digest_token(token), tipo, time.time())
+            ).fetchone()
+        return json.loads(fila[0]) if fila else None
+
+    def consumir(self, tipo, token):
+        clave = digest_token(token)
+        with self._conexion() as conn:
+            fila = conn.execute(
+                "SELECT datos, expires_at FROM oauth_tokens WHERE token_hash = ? AND tipo = ?",
+                (clave, tipo)
+            ).fetchone()
+            if not fila:
+                return None
+            borradas = conn.execute("DELETE FROM oauth_tokens WHERE token_hash = ?", (clave,)).rowcount
+        if borradas != 1 or fila[1] < time.time():
+            return None
+        return json.loads(fila[0])
+
+    def eliminar(self, tipo, token):
+        with self._conexion() as conn:
+            return conn.execute(
+                "DELETE FROM oauth_tokens WHERE token_hash = ? AND tipo = ?",
+                (digest_token(token), tipo)
+            ).rowcount > 0
+
+    def limpiar_expirados(self):
+        with self._conexion() as conn:
+            return conn.execute("DELETE FROM oauth_tokens WHERE expires_at < ?", (time.time(),)).rowcount
+
+    def proxima_expiracion(self):
+        with self._conexion() as conn:
+            return conn.execute("SELECT MIN(expires_at) FROM oauth_tokens").fetchone()[0]
+
+    def contar(self):
+        with self._conexion() as conn:
+            filas = conn.execute(
+                "SELECT tipo, COUNT(*) FROM oauth_tokens WHERE expires_at >= ? GROUP BY tipo",
+                (time.time(),)
+            ).fetchall()
+        conteo = {REFRESH: 0, CODIGO: 0}
+        conteo.update(dict(filas))
+        return conteo
+
+    def stats(self):
+        return {"backend": self.nombre, "archivo": self.ruta}
+
+class _ConexionSQLite:
+    """Conexión SQLite en modo autocommit con transacción explícita por bloque"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def execute(self, *args):
+        return self.conn.execute(*args)
+
+    def __enter__(self):
+        # BEGIN IMMEDIATE toma el bloqueo de escritura al inicio del bloque
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self
+
+    def __exit__(self, tipo_error, error, traza):
+        self.conn.execute("COMMIT" if tipo_error is None else "ROLLBACK")
+        return False
+
+class TokenStoreConCache(TokenStore):
+    """
+    Caché de lectura sobre otro TokenStore. Solo se cachean lecturas de
+    tokens vigentes y la vida de cada entrada nunca supera su expiración.
+    `consumir` y `eliminar` siempre van al almacenamiento (y descartan la
+    entrada local) para que los códigos de un solo uso sigan siendo atómicos.
+
+    Con varios workers, una revocación hecha en otro proceso se nota aquí a
+    más tardar después de OAUTH_CACHE_TTL segundos.
+    """
+
+    def __init__(self, store: TokenStore, cache: CacheTTL):
+        self.store = store
+        self.cache = cache
+        self.nombre = store.nombre
+
+    def guardar(self, tipo, token, datos, expires_at):
+        self.store.guardar(tipo, token, datos, expires_at)
+        self.cache.set((tipo, digest_token(token)), (dict(datos), expires_at),
+                       ttl=expires_at - time.time())
+
+    def obtener(self, tipo, token):
+        clave = (tipo, digest_token(token))
+        entrada = self.cache.get(clave)
+        if entrada is not None:
+            datos, expires_at = entrada
+            if expires_at >= time.time():
+                return dict(datos)
+            self.cache.invalidar(clave)
+            return None
+
+        datos = self.store.obtener(tipo, token)
+        if datos is not None:
+            expires_at = datos.get("expires_at", time.time() + self.cache.ttl)
+            self.cache.set(clave, (dict(datos), expires_at), ttl=expires_at - time.time())
+        return datos
+
+    def consumir(self, tipo, token):
+        self.cache.invalidar((tipo, digest_token(token)))
+        return self.store.consumir(tipo, token)
+
+    def eliminar(self, tipo, token):
+        self.cache.invalidar((tipo, digest_token(token)))
+        return self.store.eliminar(tipo, token)
+
+    def limpiar_expirados(self):
+        return self.store.limpiar_expirados()
+
+    def proxima_expiracion(self):
+        return self.store.proxima_expiracion()
+
+    def contar(self):
+        return self.store.contar()
+
+    def stats(self):
+        estadisticas = self.store.stats()
+        estadisticas["cache"] = self.cache.stats()
+        return estadisticas
+
+def crear_token_store() -> TokenStore:
+    """TokenStore según OAUTH_TOKEN_STORE (sql, archivo o memoria)"""
+    tipo = settings.oauth_token_store
+    if tipo == "memoria":
+        # Ya está en memoria: no tiene sentido otra caché encima
+        return TokenStoreMemoria()
+    if tipo == "archivo":
+        store = TokenStoreArchivo(settings.oauth_token_archivo)
+    elif tipo == "sql":
+        store = TokenStoreSQL()
+    else:
+        raise ValueError(f"OAUTH_TOKEN_STORE desconocido: {tipo}")
+    return TokenStoreConCache(store, CacheTTL(settings.oauth_cache_max, settings.oauth_cache_ttl))
@@ -12,25 +12,22 @@ from pathlib import Path
 import shutil
 import os
 
-# Importar YOLO con manejo de errores
-try:
-    from ultralytics import YOLO
-    YOLO_AVAILABLE = True
-except ImportError:
-    YOLO_AVAILABLE = False
-    print("Warning: YOLO not available. Install ultralytics to use object detection features.")
+from .modelos import modelos, YOLO_AVAILABLE
+from .inferencia_service import inferencia_service
+from . import backends_yolo
 
 class YoloService:
     """
     Clase YoloService según documentación (Clase --3)
     Atributos: -modelo: YOLO(best.py)
     Métodos: procesarImagen(file_path: str): str
+    El modelo se obtiene del registro compartido: se carga en el primer uso
+    y es el mismo objeto que usa el router QR. El backend (pytorch, onnx,
+    openvino) sale de YOLO_BACKEND salvo que se indique otro.
     """
     
-    def __init__(self, model_path: Optional[str] = None):
-        self.modelo = None
-        self.model_loaded = False
-        self.model_info = {}
+    def __init__(self, model_path: Optional[str] = None, backend: Optional[str] = None,
+                 int8: Optional[bool] = None):
         self.detection_history = []
         
         # Configurar rutas
@@ -44,38 +41,29 @@ class YoloService:
         self.results_dir.mkdir(exist_ok=True)
         self.static_dir.mkdir(exist_ok=True)
         
-        # Cargar modelo si está disponible
-        if YOLO_AVAILABLE:
-            self._cargar_modelo(model_path)
+        # Modelo del registro (best.pt en el backend configurado por defecto;
+        # otra ruta u otro backend se registran aparte)
+        self.nombre_modelo = "yolo"
+        if model_path or backend or int8 is not None:
+            ruta_pt = Path(model_path) if model_path else self.backend_dir / "best.pt"
+            self.backend, ruta = backends_yolo.resolver(ruta_pt, backend, int8)
+            self.nombre_modelo = f"yolo:{self.backend}:{ruta_pt}"
+            modelos.registrar(self.nombre_modelo, ruta, backend=self.backend)
+        else:
+            self.backend = modelos.info(self.nombre_modelo)["backend"]
     
-    def _cargar_modelo(self, model_path: Optional[str] = None):
-        """Cargar modelo YOLO"""
-        try:
-            if not model_path:
-                model_path = self.backend_dir / "best.pt"
-            
-            if not Path(model_path).exists():
-                print(f"❌ Archivo del modelo no encontrado: {model_path}")
-                return
-            
-            self.modelo = YOLO(str(model_path))
-            self.model_loaded = True
-            
-            # Obtener información del modelo
-            self.model_info = {
-                "model_path": str(model_path),
-                "model_size": Path(model_path).stat().st_size,
-                "loaded_at": datetime.now().isoformat(),
-                "classes": getattr(self.modelo, 'names', {}),
-                "model_type": "YOLO"
-            }
-            
-            print(f"✅ Modelo YOLO cargado desde {model_path}")
-            
-        except Exception as e:
-            print(f"❌ Error al cargar modelo YOLO: {e}")
-            self.modelo = None
-            self.model_loaded = False
+    @property
+    def modelo(self):
+        """Modelo YOLO compartido, cargado en el primer acceso"""
+        return modelos.obtener(self.nombre_modelo)
+    
+    @property
+    def model_loaded(self) -> bool:
+        return modelos.cargado(self.nombre_modelo)
+    
+    @property
+    def model_info(self) -> Dict[str, Any]:
+        return modelos.info(self.nombre_modelo)
     
     def procesarImagen(self, file_path: str) -> str:
         """
@@ -86,18 +74,17 @@ class YoloService:
             if not self.is_available():
                 return "Error: Servicio YOLO no disponible"
             
-            if not self.model_loaded:
-                return "Error: Modelo YOLO no cargado"
-            
             # Verificar que el archivo existe
             if not Path(file_path).exists():
                 return f"Error: Archivo no encontrado: {file_path}"
             
-            # Procesar imagen con YOLO
-            results = self.modelo(file_path)
+            # Procesar imagen con YOLO en el hilo de inferencia compartido
+            # (carga el modelo si aún no está en memoria)
+            results = inferencia_service.inferir_sincrono(file_path, self.nombre_modelo)
+            modelo = self.modelo
             
             # Procesar resultados
-            detections_info = self._extraer_detecciones(results)
+            detections_info = self._extraer_detecciones(results, modelo)
             
             # Crear imagen anotada
             result_path = self._crear_imagen_anotada(results, file_path)
@@ -127,7 +114,7 @@ class YoloService:
             print(f"❌ {error_msg}")
             return error_msg
     
-    def _extraer_detecciones(self, results) -> List[Dict[str, Any]]:
+    def _extraer_detecciones(self, results, modelo) -> List[Dict[str, Any]]:
         """Extraer información de las detecciones"""
         detections_info = []
         
@@ -138,7 +125,7 @@ class YoloService:
                     for i, box in enumerate(boxes):
                         confidence = float(box.conf[0])
                         class_id = int(box.cls[0])
-                        class_name = self.modelo.names[class_id] if hasattr(self.modelo, 'names') else f"Class_{class_id}"
+                        class_name = modelo.names[class_id] if hasattr(modelo, 'names') else f"Class_{class_id}"
                         
                         # Obtener coordenadas del bounding box
                         coords = box.xyxy[0].tolist()
@@ -227,14 +214,15 @@ class YoloService:
             return f"Error al crear string resultado: {str(e)}"
     
     def is_available(self) -> bool:
-        """Verificar si el servicio YOLO está disponible"""
-        return YOLO_AVAILABLE and self.model_loaded
+        """Verificar si el servicio YOLO está disponible (sin cargar el modelo)"""
+        return YOLO_AVAILABLE and modelos.disponible(self.nombre_modelo)
     
     def get_status(self) -> Dict[str, Any]:
         """Obtener estado del servicio YOLO"""
         return {
             "yolo_available": YOLO_AVAILABLE,
             "model_loaded": self.model_loaded,
+            "backend": self.backend,
             "model_info": self.model_info,
             "upload_dir_exists": self.upload_dir.exists(),
             "results_dir_exists": self.results_dir.exists(),
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark de etiquetas QR en lote.
+
+Pide ETIQUETAS etiquetas (repitiendo los productos activos con `copias` si
+hace falta) en cada formato y reporta el tiempo hasta el primer byte, el
+tiempo total y las etiquetas por segundo. El primer pedido arranca el pool
+de procesos, por eso se hace una solicitud de calentamiento.
+
+Requiere el servidor corriendo en localhost:8000 y la base de datos con
+los datos de ejemplo (usuario instructor 1001234567).
+
+Uso:
+    python benchmark_etiquetas.py          # 1000 etiquetas
+    python benchmark_etiquetas.py 3000
+"""
+
+import math
+import sys
+import time
+
+import requests
+
+BASE_URL = "http://localhost:8000"
+CREDENCIALES = {"documento": "1001234567", "password": "instructor123"}
+ETIQUETAS = 1000
+FORMATOS = ["pdf", "png", "zip"]
+
+def medir(headers, producto_ids, copias, formato):
+    """Descarga en streaming; devuelve (primer byte, total, bytes, etiquetas)"""
+    inicio = time.perf_counter()
+    primer_byte = None
+    tamano = 0
+    with requests.post(
+        f"{BASE_URL}/api/qr/etiquetas",
+        json={"producto_ids": producto_ids, "copias": copias, "formato": formato},
+        headers=headers, stream=True, timeout=300
+    ) as response:
+        response.raise_for_status()
+        for bloque in response.iter_content(chunk_size=65536):
+            if primer_byte is None:
+                primer_byte = time.perf_counter() - inicio
+            tamano += len(bloque)
+        etiquetas = int(response.headers.get("X-Total-Etiquetas", 0))
+    return primer_byte or 0.0, time.perf_counter() - inicio, tamano, etiquetas
+
+def main(cantidad):
+    print("🏷️  BENCHMARK DE ETIQUETAS QR")
+    print("=" * 50)
+
+    response = requests.post(f"{BASE_URL}/api/auth/login", json=CREDENCIALES, timeout=60)
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    productos = requests.get(f"{BASE_URL}/api/productos/", params={"limit": 1000}, headers=headers, timeout=60).json()
+    producto_ids = [p['id'] for p in productos][:cantidad]
+    if not producto_ids:
+        print("❌ No hay productos activos para generar etiquetas")
+        return False
+    copias = min(100, math.ceil(cantidad / len(producto_ids)))
+    print(f"   {len(producto_ids)} productos x {copias} copias\n")
+
+    # Calentamiento: arranca los procesos del pool
+    medir(headers, producto_ids[:1], 1, "zip")
+
+    for formato in FORMATOS:
+        primer_byte, total, tamano, etiquetas = medir(headers, producto_ids, copias, formato)
+        print(f"   {formato}: {etiquetas} etiquetas en {total:.2f} s "
+              f"({etiquetas / total:,.0f} etiquetas/s, primer byte {primer_byte * 1000:.0f} ms, "
+              f"{tamano / 1024 / 1024:.1f} MB)")
+
+    estado = requests.get(f"{BASE_URL}/api/qr/status", timeout=60).json()
+    print(f"\n🏁 Pool de etiquetas: {estado.get('etiquetas')}")
+    return True
+
+if __name__ == "__main__":
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else ETIQUETAS
+    sys.exit(0 if main(cantidad) else 1)
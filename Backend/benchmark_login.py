@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark de throughput de login.
+
+Simula el inicio de clase: CONCURRENCIA aprendices haciendo login a la vez,
+LOGINS en total. Reporta logins por segundo, latencias p50/p95/p99 y cuántas
+solicitudes fueron rechazadas con 503 por la cola de hashing llena.
+
+Requiere el servidor corriendo en localhost:8000 y la base de datos con
+los datos de ejemplo (usuario instructor 1001234567).
+
+Uso:
+    python benchmark_login.py                  # 200 logins, 40 concurrentes
+    python benchmark_login.py 500 80           # logins y concurrencia
+"""
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BASE_URL = "http://localhost:8000"
+CREDENCIALES = {"documento": "1001234567", "password": "instructor123"}
+LOGINS = 200
+CONCURRENCIA = 40
+
+def percentil(valores, p):
+    """Percentil p (0-100) de una lista ordenada"""
+    if not valores:
+        return 0.0
+    indice = min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))
+    return valores[indice]
+
+def hacer_login(sesion):
+    """Un login; devuelve (código HTTP, segundos)"""
+    inicio = time.perf_counter()
+    response = sesion.post(f"{BASE_URL}/api/auth/login", json=CREDENCIALES, timeout=60)
+    return response.status_code, time.perf_counter() - inicio
+
+def benchmark(logins, concurrencia):
+    print("🔐 BENCHMARK DE LOGIN")
+    print("=" * 50)
+    print(f"   {logins} logins con {concurrencia} clientes concurrentes")
+
+    # Calentar: el primer login abre conexiones e inicializa el pool de hashing
+    requests.post(f"{BASE_URL}/api/auth/login", json=CREDENCIALES, timeout=60).raise_for_status()
+
+    sesiones = [requests.Session() for _ in range(concurrencia)]
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as executor:
+        resultados = list(executor.map(lambda i: hacer_login(sesiones[i % concurrencia]), range(logins)))
+    duracion = time.perf_counter() - inicio
+
+    exitosos = sorted(t for codigo, t in resultados if codigo == 200)
+    rechazados = sum(1 for codigo, _ in resultados if codigo == 503)
+    otros = len(resultados) - len(exitosos) - rechazados
+
+    print(f"\n⏱️  {duracion:.2f}s en total, {len(exitosos) / duracion:.1f} logins/s")
+    print(f"   ✅ Exitosos: {len(exitosos)}")
+    print(f"   ⏳ Rechazados con 503 (cola de hashing llena): {rechazados}")
+    print(f"   ❌ Otros códigos: {otros}")
+    print(f"   📊 p50 {percentil(exitosos, 50) * 1000:.0f} ms | "
+          f"p95 {percentil(exitosos, 95) * 1000:.0f} ms | "
+          f"p99 {percentil(exitosos, 99) * 1000:.0f} ms")
+
+    salud = requests.get(f"{BASE_URL}/health", timeout=5).json()
+    if "hashing" in salud:
+        print(f"   🧮 Pool de hashing: {salud['hashing']}")
+
+    return otros == 0
+
+if __name__ == "__main__":
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else LOGINS
+    concurrencia = int(sys.argv[2]) if len(sys.argv) > 2 else CONCURRENCIA
+    sys.exit(0 if benchmark(logins, concurrencia) else 1)
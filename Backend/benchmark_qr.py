@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark de resolución de códigos QR.
+
+Compara escaneos por segundo resolviendo con consultas directas a la base
+(una o más por escaneo, como antes) contra el índice en memoria del catálogo
+(catalogo_service), con una mezcla de QR por ID, código, URL, JSON y
+contenido compacto firmado.
+
+Requiere la base de datos configurada en .env con productos cargados.
+
+Uso:
+    python benchmark_qr.py            # 5000 escaneos
+    python benchmark_qr.py 20000
+"""
+
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import execute_query
+from app.services.catalogo_service import catalogo_service
+from app.services import qr_payload
+
+ESCANEOS = 5000
+
+def generar_qrs(productos, cantidad):
+    """Mezcla de contenidos de QR como los que se imprimen en las etiquetas"""
+    formatos = [
+        lambda p: str(p['id']),
+        lambda p: p['codigo'],
+        lambda p: f"http://192.168.1.10:8000/api/productos/{p['id']}",
+        lambda p: json.dumps({"producto_id": p['id']}),
+        lambda p: qr_payload.codificar('producto', p['id']),
+    ]
+    return [random.choice(formatos)(random.choice(productos)) for _ in range(cantidad)]
+
+def resolver_con_consultas(qr):
+    """Resolución anterior: una consulta por cada interpretación del QR"""
+    compacto = qr_payload.decodificar(qr)
+    if compacto:
+        return execute_query("SELECT * FROM productos WHERE id = %s AND activo = TRUE", (compacto[1],), fetch_one=True)
+    if qr.isdigit():
+        producto = execute_query("SELECT * FROM productos WHERE id = %s AND activo = TRUE", (int(qr),), fetch_one=True)
+        if producto:
+            return producto
+    producto = execute_query("SELECT * FROM productos WHERE codigo = %s AND activo = TRUE", (qr,), fetch_one=True)
+    if producto:
+        return producto
+    if qr.startswith('http'):
+        producto_id = int(qr.rsplit('/', 1)[-1])
+        return execute_query("SELECT * FROM productos WHERE id = %s AND activo = TRUE", (producto_id,), fetch_one=True)
+    if qr.startswith('{'):
+        producto_id = json.loads(qr)['producto_id']
+        return execute_query("SELECT * FROM productos WHERE id = %s AND activo = TRUE", (producto_id,), fetch_one=True)
+    return None
+
+def medir(nombre, resolver, qrs):
+    inicio = time.perf_counter()
+    resueltos = sum(1 for qr in qrs if resolver(qr))
+    duracion = time.perf_counter() - inicio
+    print(f"   {nombre}: {len(qrs) / duracion:,.0f} escaneos/s "
+          f"({duracion * 1e6 / len(qrs):.1f} µs por escaneo, {resueltos}/{len(qrs)} resueltos)")
+    return len(qrs) / duracion
+
+def main(escaneos):
+    print("📷 BENCHMARK DE RESOLUCIÓN DE QR")
+    print("=" * 50)
+
+    productos = execute_query("SELECT id, codigo FROM productos WHERE activo = TRUE", fetch_all=True)
+    if not productos:
+        print("❌ No hay productos activos para generar QR")
+        return False
+
+    qrs = generar_qrs(productos, escaneos)
+    print(f"   {len(productos)} productos activos, {escaneos} escaneos\n")
+
+    # El primer acceso carga el índice completo
+    inicio = time.perf_counter()
+    catalogo_service.recargar()
+    print(f"   Carga inicial del índice: {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+    directo = medir("Consultas directas", resolver_con_consultas, qrs)
+    indice = medir("Índice del catálogo", lambda qr: catalogo_service.resolver(qr)[0], qrs)
+
+    print(f"\n🏁 Aceleración: {indice / directo:.1f}x")
+    print(f"   Estado del índice: {catalogo_service.stats()}")
+    return True
+
+if __name__ == "__main__":
+    escaneos = int(sys.argv[1]) if len(sys.argv) > 1 else ESCANEOS
+    sys.exit(0 if main(escaneos) else 1)
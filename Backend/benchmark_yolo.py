@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Benchmark de los backends de inferencia YOLO en CPU.
+
+Carga best.pt con PyTorch y cada modelo exportado con exportar_modelo.py
+(ONNX Runtime y OpenVINO, FP32 e INT8) que tenga su runtime instalado, y
+procesa las mismas imágenes con cada uno. Reporta:
+
+- latencia por imagen (p50 / p95) y fotos por segundo en lotes de LOTE,
+  como los arma la cola de inferencia de upload_photo;
+- precisión frente a PyTorch: no hay etiquetas de referencia, así que las
+  detecciones de best.pt son la referencia. Una detección coincide si es
+  de la misma clase con IoU >= 0.5; se reporta recall, precisión y la
+  diferencia media de confianza de las coincidencias.
+
+No necesita el servidor. Por defecto usa las fotos de uploads/.
+
+Uso:
+    python benchmark_yolo.py
+    python benchmark_yolo.py ruta/a/imagenes
+"""
+
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import cv2
+
+# Agregar el directorio actual al path para importar módulos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.backends_yolo import BACKENDS, nombre_backend, ruta_backend, runtime_disponible
+
+BACKEND_DIR = Path(__file__).resolve().parent
+MODELO_PT = BACKEND_DIR / "best.pt"
+MAX_IMAGENES = 50
+LOTE = 8
+IOU_MINIMO = 0.5
+EXTENSIONES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+def candidatos():
+    """(nombre, ruta) de cada backend con su modelo exportado y su runtime instalado"""
+    for backend in BACKENDS:
+        for int8 in ((False,) if backend == "pytorch" else (False, True)):
+            ruta = ruta_backend(MODELO_PT, backend, int8)
+            nombre = nombre_backend(backend, int8)
+            if not ruta.exists():
+                print(f"   ⏭️  {nombre}: sin modelo exportado ({ruta.name})")
+            elif not runtime_disponible(backend):
+                print(f"   ⏭️  {nombre}: runtime no instalado")
+            else:
+                yield nombre, ruta
+
+def detecciones(resultado):
+    """Lista de (clase, confianza, caja xyxy) de un resultado de ultralytics"""
+    boxes = resultado.boxes
+    if boxes is None or len(boxes) == 0:
+        return []
+    return list(zip(boxes.cls.int().tolist(), boxes.conf.tolist(), boxes.xyxy.tolist()))
+
+def iou(a, b):
+    ancho = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    alto = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    interseccion = ancho * alto
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - interseccion
+    return interseccion / union if union > 0 else 0.0
+
+def comparar(referencia, obtenidas):
+    """Emparejar por clase e IoU (mejor primero); devuelve (coincidencias, diferencias de confianza)"""
+    pares = sorted(
+        ((iou(r[2], o[2]), i, j) for i, r in enumerate(referencia) for j, o in enumerate(obtenidas)
+         if r[0] == o[0]),
+        reverse=True
+    )
+    usadas_r, usadas_o, diferencias = set(), set(), []
+    for valor, i, j in pares:
+        if valor < IOU_MINIMO:
+            break
+        if i in usadas_r or j in usadas_o:
+            continue
+        usadas_r.add(i)
+        usadas_o.add(j)
+        diferencias.append(abs(referencia[i][1] - obtenidas[j][1]))
+    return len(diferencias), diferencias
+
+def medir(modelo, imagenes):
+    """Latencias por imagen (ms), fotos/s en lotes y detecciones de cada imagen"""
+    # Calentamiento: la primera inferencia compila/reserva memoria
+    modelo(imagenes[:1], verbose=False)
+    modelo(imagenes[:LOTE], verbose=False)
+
+    latencias, resultados = [], []
+    for imagen in imagenes:
+        inicio = time.perf_counter()
+        resultado = modelo([imagen], verbose=False)[0]
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        resultados.append(detecciones(resultado))
+
+    inicio = time.perf_counter()
+    for i in range(0, len(imagenes), LOTE):
+        modelo(imagenes[i:i + LOTE], verbose=False)
+    por_segundo = len(imagenes) / (time.perf_counter() - inicio)
+    return latencias, por_segundo, resultados
+
+def main(directorio):
+    print("🧠 BENCHMARK DE BACKENDS YOLO")
+    print("=" * 50)
+
+    try:
+        from ultralytics import YOLO
+    except ImportError:
+        print("❌ ultralytics no está instalado")
+        return False
+    if not MODELO_PT.exists():
+        print(f"❌ No se encontró {MODELO_PT}")
+        return False
+
+    rutas = sorted(p for p in directorio.iterdir() if p.suffix.lower() in EXTENSIONES)[:MAX_IMAGENES] \
+        if directorio.is_dir() else []
+    imagenes = [imagen for imagen in (cv2.imread(str(ruta)) for ruta in rutas) if imagen is not None]
+    if not imagenes:
+        print(f"❌ No hay imágenes en {directorio}")
+        return False
+    print(f"   {len(imagenes)} imágenes de {directorio}, lotes de {LOTE}\n")
+
+    referencia = None
+    for nombre, ruta in candidatos():
+        modelo = YOLO(str(ruta)) if ruta.suffix == ".pt" else YOLO(str(ruta), task="detect")
+        latencias, por_segundo, resultados = medir(modelo, imagenes)
+        latencias.sort()
+        p50 = latencias[len(latencias) // 2]
+        p95 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))]
+        linea = f"   {nombre:14} p50 {p50:7.1f} ms   p95 {p95:7.1f} ms   {por_segundo:6.1f} fotos/s (lote)"
+
+        if referencia is None:
+            # El primero es siempre PyTorch (best.pt): sus detecciones son la referencia
+            referencia = resultados
+            total = sum(len(r) for r in referencia)
+            linea += f"   {total} detecciones (referencia)"
+        else:
+            coincidencias, diferencias, total_ref, total_obt = 0, [], 0, 0
+            for esperadas, obtenidas in zip(referencia, resultados):
+                n, d = comparar(esperadas, obtenidas)
+                coincidencias += n
+                diferencias += d
+                total_ref += len(esperadas)
+                total_obt += len(obtenidas)
+            recall = coincidencias / total_ref if total_ref else 1.0
+            precision = coincidencias / total_obt if total_obt else 1.0
+            delta = statistics.mean(diferencias) if diferencias else 0.0
+            linea += f"   recall {recall:.1%}  precisión {precision:.1%}  Δconf {delta:.3f}"
+        print(linea)
+        del modelo
+
+    print("\n🏁 Elegir el backend con YOLO_BACKEND y YOLO_INT8 (ver README)")
+    return referencia is not None
+
+if __name__ == "__main__":
+    directorio = Path(sys.argv[1]) if len(sys.argv) > 1 else BACKEND_DIR / "uploads"
+    sys.exit(0 if main(directorio) else 1)
@@ -27,11 +27,16 @@ CREATE TABLE IF NOT EXISTS productos (
     categoria VARCHAR(100),
     unidad_medida VARCHAR(20) DEFAULT 'unidad',
     stock_minimo INT DEFAULT 0,
-    stock_actual INT DEFAULT 0,
+    stock_actual INT NOT NULL DEFAULT 0,
     es_material_formacion BOOLEAN DEFAULT FALSE,
     activo BOOLEAN DEFAULT TRUE,
     fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_productos_nombre (nombre, id),
+    INDEX idx_productos_activo_nombre (activo, nombre, id),
+    INDEX idx_productos_categoria (categoria, nombre, id),
+    INDEX idx_productos_material (es_material_formacion, activo, nombre),
+    INDEX idx_productos_actualizacion (fecha_actualizacion)
 );
 
 -- Crear tabla de lotes
@@ -51,7 +56,10 @@ CREATE TABLE IF NOT EXISTS lotes (
     fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (producto_id) REFERENCES productos(id) ON DELETE CASCADE,
-    UNIQUE KEY unique_lote (producto_id, numero_lote)
+    UNIQUE KEY unique_lote (producto_id, numero_lote),
+    INDEX idx_lotes_activo_vencimiento (activo, fecha_vencimiento),
+    INDEX idx_lotes_estado (estado, activo),
+    INDEX idx_lotes_producto_activo (producto_id, activo)
 );
 
 -- Crear tabla de movimientos
@@ -65,7 +73,11 @@ CREATE TABLE IF NOT EXISTS movimientos (
     observaciones TEXT,
     fecha_movimiento TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (lote_id) REFERENCES lotes(id) ON DELETE CASCADE,
-    FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+    FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE,
+    INDEX idx_movimientos_fecha (fecha_movimiento, id),
+    INDEX idx_movimientos_usuario_fecha (usuario_id, fecha_movimiento, id),
+    INDEX idx_movimientos_tipo_fecha (tipo, fecha_movimiento, id),
+    INDEX idx_movimientos_lote_fecha (lote_id, fecha_movimiento, id)
 );
 
 -- Crear tabla de alertas
@@ -80,23 +92,67 @@ CREATE TABLE IF NOT EXISTS alertas (
     fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     fecha_atencion TIMESTAMP NULL,
     FOREIGN KEY (producto_id) REFERENCES productos(id) ON DELETE CASCADE,
-    FOREIGN KEY (lote_id) REFERENCES lotes(id) ON DELETE CASCADE
+    FOREIGN KEY (lote_id) REFERENCES lotes(id) ON DELETE CASCADE,
+    INDEX idx_alertas_atendida_fecha (atendida, fecha_creacion, id),
+    INDEX idx_alertas_fecha (fecha_creacion, id)
+);
+
+-- Tokens OAuth2 (refresh tokens y códigos de autorización) indexados por su SHA-256
+CREATE TABLE IF NOT EXISTS oauth_tokens (
+    token_hash CHAR(64) PRIMARY KEY,
+    tipo ENUM('refresh', 'codigo') NOT NULL,
+    datos JSON NOT NULL,
+    expires_at DOUBLE NOT NULL,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_oauth_tokens_expira (expires_at)
 );
 
--- Crear triggers para actualizar stock automáticamente
+-- Triggers que mantienen productos.stock_actual por diferencias:
+-- cada cambio en un lote suma o resta solo su variación
 DELIMITER $$
 
-CREATE TRIGGER IF NOT EXISTS actualizar_stock_producto
+DROP TRIGGER IF EXISTS actualizar_stock_producto$$
+
+CREATE TRIGGER IF NOT EXISTS stock_lote_insertado
+AFTER INSERT ON lotes
+FOR EACH ROW
+BEGIN
+    IF NEW.activo THEN
+        UPDATE productos
+        SET stock_actual = stock_actual + NEW.cantidad_disponible
+        WHERE id = NEW.producto_id;
+    END IF;
+END$$
+
+CREATE TRIGGER IF NOT EXISTS stock_lote_actualizado
 AFTER UPDATE ON lotes
 FOR EACH ROW
 BEGIN
-    UPDATE productos 
-    SET stock_actual = (
-        SELECT COALESCE(SUM(cantidad_disponible), 0)
-        FROM lotes 
-        WHERE producto_id = NEW.producto_id AND activo = TRUE
-    )
-    WHERE id = NEW.producto_id;
+    DECLARE anterior INT DEFAULT 0;
+    DECLARE nuevo INT DEFAULT 0;
+    IF OLD.activo THEN
+        SET anterior = OLD.cantidad_disponible;
+    END IF;
+    IF NEW.activo THEN
+        SET nuevo = NEW.cantidad_disponible;
+    END IF;
+    IF OLD.producto_id <> NEW.producto_id THEN
+        UPDATE productos SET stock_actual = stock_actual - anterior WHERE id = OLD.producto_id;
+        UPDATE productos SET stock_actual = stock_actual + nuevo WHERE id = NEW.producto_id;
+    ELSEIF nuevo <> anterior THEN
+        UPDATE productos SET stock_actual = stock_actual + (nuevo - anterior) WHERE id = NEW.producto_id;
+    END IF;
+END$$
+
+CREATE TRIGGER IF NOT EXISTS stock_lote_eliminado
+AFTER DELETE ON lotes
+FOR EACH ROW
+BEGIN
+    IF OLD.activo THEN
+        UPDATE productos
+        SET stock_actual = stock_actual - OLD.cantidad_disponible
+        WHERE id = OLD.producto_id;
+    END IF;
 END$$
 
 CREATE TRIGGER IF NOT EXISTS actualizar_estado_lote
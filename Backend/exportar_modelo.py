@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Exportar best.pt a los backends de inferencia para CPU.
+
+Genera junto a best.pt:
+    best.onnx                    ONNX Runtime, FP32
+    best_int8.onnx               ONNX Runtime, INT8 (cuantización estática QDQ)
+    best_openvino_model/         OpenVINO, FP32
+    best_int8_openvino_model/    OpenVINO, INT8 (a partir de best_int8.onnx)
+
+Los modelos se exportan con batch dinámico para que la cola de inferencia
+pueda seguir enviando micro-lotes. La cuantización INT8 se calibra con fotos
+reales (por defecto las de uploads/); la cabeza de detección queda en FP32
+para no perder precisión en las cajas. Se omite lo que no tenga su runtime
+instalado (onnx + onnxruntime, openvino).
+
+Después de exportar, elegir el backend con YOLO_BACKEND=onnx|openvino (y
+YOLO_INT8=True para la variante cuantizada) y comparar con benchmark_yolo.py.
+
+Uso:
+    python exportar_modelo.py                    # calibra con uploads/
+    python exportar_modelo.py ruta/a/imagenes
+"""
+
+import os
+import re
+import shutil
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# Agregar el directorio actual al path para importar módulos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.backends_yolo import ruta_backend, runtime_disponible
+
+BACKEND_DIR = Path(__file__).resolve().parent
+MODELO_PT = BACKEND_DIR / "best.pt"
+TAMANO = 640
+IMAGENES_CALIBRACION = 100
+EXTENSIONES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+def listar_imagenes(directorio: Path, maximo: int):
+    return sorted(p for p in directorio.iterdir() if p.suffix.lower() in EXTENSIONES)[:maximo]
+
+def preprocesar(ruta: Path, tamano: int = TAMANO) -> np.ndarray:
+    """Mismo preprocesado que ultralytics: letterbox con gris 114, RGB, 0-1, NCHW"""
+    imagen = cv2.imread(str(ruta))
+    alto, ancho = imagen.shape[:2]
+    escala = min(tamano / alto, tamano / ancho)
+    nuevo_alto, nuevo_ancho = round(alto * escala), round(ancho * escala)
+    imagen = cv2.resize(imagen, (nuevo_ancho, nuevo_alto), interpolation=cv2.INTER_LINEAR)
+    arriba = (tamano - nuevo_alto) // 2
+    izquierda = (tamano - nuevo_ancho) // 2
+    lienzo = np.full((tamano, tamano, 3), 114, dtype=np.uint8)
+    lienzo[arriba:arriba + nuevo_alto, izquierda:izquierda + nuevo_ancho] = imagen
+    lienzo = lienzo[:, :, ::-1].transpose(2, 0, 1)
+    return np.ascontiguousarray(lienzo, dtype=np.float32)[None] / 255.0
+
+def exportar_onnx(modelo) -> Path:
+    destino = ruta_backend(MODELO_PT, "onnx")
+    salida = Path(modelo.export(format="onnx", dynamic=True, simplify=True, imgsz=TAMANO))
+    if salida != destino:
+        shutil.move(str(salida), destino)
+    return destino
+
+def exportar_onnx_int8(onnx_fp32: Path, imagenes) -> Path:
+    import onnx
+    from onnxruntime.quantization import (
+        CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    )
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    destino = ruta_backend(MODELO_PT, "onnx", int8=True)
+    preparado = onnx_fp32.with_name(f"{onnx_fp32.stem}_preparado.onnx")
+    quant_pre_process(str(onnx_fp32), str(preparado), skip_symbolic_shape=True)
+    grafo = onnx.load(str(preparado)).graph
+    entrada = grafo.input[0].name
+
+    class Calibracion(CalibrationDataReader):
+        def __init__(self):
+            self._imagenes = iter(imagenes)
+
+        def get_next(self):
+            ruta = next(self._imagenes, None)
+            return None if ruta is None else {entrada: preprocesar(ruta)}
+
+    # La cabeza de detección (el último bloque /model.N/) se deja en FP32:
+    # cuantizar la decodificación de cajas y las probabilidades cuesta precisión
+    bloques = [int(m.group(1)) for nodo in grafo.node
+               for m in [re.match(r"/model\.(\d+)/", nodo.name)] if m]
+    cabeza = f"/model.{max(bloques)}/" if bloques else None
+    excluir = [nodo.name for nodo in grafo.node if cabeza and nodo.name.startswith(cabeza)]
+
+    try:
+        quantize_static(
+            str(preparado), str(destino), Calibracion(),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+            nodes_to_exclude=excluir
+        )
+    finally:
+        preparado.unlink(missing_ok=True)
+
+    # ultralytics lee los nombres de las clases, el stride y el tamaño de
+    # entrada de los metadatos del ONNX: copiarlos al modelo cuantizado
+    cuantizado = onnx.load(str(destino))
+    del cuantizado.metadata_props[:]
+    cuantizado.metadata_props.extend(onnx.load(str(onnx_fp32)).metadata_props)
+    onnx.save(cuantizado, str(destino))
+    return destino
+
+def exportar_openvino(modelo) -> Path:
+    destino = ruta_backend(MODELO_PT, "openvino")
+    salida = Path(modelo.export(format="openvino", dynamic=True, half=False, imgsz=TAMANO))
+    if salida != destino:
+        shutil.rmtree(destino, ignore_errors=True)
+        shutil.move(str(salida), destino)
+    return destino
+
+def exportar_openvino_int8(onnx_int8: Path, openvino_fp32: Path) -> Path:
+    """OpenVINO ejecuta en INT8 los nodos QDQ del ONNX cuantizado"""
+    import openvino as ov
+
+    destino = ruta_backend(MODELO_PT, "openvino", int8=True)
+    destino.mkdir(exist_ok=True)
+    ov.save_model(ov.convert_model(str(onnx_int8)), str(destino / f"{MODELO_PT.stem}_int8.xml"),
+                  compress_to_fp16=False)
+    # metadata.yaml (clases, stride, tamaño) de la exportación FP32
+    shutil.copy(openvino_fp32 / "metadata.yaml", destino / "metadata.yaml")
+    return destino
+
+def main(directorio_calibracion: Path):
+    print("📦 EXPORTACIÓN DEL MODELO YOLO")
+    print("=" * 50)
+
+    if not MODELO_PT.exists():
+        print(f"❌ No se encontró {MODELO_PT}")
+        return False
+    try:
+        from ultralytics import YOLO
+    except ImportError:
+        print("❌ ultralytics no está instalado")
+        return False
+
+    imagenes = listar_imagenes(directorio_calibracion, IMAGENES_CALIBRACION) if directorio_calibracion.is_dir() else []
+    if not imagenes:
+        print(f"⚠️  Sin imágenes de calibración en {directorio_calibracion}: no se generan modelos INT8")
+
+    modelo = YOLO(str(MODELO_PT))
+    exportados = []
+    onnx_int8 = None
+
+    if runtime_disponible("onnx"):
+        onnx_fp32 = exportar_onnx(modelo)
+        exportados.append(onnx_fp32)
+        if imagenes:
+            print(f"   Calibrando INT8 con {len(imagenes)} imágenes de {directorio_calibracion}...")
+            onnx_int8 = exportar_onnx_int8(onnx_fp32, imagenes)
+            exportados.append(onnx_int8)
+    else:
+        print("⚠️  onnxruntime no está instalado: se omite ONNX")
+
+    if runtime_disponible("openvino"):
+        openvino_fp32 = exportar_openvino(modelo)
+        exportados.append(openvino_fp32)
+        if onnx_int8 is not None:
+            exportados.append(exportar_openvino_int8(onnx_int8, openvino_fp32))
+    else:
+        print("⚠️  openvino no está instalado: se omite OpenVINO")
+
+    for ruta in exportados:
+        print(f"   ✅ {ruta.name}")
+    print("\n🏁 Elegir el backend con YOLO_BACKEND (onnx, openvino) y YOLO_INT8; comparar con benchmark_yolo.py")
+    return bool(exportados)
+
+if __name__ == "__main__":
+    directorio = Path(sys.argv[1]) if len(sys.argv) > 1 else BACKEND_DIR / "uploads"
+    sys.exit(0 if main(directorio) else 1)
@@ -12,6 +12,7 @@ from dotenv import load_dotenv
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app.database import init_database, execute_query
+from app.migraciones import aplicar_migraciones
 
 def main():
     """Función principal para inicializar la base de datos"""
@@ -27,6 +28,13 @@ def main():
         if success:
             print("✅ Base de datos inicializada correctamente")
             
+            # Aplicar migraciones pendientes (índices, cambios de esquema)
+            aplicadas = aplicar_migraciones()
+            if aplicadas:
+                print(f"✅ Migraciones aplicadas: {', '.join(map(str, aplicadas))}")
+            else:
+                print("✅ Esquema al día, sin migraciones pendientes")
+            
             # Verificar que las tablas se crearon
             tables = execute_query("SHOW TABLES", fetch_all=True)
             print(f"📋 Tablas creadas: {len(tables)}")
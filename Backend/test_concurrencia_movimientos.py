@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Prueba de estrés: salidas concurrentes sobre un mismo lote.
+
+Crea un lote con STOCK_INICIAL unidades y dispara SALIDAS solicitudes
+concurrentes de 1 unidad. Con el descuento atómico deben aceptarse
+exactamente STOCK_INICIAL salidas, el resto debe responder 400 y el
+saldo final del lote debe quedar en 0.
+
+Requiere el servidor corriendo en localhost:8000 y la base de datos con
+los datos de ejemplo (usuario instructor 1001234567).
+"""
+
+import sys
+import time
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from app.routers.auth import create_access_token
+
+BASE_URL = "http://localhost:8000"
+STOCK_INICIAL = 100
+SALIDAS = 300
+HILOS = 50
+
+def obtener_headers():
+    """Login con el usuario de ejemplo y token JWT para los endpoints protegidos"""
+    response = requests.post(
+        f"{BASE_URL}/api/auth/login",
+        json={"documento": "1001234567", "password": "instructor123"},
+        timeout=5
+    )
+    response.raise_for_status()
+    token = create_access_token(data={"sub": str(response.json()["user_id"])})
+    return {"Authorization": f"Bearer {token}"}
+
+def crear_lote(headers):
+    """Crear un lote de prueba sobre el primer producto disponible"""
+    productos = requests.get(f"{BASE_URL}/api/productos/", headers=headers, timeout=5).json()
+    if not productos:
+        raise RuntimeError("No hay productos para crear el lote de prueba")
+
+    lote = {
+        "producto_id": productos[0]["id"],
+        "numero_lote": f"STRESS-{int(time.time())}",
+        "fecha_ingreso": date.today().isoformat(),
+        "cantidad_inicial": STOCK_INICIAL,
+        "cantidad_disponible": STOCK_INICIAL,
+        "observaciones": "Lote de prueba de concurrencia"
+    }
+    response = requests.post(f"{BASE_URL}/api/lotes/", json=lote, headers=headers, timeout=5)
+    response.raise_for_status()
+    return response.json()["id"]
+
+def registrar_salida(lote_id, headers):
+    """Registrar una salida de 1 unidad; devuelve el código HTTP"""
+    response = requests.post(
+        f"{BASE_URL}/api/movimientos/",
+        json={"lote_id": lote_id, "tipo": "salida", "cantidad": 1, "motivo": "stress"},
+        headers=headers,
+        timeout=30
+    )
+    return response.status_code
+
+def test_salidas_concurrentes():
+    """Dispara salidas concurrentes y verifica el saldo final"""
+    print("🚀 PRUEBA DE CONCURRENCIA EN MOVIMIENTOS")
+    print("=" * 50)
+
+    headers = obtener_headers()
+    lote_id = crear_lote(headers)
+    print(f"📦 Lote {lote_id} creado con {STOCK_INICIAL} unidades")
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=HILOS) as executor:
+        codigos = list(executor.map(lambda _: registrar_salida(lote_id, headers), range(SALIDAS)))
+    duracion = time.perf_counter() - inicio
+
+    aceptadas = codigos.count(200)
+    rechazadas = codigos.count(400)
+    otros = len(codigos) - aceptadas - rechazadas
+    print(f"⏱️  {SALIDAS} salidas en {duracion:.2f}s ({SALIDAS / duracion:.1f} req/s)")
+    print(f"   ✅ Aceptadas: {aceptadas}")
+    print(f"   🚫 Rechazadas por stock: {rechazadas}")
+    print(f"   ❌ Otros códigos: {otros}")
+
+    lote = requests.get(f"{BASE_URL}/api/lotes/{lote_id}", headers=headers, timeout=5).json()
+    movimientos = requests.get(
+        f"{BASE_URL}/api/movimientos/",
+        params={"lote_id": lote_id, "tipo": "salida", "limit": 1000},
+        headers=headers,
+        timeout=5
+    ).json()
+    print(f"   📊 Saldo final: {lote['cantidad_disponible']}")
+    print(f"   📊 Movimientos de salida registrados: {len(movimientos)}")
+
+    errores = []
+    if aceptadas != STOCK_INICIAL:
+        errores.append(f"se aceptaron {aceptadas} salidas, se esperaban {STOCK_INICIAL}")
+    if otros:
+        errores.append(f"{otros} respuestas con códigos inesperados")
+    if lote["cantidad_disponible"] != 0:
+        errores.append(f"saldo final {lote['cantidad_disponible']}, se esperaba 0")
+    if len(movimientos) != aceptadas:
+        errores.append(f"{len(movimientos)} movimientos registrados para {aceptadas} salidas aceptadas")
+
+    print("\n" + "=" * 50)
+    if errores:
+        for error in errores:
+            print(f"❌ {error}")
+        return False
+
+    print("🏁 PRUEBA SUPERADA: sin sobreventa ni pérdidas de stock")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_salidas_concurrentes() else 1)
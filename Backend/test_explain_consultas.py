@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Verificación de planes de ejecución (EXPLAIN) de las consultas de los routers.
+
+Siembra datos sintéticos en volumen (productos con código EXPLAIN-*), ejecuta
+EXPLAIN sobre las consultas de listado y filtrado que usan los routers y
+falla si alguna recorre completa (type = ALL) una tabla grande. Al terminar
+elimina los datos sembrados.
+
+Uso:
+    python init_db.py                 # aplica las migraciones con los índices
+    python test_explain_consultas.py  # siembra, verifica y limpia
+    python test_explain_consultas.py --sin-sembrar   # usar los datos existentes
+"""
+
+import os
+import random
+import sys
+from datetime import date, datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.paginacion import codificar_cursor
+from app.database import execute_query, transaccion, DB_CONFIG
+from app.routers import alertas, lotes, movimientos, productos
+from app.services.catalogo_service import CONSULTA_REFRESCO
+
+PREFIJO = "EXPLAIN-"
+PRODUCTOS = 2000
+LOTES_POR_PRODUCTO = 3
+MOVIMIENTOS = 50000
+ALERTAS = 5000
+LOTE_INSERCION = 5000
+
+# Un escaneo completo por debajo de este número de filas estimadas no se considera falla
+UMBRAL_FILAS = 1000
+
+def sembrar_datos():
+    """Insertar datos sintéticos en volumen para que el optimizador use los índices"""
+    print("🌱 Sembrando datos de prueba...")
+    usuarios = [u['id'] for u in execute_query("SELECT id FROM usuarios", fetch_all=True)]
+    if not usuarios:
+        raise RuntimeError("Se necesita al menos un usuario (ejecute init_db.py y db/schema.sql)")
+
+    hoy = date.today()
+    with transaccion() as db:
+        db.executemany(
+            """INSERT INTO productos (codigo, nombre, categoria, stock_minimo, es_material_formacion, activo)
+               VALUES (%s, %s, %s, %s, %s, %s)""",
+            [
+                (f"{PREFIJO}{i}", f"{PREFIJO}Producto {i:05d}", f"{PREFIJO}cat-{i % 50}",
+                 random.randint(0, 20), i % 5 == 0, i % 10 != 0)
+                for i in range(PRODUCTOS)
+            ]
+        )
+        productos = [p['id'] for p in db.execute(
+            "SELECT id FROM productos WHERE codigo LIKE %s", (f"{PREFIJO}%",), fetch_all=True
+        )]
+
+        lotes = []
+        for producto_id in productos:
+            for n in range(LOTES_POR_PRODUCTO):
+                cantidad = random.randint(0, 200)
+                vencimiento = hoy + timedelta(days=random.randint(-60, 900))
+                lotes.append((producto_id, f"{PREFIJO}{producto_id}-{n}", hoy - timedelta(days=random.randint(0, 365)),
+                              vencimiento, cantidad, cantidad, random.random() > 0.05))
+        db.executemany(
+            """INSERT INTO lotes (producto_id, numero_lote, fecha_ingreso, fecha_vencimiento,
+                                  cantidad_inicial, cantidad_disponible, activo)
+               VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+            lotes
+        )
+        lote_ids = [l['id'] for l in db.execute(
+            "SELECT id FROM lotes WHERE numero_lote LIKE %s", (f"{PREFIJO}%",), fetch_all=True
+        )]
+
+    tipos = ["entrada", "salida", "ajuste"]
+    for inicio in range(0, MOVIMIENTOS, LOTE_INSERCION):
+        with transaccion() as db:
+            db.executemany(
+                """INSERT INTO movimientos (lote_id, usuario_id, tipo, cantidad, motivo, fecha_movimiento)
+                   VALUES (%s, %s, %s, %s, %s, NOW() - INTERVAL %s MINUTE)""",
+                [
+                    (random.choice(lote_ids), random.choice(usuarios), random.choice(tipos),
+                     random.randint(1, 10), PREFIJO, random.randint(0, 525600))
+                    for _ in range(inicio, min(inicio + LOTE_INSERCION, MOVIMIENTOS))
+                ]
+            )
+
+    with transaccion() as db:
+        db.executemany(
+            """INSERT INTO alertas (tipo, producto_id, mensaje, atendida, fecha_creacion)
+               VALUES ('stock_bajo', %s, %s, %s, NOW() - INTERVAL %s MINUTE)""",
+            [
+                (random.choice(productos), PREFIJO, random.random() > 0.1, random.randint(0, 525600))
+                for _ in range(ALERTAS)
+            ]
+        )
+
+    for tabla in ("productos", "lotes", "movimientos", "alertas"):
+        execute_query(f"ANALYZE TABLE {tabla}", fetch_all=True)
+    print(f"   {PRODUCTOS} productos, {len(lote_ids)} lotes, {MOVIMIENTOS} movimientos, {ALERTAS} alertas")
+
+def limpiar_datos():
+    """Eliminar los datos sembrados (lotes, movimientos y alertas caen en cascada)"""
+    execute_query("DELETE FROM productos WHERE codigo LIKE %s", (f"{PREFIJO}%",))
+    print("🧹 Datos de prueba eliminados")
+
+def tabla_existe(tabla):
+    fila = execute_query(
+        """SELECT COUNT(*) as total FROM information_schema.TABLES
+           WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s""",
+        (DB_CONFIG['database'], tabla),
+        fetch_one=True
+    )
+    return fila['total'] > 0
+
+def listado(nombre, tabla, listado_router, conditions=(), params=(), cursor=None):
+    """Primera página (o la siguiente a `cursor`) tal como la arma paginar()"""
+    consulta, valores = listado_router.consulta(conditions, params, limit=100, cursor=cursor)
+    return nombre, tabla, consulta, valores
+
+def exportacion(nombre, tabla, listado_router, conditions=(), params=()):
+    """Consulta completa, sin LIMIT, de las exportaciones en streaming"""
+    consulta, valores = listado_router.consulta(conditions, params)
+    return nombre, tabla, consulta, valores
+
+# (nombre, tabla requerida, consulta, parámetros) armadas con las mismas
+# constantes y helpers que usan los routers; solo los filtros se escriben aquí
+CONSULTAS = [
+    listado("productos.listar", "productos", productos.LISTADO_PRODUCTOS),
+    listado("productos.listar_activos", "productos", productos.LISTADO_PRODUCTOS,
+            ["p.activo = %s"], [True]),
+    listado("productos.por_categoria", "productos", productos.LISTADO_PRODUCTOS,
+            ["p.categoria = %s"], [f"{PREFIJO}cat-7"]),
+    listado("productos.cursor", "productos", productos.LISTADO_PRODUCTOS,
+            cursor=codificar_cursor([f"{PREFIJO}Producto 01000", 0])),
+    ("productos.materiales_formacion", "productos", productos.CONSULTA_MATERIALES_FORMACION, ()),
+    ("catalogo.refresco", "productos", CONSULTA_REFRESCO,
+     (datetime.now() - timedelta(minutes=1),)),
+    ("lotes.por_producto", "lotes",
+     f"{lotes.CONSULTA_LOTES} WHERE l.producto_id = %s AND l.activo = %s "
+     f"ORDER BY {lotes.ORDEN_LOTES} LIMIT %s OFFSET %s", (1, True, 100, 0)),
+    ("lotes.por_estado", "lotes",
+     f"{lotes.CONSULTA_LOTES} WHERE l.estado = %s AND l.activo = %s "
+     f"ORDER BY {lotes.ORDEN_LOTES} LIMIT %s OFFSET %s", ("vencido", True, 100, 0)),
+    ("lotes.proximos_vencer", "lotes", lotes.CONSULTA_PROXIMOS_VENCER, (30,)),
+    ("lotes.vencidos", "lotes", lotes.CONSULTA_VENCIDOS, ()),
+    listado("movimientos.listar", "movimientos", movimientos.LISTADO_MOVIMIENTOS),
+    listado("movimientos.cursor", "movimientos", movimientos.LISTADO_MOVIMIENTOS,
+            cursor=codificar_cursor([(datetime.now() - timedelta(days=30)).isoformat(" "), 0])),
+    listado("movimientos.por_usuario", "movimientos", movimientos.LISTADO_MOVIMIENTOS,
+            ["usuario_id = %s"], [1]),
+    listado("movimientos.por_tipo", "movimientos", movimientos.LISTADO_MOVIMIENTOS,
+            ["tipo = %s"], ["salida"]),
+    listado("movimientos.por_lote", "movimientos", movimientos.LISTADO_MOVIMIENTOS,
+            ["lote_id = %s"], [1]),
+    listado("movimientos.con_detalles", "movimientos", movimientos.LISTADO_DETALLES),
+    listado("movimientos.con_detalles_por_usuario", "movimientos", movimientos.LISTADO_DETALLES,
+            ["m.usuario_id = %s"], [1]),
+    exportacion("movimientos.exportar_por_tipo", "movimientos", movimientos.LISTADO_DETALLES,
+                ["m.tipo = %s", "m.fecha_movimiento >= %s"], ["salida", date.today() - timedelta(days=30)]),
+    listado("alertas.listar", "alertas", alertas.LISTADO_ALERTAS),
+    ("alertas.pendientes", "alertas", alertas.CONSULTA_PENDIENTES, ()),
+]
+
+def verificar_planes():
+    """Ejecutar EXPLAIN sobre cada consulta; devuelve la lista de fallas"""
+    fallas = []
+    for nombre, tabla, consulta, params in CONSULTAS:
+        if not tabla_existe(tabla):
+            print(f"   ⏭️  {nombre}: tabla {tabla} no existe")
+            continue
+
+        plan = execute_query(f"EXPLAIN {consulta}", params or None, fetch_all=True)
+        escaneos = [
+            fila for fila in plan
+            if fila['type'] == 'ALL' and (fila['rows'] or 0) >= UMBRAL_FILAS
+        ]
+        resumen = ", ".join(f"{f['table']}:{f['type']}/{f['key'] or '-'}/{f['rows']}" for f in plan)
+
+        if escaneos:
+            print(f"   ❌ {nombre}: {resumen}")
+            fallas.append(nombre)
+        else:
+            print(f"   ✅ {nombre}: {resumen}")
+    return fallas
+
+def main():
+    print("🔍 VERIFICACIÓN DE PLANES DE CONSULTA")
+    print("=" * 50)
+
+    sembrar = "--sin-sembrar" not in sys.argv
+    if sembrar:
+        sembrar_datos()
+
+    try:
+        print("\n📋 EXPLAIN (tabla:tipo/índice/filas estimadas):")
+        fallas = verificar_planes()
+    finally:
+        if sembrar:
+            limpiar_datos()
+
+    print("\n" + "=" * 50)
+    if fallas:
+        print(f"❌ {len(fallas)} consultas con escaneo completo: {', '.join(fallas)}")
+        return False
+
+    print("🏁 Todas las consultas usan índices")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
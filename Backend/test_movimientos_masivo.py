@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Prueba de rendimiento y consistencia del endpoint masivo de movimientos.
+
+Crea LOTES lotes y envía a /api/movimientos/masivo/ una solicitud sola y
+luego SOLICITUDES solicitudes concurrentes, con MOVIMIENTOS movimientos cada
+una (entradas y salidas con cantidades y motivos distintos), mientras otros
+hilos registran movimientos individuales sobre los mismos lotes. Verifica que:
+
+- la solicitud sola de MOVIMIENTOS movimientos responde en menos de
+  OBJETIVO_SEGUNDOS (las concurrentes se esperan entre sí por el bloqueo
+  de los lotes, así que su tiempo solo se informa);
+- cada movimiento_id devuelto corresponde a la fila con el mismo lote,
+  tipo, cantidad y motivo (los ids no se deducen del primero insertado);
+- el saldo final de cada lote coincide con el calculado.
+
+Requiere el servidor corriendo en localhost:8000 y la base de datos con
+los datos de ejemplo (usuario instructor 1001234567).
+"""
+
+import sys
+import time
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from app.routers.auth import create_access_token
+
+BASE_URL = "http://localhost:8000"
+LOTES = 4
+SOLICITUDES = 4
+MOVIMIENTOS = 500
+INDIVIDUALES = 100
+STOCK_INICIAL = 1000
+OBJETIVO_SEGUNDOS = 0.5
+HILOS = 8
+
+def obtener_headers():
+    """Login con el usuario de ejemplo y token JWT para los endpoints protegidos"""
+    response = requests.post(
+        f"{BASE_URL}/api/auth/login",
+        json={"documento": "1001234567", "password": "instructor123"},
+        timeout=5
+    )
+    response.raise_for_status()
+    token = create_access_token(data={"sub": str(response.json()["user_id"])})
+    return {"Authorization": f"Bearer {token}"}
+
+def crear_lote(headers, numero):
+    """Crear un lote de prueba sobre el primer producto disponible"""
+    productos = requests.get(f"{BASE_URL}/api/productos/", headers=headers, timeout=5).json()
+    if not productos:
+        raise RuntimeError("No hay productos para crear el lote de prueba")
+
+    lote = {
+        "producto_id": productos[0]["id"],
+        "numero_lote": f"MASIVO-{int(time.time())}-{numero}",
+        "fecha_ingreso": date.today().isoformat(),
+        "cantidad_inicial": STOCK_INICIAL,
+        "cantidad_disponible": STOCK_INICIAL,
+        "observaciones": "Lote de prueba del endpoint masivo"
+    }
+    response = requests.post(f"{BASE_URL}/api/lotes/", json=lote, headers=headers, timeout=5)
+    response.raise_for_status()
+    return response.json()["id"]
+
+def armar_solicitud(lote_ids, numero):
+    """MOVIMIENTOS movimientos alternando lotes; entradas de 1-3 y salidas de 1"""
+    movimientos = []
+    for i in range(MOVIMIENTOS):
+        entrada = i % 2 == 0
+        movimientos.append({
+            "lote_id": lote_ids[i % len(lote_ids)],
+            "tipo": "entrada" if entrada else "salida",
+            "cantidad": 1 + i % 3 if entrada else 1,
+            "motivo": f"masivo-{numero}-{i}"
+        })
+    return movimientos
+
+def enviar_masivo(movimientos, headers):
+    """Enviar una solicitud masiva; devuelve (segundos, respuesta JSON o None)"""
+    inicio = time.perf_counter()
+    response = requests.post(
+        f"{BASE_URL}/api/movimientos/masivo/", json=movimientos, headers=headers, timeout=120
+    )
+    duracion = time.perf_counter() - inicio
+    return duracion, response.json() if response.status_code == 200 else None
+
+def registrar_individual(lote_id, numero, headers):
+    """Entrada individual de 1 unidad intercalada con las solicitudes masivas"""
+    response = requests.post(
+        f"{BASE_URL}/api/movimientos/",
+        json={"lote_id": lote_id, "tipo": "entrada", "cantidad": 1, "motivo": f"individual-{numero}"},
+        headers=headers,
+        timeout=30
+    )
+    return response.status_code
+
+def test_movimientos_masivo():
+    """Dispara solicitudes masivas e individuales y verifica ids y saldos"""
+    print("🚀 PRUEBA DEL ENDPOINT MASIVO DE MOVIMIENTOS")
+    print("=" * 50)
+
+    headers = obtener_headers()
+    lote_ids = [crear_lote(headers, numero) for numero in range(LOTES)]
+    print(f"📦 Lotes {lote_ids} creados con {STOCK_INICIAL} unidades")
+
+    errores = []
+    solicitudes = [armar_solicitud(lote_ids, numero) for numero in range(SOLICITUDES + 1)]
+    duracion, respuesta = enviar_masivo(solicitudes[0], headers)
+    print(f"⏱️  Solicitud sola: {MOVIMIENTOS} movimientos en {duracion:.3f}s")
+    if duracion > OBJETIVO_SEGUNDOS:
+        errores.append(f"solicitud de {MOVIMIENTOS} movimientos en {duracion:.3f}s (objetivo {OBJETIVO_SEGUNDOS}s)")
+    respuestas = [(duracion, respuesta)]
+
+    with ThreadPoolExecutor(max_workers=HILOS) as executor:
+        masivos = [executor.submit(enviar_masivo, movimientos, headers) for movimientos in solicitudes[1:]]
+        individuales = [
+            executor.submit(registrar_individual, lote_ids[i % LOTES], i, headers)
+            for i in range(INDIVIDUALES)
+        ]
+        respuestas += [futuro.result() for futuro in masivos]
+        codigos = [futuro.result() for futuro in individuales]
+
+    esperados = {}
+    saldos = {lote_id: STOCK_INICIAL for lote_id in lote_ids}
+    for movimientos, (duracion, respuesta) in zip(solicitudes, respuestas):
+        if respuesta is None:
+            errores.append("una solicitud masiva no respondió 200")
+            continue
+        print(f"⏱️  {respuesta['total']} movimientos en {duracion:.2f}s "
+              f"({respuesta['total'] / duracion:.0f} movimientos/s, {respuesta['fallidos']} rechazados)")
+        for movimiento, resultado in zip(movimientos, respuesta["resultados"]):
+            if not resultado["exito"]:
+                errores.append(f"movimiento {movimiento['motivo']} rechazado: {resultado['error']}")
+                continue
+            esperados[resultado["movimiento_id"]] = movimiento
+            signo = 1 if movimiento["tipo"] == "entrada" else -1
+            saldos[movimiento["lote_id"]] += signo * movimiento["cantidad"]
+
+    aceptadas = codigos.count(200)
+    print(f"   ✅ Movimientos individuales aceptados: {aceptadas}/{INDIVIDUALES}")
+    if aceptadas != INDIVIDUALES:
+        errores.append(f"{INDIVIDUALES - aceptadas} movimientos individuales fallaron")
+    for i in range(INDIVIDUALES):
+        saldos[lote_ids[i % LOTES]] += 1
+
+    # Cada id devuelto debe apuntar a la fila con los mismos datos
+    filas = {}
+    for lote_id in lote_ids:
+        for fila in requests.get(
+            f"{BASE_URL}/api/movimientos/",
+            params={"lote_id": lote_id, "limit": 1000},
+            headers=headers,
+            timeout=30
+        ).json():
+            filas[fila["id"]] = fila
+    incorrectos = 0
+    for movimiento_id, movimiento in esperados.items():
+        fila = filas.get(movimiento_id)
+        if fila is None or any(fila[campo] != movimiento[campo] for campo in ("lote_id", "tipo", "cantidad", "motivo")):
+            incorrectos += 1
+    print(f"   📊 Ids verificados: {len(esperados) - incorrectos}/{len(esperados)}")
+    if incorrectos:
+        errores.append(f"{incorrectos} movimiento_id no corresponden a su movimiento")
+
+    for lote_id in lote_ids:
+        lote = requests.get(f"{BASE_URL}/api/lotes/{lote_id}", headers=headers, timeout=5).json()
+        if lote["cantidad_disponible"] != saldos[lote_id]:
+            errores.append(f"lote {lote_id}: saldo {lote['cantidad_disponible']}, se esperaba {saldos[lote_id]}")
+
+    print("\n" + "=" * 50)
+    if errores:
+        for error in errores:
+            print(f"❌ {error}")
+        return False
+
+    print("🏁 PRUEBA SUPERADA: ids y saldos consistentes")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if test_movimientos_masivo() else 1)